@@ -0,0 +1,199 @@
+# benchmarks/extract_json.py
+"""
+Corpus benchmark for src.utils.utils.extract_json.
+
+The corpus is every assistant response found in model logs (logs/**/*.log, as written by
+Agent.log_conversation) plus synthetic responses built from the example outputs of every method,
+rewritten the ways models actually deviate from clean JSON: <think> sections, // comments, URLs in
+strings, trailing commas, Python reprs, braces in surrounding prose, missing code fences.
+Both the current extractor and the previous regex/replace implementation are run over it and
+compared on parse rate and time per response.
+
+    python -m benchmarks.extract_json
+    python -m benchmarks.extract_json --logs logs --repeats 5 --output extract_report.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import runpy
+import time
+from typing import Callable, Dict, List
+
+from src.utils.utils import clean_text, extract_json, plan_rank
+
+ROLE_HEADER = re.compile(r"^-----([A-Z_]+):-----$", re.MULTILINE)
+LOG_HEADER = re.compile(r"^===== .* =====$", re.MULTILINE)
+
+def legacy_extract_json(text: str) -> dict|list:
+    """extract_json as it was before the single-pass extractor, kept for comparison"""
+    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    text = re.sub(r'//.*', '', text)
+
+    json_regex = r'```json\s*([\s\S]*?)\s*```'
+    matches = re.findall(json_regex, text)
+    if matches and len(matches) > 0:
+        json_data = matches[0].replace('```json', '').replace('```', '').strip()
+        json_data = clean_text(json_data)
+        try:
+            return json.loads(json_data)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Error parsing JSON data: {e}") from e
+    text = clean_text(text)
+    text = text.replace("'", '"')
+    try:
+        parsed_json = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Error parsing JSON data: {e}") from e
+    if isinstance(parsed_json, (list, dict)):
+        return parsed_json
+    raise ValueError("No JSON data found in the string")
+
+EXTRACTORS = {"legacy": legacy_extract_json, "current": extract_json}
+
+def log_responses(logs_root: str) -> List[Dict]:
+    """Assistant messages of every model log below `logs_root`"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(logs_root, "**", "*.log"), recursive=True)):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            content = f.read()
+        headers = list(ROLE_HEADER.finditer(content))
+        for i, header in enumerate(headers):
+            if header.group(1) != "ASSISTANT":
+                continue
+            end = headers[i + 1].start() if i + 1 < len(headers) else len(content)
+            block_end = LOG_HEADER.search(content, header.end(), end)
+            text = content[header.end():block_end.start() if block_end else end].strip()
+            if text:
+                corpus.append({"source": f"{path}#{i}", "variant": "log", "text": text, "expected": None})
+    return corpus
+
+def example_outputs() -> List[Dict]:
+    """(path, parsed JSON) of the example outputs shipped with every method"""
+    examples = []
+    for path in sorted(glob.glob("src/agent/method/*/example/*.py")):
+        output = runpy.run_path(path).get("output")
+        if not output:
+            continue
+        match = re.search(r"```json\s*([\s\S]*?)\s*```", output)
+        try:
+            examples.append((path, json.loads(match.group(1) if match else output, strict=False)))
+        except json.JSONDecodeError:
+            continue
+    return examples
+
+def _comment_lines(text: str) -> str:
+    return re.sub(r'("action": "(\w+)"[^\n]*?)(,?)$', r'\1\3  // \2 step', text, flags=re.MULTILINE)
+
+def _trailing_commas(text: str) -> str:
+    return re.sub(r"(\}|\]|\"|\d)(\s*\n\s*)([\]}])", r"\1,\2\3", text)
+
+def _with_url(value):
+    if isinstance(value, dict):
+        return dict(value, notes="see https://example.com/recipes//burger and {braces} in [strings]")
+    return value
+
+# variant name -> response text built from the parsed example; expected value is the example itself
+# unless the variant returns (text, expected)
+VARIANTS: Dict[str, Callable] = {
+    "fenced": lambda value: f"Here is the plan:\n```json\n{json.dumps(value, indent=4)}\n```\nLet me know if it works.",
+    "bare": lambda value: json.dumps(value, indent=4),
+    "unfenced_prose": lambda value: f"The plan below {{keeps agents apart}} and [avoids] conflicts:\n{json.dumps(value, indent=4)}\nDone.",
+    "think": lambda value: f"<think>\nMaybe {{\"plan\": 1}} first? No, agent1 isn't free [yet].\n</think>\n```json\n{json.dumps(value, indent=4)}\n```",
+    "comments": lambda value: f"```json\n{_comment_lines(json.dumps(value, indent=4))}\n```",
+    "url_in_string": lambda value: (f"```json\n{json.dumps(_with_url(value), indent=4)}\n```", _with_url(value)),
+    "trailing_commas": lambda value: f"```json\n{_trailing_commas(json.dumps(value, indent=4))}\n```",
+    "python_repr": lambda value: f"Plan: {value!r}",
+    "two_blocks": lambda value: f"Draft:\n```json\n{{\"agent1\": []}}\n```\nFinal:\n```json\n{json.dumps(value, indent=4)}\n```",
+}
+
+def synthetic_responses() -> List[Dict]:
+    corpus = []
+    for path, value in example_outputs():
+        for variant, build in VARIANTS.items():
+            built = build(value)
+            text, expected = built if isinstance(built, tuple) else (built, value)
+            corpus.append({"source": path, "variant": variant, "text": text, "expected": expected})
+    return corpus
+
+def run_extractor(extract: Callable, corpus: List[Dict], repeats: int) -> Dict:
+    """
+    Per-variant counts. A synthetic response counts as correct when the expected value comes back;
+    log responses have no ground truth and count as correct when a plan-like object is returned.
+    """
+    stats = {}
+    total_time = 0.0
+    for item in corpus:
+        row = stats.setdefault(item["variant"], {"responses": 0, "parsed": 0, "correct": 0, "seconds": 0.0})
+        row["responses"] += 1
+        best = float("inf")
+        value, error = None, None
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                value, error = extract(item["text"]), None
+            except ValueError as e:
+                value, error = None, e
+            best = min(best, time.perf_counter() - start)
+        row["seconds"] += best
+        total_time += best
+        if error is not None:
+            continue
+        row["parsed"] += 1
+        if item["expected"] is None:
+            row["correct"] += plan_rank(value) > 0
+        else:
+            row["correct"] += value == item["expected"]
+    for row in stats.values():
+        row["parse_rate"] = row["parsed"] / row["responses"]
+        row["correct_rate"] = row["correct"] / row["responses"]
+        row["us_per_response"] = row["seconds"] / row["responses"] * 1e6
+    responses = sum(row["responses"] for row in stats.values())
+    return {
+        "variants": stats,
+        "responses": responses,
+        "parse_rate": sum(row["parsed"] for row in stats.values()) / responses if responses else 0.0,
+        "correct_rate": sum(row["correct"] for row in stats.values()) / responses if responses else 0.0,
+        "us_per_response": total_time / responses * 1e6 if responses else 0.0,
+    }
+
+def print_table(report: Dict):
+    names = list(report["extractors"])
+    print(f"{'variant':<18}{'n':>6}" + "".join(f"{name + ' ok':>14}{name + ' us':>14}" for name in names))
+    variants = report["extractors"][names[0]]["variants"]
+    for variant in variants:
+        cells = ""
+        for name in names:
+            row = report["extractors"][name]["variants"][variant]
+            cells += f"{row['correct_rate']:>14.1%}{row['us_per_response']:>14.1f}"
+        print(f"{variant:<18}{variants[variant]['responses']:>6}" + cells)
+    cells = "".join(f"{stats['correct_rate']:>14.1%}{stats['us_per_response']:>14.1f}" for stats in report["extractors"].values())
+    print(f"{'total':<18}{report['responses']:>6}" + cells)
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse rate and speed of extract_json on logged and synthetic model responses")
+    parser.add_argument("--logs", type=str, default="logs", help="Root directory of model logs")
+    parser.add_argument("--no-synthetic", action="store_true", help="Only use responses from the logs")
+    parser.add_argument("--repeats", type=int, default=3, help="Timing is the best of this many runs per response")
+    parser.add_argument("--output", type=str, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    corpus = log_responses(args.logs) if os.path.isdir(args.logs) else []
+    if not args.no_synthetic:
+        corpus += synthetic_responses()
+    if not corpus:
+        parser.error(f"No responses found under {args.logs}")
+
+    report = {
+        "responses": len(corpus),
+        "extractors": {name: run_extractor(extract, corpus, args.repeats) for name, extract in EXTRACTORS.items()},
+    }
+    print_table(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
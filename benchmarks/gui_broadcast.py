@@ -0,0 +1,196 @@
+# benchmarks/gui_broadcast.py
+"""
+Load test for the WebSocket broadcast of the GUI server (gui/server/main.py).
+
+The server and the WebSocket clients run in their own processes, so neither competes with the
+measuring one for the GIL. Every scenario connects a number of clients, some of them stalled (they
+never read, so their TCP buffers fill up like those of a frozen browser tab), and measures the
+latency of POST /api/world/update with a world built from a large generated map and of
+POST /api/actions. The queued broadcast is compared with the previous serial implementation, which
+awaited every client in turn.
+
+    python -m benchmarks.gui_broadcast
+    python -m benchmarks.gui_broadcast --clients 50 --stalled 5 --size 50 --requests 200 --policy drop
+"""
+
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import requests
+import uvicorn
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import connect
+
+from benchmarks.stress import DEFAULT_CASE, build_fixture, make_world
+from src.agent.method.Search.planner import SearchPlanner
+from src.game.simulator import Simulator
+from src.utils.logger_config import suppress_logging
+from src.utils.random_map import load_json
+
+SERVER_PATH = os.path.join(os.path.dirname(__file__), "..", "gui", "server", "main.py")
+
+def load_server():
+    spec = importlib.util.spec_from_file_location("gui_server", os.path.abspath(SERVER_PATH))
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    return server
+
+def legacy_broadcast(server):
+    """ConnectionManager.broadcast as it was before the per-connection queues, kept for comparison"""
+    async def broadcast(self, message_type, data):
+        message = {"type": message_type, "data": data, "timestamp": datetime.now().isoformat()}
+        for client in list(self.connections.values()):
+            try:
+                await client.websocket.send_json(message)
+            except Exception:
+                self.disconnect(client.websocket)
+    return broadcast
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def serve(port: int, mode: str, policy: str | None):
+    server = load_server()
+    if policy:
+        server.STALE_FRAME_POLICY = policy
+    if mode == "serial":
+        server.ConnectionManager.broadcast = legacy_broadcast(server)
+    uvicorn.run(server.app, host="127.0.0.1", port=port, log_level="warning", ws_per_message_deflate=server.WS_PER_MESSAGE_DEFLATE)
+
+def payloads(size: int) -> Dict:
+    """World update and action plan of a generated size x size map"""
+    case = dict(DEFAULT_CASE, size=size)
+    with suppress_logging():
+        world = make_world(build_fixture(case), load_json("config/item/station.json"))
+        plan, _ = SearchPlanner(Simulator(world, record_history=False)).candidate(0)
+    return {
+        "world": {"world": world.to_json(), "agents": list(world.agents), "recipes": [], "orders": world.orders},
+        "actions": {"actions": plan},
+    }
+
+def reader(url: str, stop: threading.Event):
+    try:
+        with connect(url, max_size=None) as ws:
+            while not stop.is_set():
+                try:
+                    ws.recv(timeout=0.2)
+                except TimeoutError:
+                    continue
+    except (ConnectionClosed, OSError):
+        pass
+
+def clients_process(url: str, clients: int, stalled: int, stop):
+    """Fast readers in threads, plus stalled clients: max_queue=1 stops the library from draining their sockets"""
+    threads = [threading.Thread(target=reader, args=(url, stop), daemon=True) for _ in range(clients - stalled)]
+    for thread in threads:
+        thread.start()
+    stalled_ws = [connect(url, max_size=None, max_queue=1) for _ in range(stalled)]
+    stop.wait()
+    for thread in threads:
+        thread.join()
+    for ws in stalled_ws:
+        ws.close_socket()
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run_scenario(base: str, payload: Dict, clients: int, stalled: int, requests_count: int, timeout: float) -> Dict:
+    session = requests.Session()
+    stop = multiprocessing.Event()
+    process = multiprocessing.Process(target=clients_process, args=(f"ws{base[4:]}/ws", clients, stalled, stop))
+    process.start()
+    while session.get(base + "/").json()["websocket_connections"] < clients:
+        time.sleep(0.05)
+
+    latencies = {"world_update": [], "actions": []}
+    timeouts = 0
+    for i in range(requests_count):
+        endpoint, path, body = ("world_update", "/api/world/update", payload["world"]) if i % 2 == 0 else ("actions", "/api/actions", payload["actions"])
+        start = time.perf_counter()
+        try:
+            session.post(base + path, json=body, timeout=timeout).raise_for_status()
+        except requests.Timeout:
+            # The handler is stuck behind a stalled client, later requests would queue behind it
+            timeouts += 1
+            latencies[endpoint].append(timeout * 1000)
+            break
+        latencies[endpoint].append((time.perf_counter() - start) * 1000)
+
+    stats = session.get(base + "/", timeout=timeout).json()["broadcast"] if not timeouts else None
+    stop.set()
+    process.join()
+    return {
+        "clients": clients,
+        "stalled": stalled,
+        "timeouts": timeouts,
+        "latency_ms": {
+            endpoint: {"p50": statistics.median(values), "p95": percentile(values, 0.95), "max": max(values)}
+            for endpoint, values in latencies.items() if values
+        },
+        "broadcast": stats,
+    }
+
+def print_table(report: Dict):
+    print(f"world frame: {report['world_frame_kb']:.1f} KB")
+    columns = [(e, k) for e in ("world_update", "actions") for k in ("p50", "p95")]
+    print(f"{'mode':<10}{'clients':>8}{'stalled':>8}" + "".join(f"{e + ' ' + k:>20}" for e, k in columns) + f"{'coalesced':>11}{'dropped':>9}{'kicked':>8}")
+    for row in report["scenarios"]:
+        cells = "".join(f"{row['latency_ms'][e][k]:>20.2f}" if e in row["latency_ms"] else f"{'-':>20}" for e, k in columns)
+        b = row["broadcast"]
+        counters = f"{b['coalesced_frames']:>11}{b['dropped_frames']:>9}{b['slow_disconnects']:>8}" if b else f"{'stuck (request timed out)':>28}"
+        print(f"{row['mode']:<10}{row['clients']:>8}{row['stalled']:>8}" + cells + counters)
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of the GUI server HTTP handlers while broadcasting to many WebSocket clients")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--stalled", type=int, default=5, help="Clients among --clients that never read")
+    parser.add_argument("--size", type=int, default=100, help="Side of the generated map")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds before a request counts as stuck")
+    parser.add_argument("--policy", choices=["coalesce", "drop"], help="Override broadcast.stale_frames of config/gui_config.json")
+    parser.add_argument("--no-legacy", action="store_true", help="Skip the serial broadcast scenarios")
+    parser.add_argument("--output", type=str, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    payload = payloads(args.size)
+    scenarios = [(0, 0), (args.clients, 0), (args.clients, args.stalled)]
+    report = {"world_frame_kb": len(json.dumps(payload["world"]["world"])) / 1024, "scenarios": []}
+    for mode in ["queued"] + ([] if args.no_legacy else ["serial"]):
+        for clients, stalled in scenarios:
+            # A fresh server per scenario: a stuck serial broadcast never recovers
+            port = free_port()
+            server = multiprocessing.Process(target=serve, args=(port, mode, args.policy))
+            server.start()
+            base = f"http://127.0.0.1:{port}"
+            while True:
+                try:
+                    requests.get(base + "/", timeout=1)
+                    break
+                except requests.ConnectionError:
+                    time.sleep(0.1)
+            try:
+                result = run_scenario(base, payload, clients, stalled, args.requests, args.timeout)
+            finally:
+                server.terminate()
+                server.join()
+            report["scenarios"].append(dict(result, mode=mode))
+
+    print_table(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
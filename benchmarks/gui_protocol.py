@@ -0,0 +1,152 @@
+# benchmarks/gui_protocol.py
+"""
+Size and parse time of the GUI WebSocket protocols (gui/server/main.py).
+
+Every message the frontend receives during a test (snapshot, map, agents, config and actions updates,
+a batch of logs) is built from a large generated map and encoded by the server's Frame in each
+protocol: JSON text frames (the snapshot zlib-compressed when the client asks for it) and MessagePack
+frames with record tables, with and without deflate. Bytes and server encode time are measured here;
+client parse time is measured with the frontend's own decoders under Node.js, when `node` is on PATH.
+
+    python -m benchmarks.gui_protocol
+    python -m benchmarks.gui_protocol --size 100 --repeats 200 --output protocol_report.json
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.gui_broadcast import load_server, payloads
+
+VARIANTS = [("json", False), ("json", True), ("msgpack", False), ("msgpack", True)]
+WEB_UTILS = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "gui", "web", "src", "utils"))
+
+# Decodes every frame as services/websocket.js does and prints the mean time per frame in ms
+NODE_SCRIPT = """
+import { readFileSync } from 'node:fs'
+import { decode, Deflated } from '%(utils)s/msgpack.js'
+
+const inflate = async (bytes) => {
+  const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'))
+  return new Uint8Array(await new Response(stream).arrayBuffer())
+}
+const parse = async (frame, protocol) => {
+  if (frame.text !== undefined) return JSON.parse(frame.text)
+  if (protocol === 'msgpack') {
+    const message = decode(frame.bytes)
+    return message instanceof Deflated ? decode(await inflate(message.bytes)) : message
+  }
+  return JSON.parse(new TextDecoder().decode(await inflate(frame.bytes)))
+}
+const frames = JSON.parse(readFileSync(process.argv[2], 'utf-8'))
+const repeats = Number(process.argv[3])
+const results = {}
+for (const frame of frames) {
+  if (frame.bytes !== undefined) frame.bytes = Buffer.from(frame.bytes, 'base64')
+  for (let i = 0; i < Math.min(repeats, 20); i++) await parse(frame, frame.protocol)
+  const start = performance.now()
+  for (let i = 0; i < repeats; i++) await parse(frame, frame.protocol)
+  results[frame.key] = (performance.now() - start) / repeats
+}
+console.log(JSON.stringify(results))
+"""
+
+def messages(server, size: int, logs: int) -> Dict[str, tuple]:
+    """(message type, data, extra fields) of every kind of message the frontend receives"""
+    payload = payloads(size)
+    state = server.ServerState()
+    update = payload["world"]
+    state.world_state, state.agents, state.recipes, state.orders = update["world"], update["agents"], update["recipes"], update["orders"]
+    state.current_actions = payload["actions"]["actions"]
+    log_batch = [
+        {"level": "info", "message": f"\x1b[32magent{i % 4 + 1}\x1b[0m moved to ({i % size}, {i % 7})", "timestamp": "12:00:00"}
+        for i in range(logs)
+    ]
+    state.logs.extend(log_batch)
+    T = server.WSMessageType
+    return {
+        "snapshot": (T.SNAPSHOT, state.manager.snapshot(), {"version": 1, "epoch": state.manager.epoch}),
+        "map_update": (T.MAP_UPDATE, state.world_state, {"seq": 2}),
+        "agents_update": (T.AGENTS_UPDATE, state.agents, {"seq": 3}),
+        "config_update": (T.CONFIG_UPDATE, state.manager._get_config_data(), {"seq": 4}),
+        "actions_update": (T.ACTIONS_UPDATE, {"actions": state.current_actions}, {"seq": 5}),
+        "log_batch": (T.LOG_BATCH, log_batch, {"seq": 6}),
+    }
+
+def encode_all(server, items: Dict[str, tuple], repeats: int) -> List[Dict]:
+    rows = []
+    for name, (message_type, data, fields) in items.items():
+        for protocol, compress in VARIANTS:
+            start = time.perf_counter()
+            for _ in range(repeats):
+                payload = server.Frame(message_type, data, **fields).payload(protocol, compress)
+            rows.append({
+                "message": name, "protocol": protocol, "compress": compress, "bytes": len(payload),
+                "encode_ms": (time.perf_counter() - start) / repeats * 1000, "payload": payload,
+            })
+    return rows
+
+def node_parse_times(rows: List[Dict], repeats: int) -> Dict[str, float]:
+    if shutil.which("node") is None:
+        return {}
+    frames = []
+    for i, row in enumerate(rows):
+        frame = {"key": str(i), "protocol": row["protocol"]}
+        if isinstance(row["payload"], bytes):
+            frame["bytes"] = base64.b64encode(row["payload"]).decode("ascii")
+        else:
+            frame["text"] = row["payload"]
+        frames.append(frame)
+    with tempfile.TemporaryDirectory() as tmp:
+        script = os.path.join(tmp, "parse.mjs")
+        data = os.path.join(tmp, "frames.json")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(NODE_SCRIPT % {"utils": WEB_UTILS})
+        with open(data, "w", encoding="utf-8") as f:
+            json.dump(frames, f)
+        output = subprocess.run(["node", script, data, str(repeats)], capture_output=True, text=True, check=True).stdout
+    return {int(key): value for key, value in json.loads(output).items()}
+
+def print_table(report: Dict):
+    print(f"map {report['size']}x{report['size']}, {report['tiles']} tiles, {report['logs']} logs")
+    print(f"{'message':<16}{'protocol':<18}{'bytes':>10}{'vs json':>9}{'encode ms':>11}{'parse ms':>10}")
+    base = {row["message"]: row["bytes"] for row in report["rows"] if row["protocol"] == "json" and not row["compress"]}
+    for row in report["rows"]:
+        protocol = row["protocol"] + (" + deflate" if row["compress"] else "")
+        parse = f"{row['parse_ms']:>10.3f}" if row.get("parse_ms") is not None else f"{'-':>10}"
+        print(f"{row['message']:<16}{protocol:<18}{row['bytes']:>10}{row['bytes'] / base[row['message']]:>9.1%}{row['encode_ms']:>11.3f}{parse}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes and parse time per message of the GUI WebSocket protocols")
+    parser.add_argument("--size", type=int, default=100, help="Side of the generated map")
+    parser.add_argument("--logs", type=int, default=1000, help="Logs in the snapshot and the log batch")
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--output", type=str, help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    server = load_server()
+    if server.msgpack is None:
+        raise SystemExit("msgpack is not installed, only the JSON protocol is available")
+    items = messages(server, args.size, args.logs)
+    rows = encode_all(server, items, args.repeats)
+    parse = node_parse_times(rows, args.repeats)
+    for i, row in enumerate(rows):
+        row["parse_ms"] = parse.get(i)
+        del row["payload"]
+    report = {"size": args.size, "tiles": len(items["map_update"][1]["tiles"]), "logs": args.logs, "rows": rows}
+
+    print_table(report)
+    if not parse:
+        print("node not found, client parse time not measured")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# benchmarks/stress.py
+"""
+Scaling stress tests for the game engine (src/game/).
+
+Sweeps map size, agent count, order count and wall density one axis at a time around a
+default case, measures World construction, find_path latency, Simulator.step throughput,
+run_simulation wall time and peak RSS, and compares the report against a stored baseline.
+
+    python -m benchmarks.stress --profile quick
+    python -m benchmarks.stress --profile full --output bench_report.json
+    python -m benchmarks.stress --profile quick --update-baseline
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows, peak RSS is then reported as None
+    resource = None
+
+from src.agent.method.Search.planner import PlanningFailed, SearchPlanner
+from src.game.simulator import Simulator
+from src.game.world_state import World
+from src.utils.logger_config import suppress_logging
+from src.utils.random_map import generate_random_map, load_json
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+RECIPE = "burger"
+DEFAULT_CASE = {"size": 20, "agents": 4, "orders": 10, "wall_density": 0.1}
+PROFILES = {
+    "quick": {
+        "size": [10, 20, 50],
+        "agents": [1, 4, 8],
+        "orders": [1, 10, 25],
+        "wall_density": [0.0, 0.1, 0.2],
+    },
+    "full": {
+        "size": [10, 20, 50, 100],
+        "agents": [1, 2, 4, 8, 16, 32],
+        "orders": [1, 4, 10, 25, 50, 100],
+        "wall_density": [0.0, 0.1, 0.2, 0.3],
+    },
+}
+# Metrics where larger is worse; step throughput is compared inversely
+TIME_METRICS = ["world_build_ms", "find_path_cold_us", "find_path_warm_us", "run_simulation_ms"]
+THROUGHPUT_METRICS = ["steps_per_s"]
+MEMORY_METRICS = ["peak_rss_mb"]
+# Timing metrics are only compared when both runs took the median of at least this many repeats
+MIN_COMPARE_REPEATS = 3
+# Cases that look slower are measured again up to this many times, a second apart, before they are reported
+CONFIRM_ROUNDS = 2
+# Absolute differences below these are timer noise on sub-millisecond metrics, never regressions
+NOISE_FLOOR = {"world_build_ms": 1.0, "find_path_cold_us": 50.0, "find_path_warm_us": 10.0, "run_simulation_ms": 10.0, "peak_rss_mb": 5.0}
+
+def sweep_cases(profile: str) -> List[Dict]:
+    """One-axis-at-a-time sweep around DEFAULT_CASE, without duplicates"""
+    cases, seen = [], set()
+    for axis, values in PROFILES[profile].items():
+        for value in values:
+            case = dict(DEFAULT_CASE, **{axis: value})
+            name = "size{size}_agents{agents}_orders{orders}_walls{wall_density}".format(**case)
+            if name not in seen:
+                seen.add(name)
+                cases.append(dict(case, name=name))
+    return cases
+
+def build_fixture(case: Dict, seed: int = 0) -> Dict:
+    """Deterministic map and order list for a case, stations scale with the number of agents"""
+    recipes = load_json(f"config/recipe/{RECIPE}.json")
+    all_orders = [f"{RECIPE}/{r['name']}" for r in recipes]
+    size, agents = case["size"], case["agents"]
+    rng = random.Random(seed)
+    map_data = generate_random_map(
+        width=size,
+        height=size,
+        num_agents=agents,
+        orders=all_orders,
+        recipe_dir="config/recipe",
+        num_tables=max(4, agents),
+        num_plates=max(2, agents // 2),
+        num_walls=int(case["wall_density"] * size * size),
+        num_chopping_board=max(2, agents // 2),
+        num_each_cookware=max(2, agents // 2),
+        rng=rng,
+        constructive=True,
+    )
+    orders = rng.choices(all_orders, k=case["orders"])
+    return {"map": map_data, "orders": orders, "recipes": {r["name"]: r for r in recipes}}
+
+def make_world(fixture: Dict, object_data: List[Dict]) -> World:
+    names = [order.split('/')[-1] for order in fixture["orders"]]
+    recipe_data = [fixture["recipes"][name] for name in dict.fromkeys(names)]
+    return World(fixture["map"], object_data, recipe_data, orders=names)
+
+def median_of(repeats: int, func) -> float:
+    """Median wall time of `repeats` runs in seconds; a single slow run on a shared machine does not move it"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+def run_case(case: Dict, repeats: int = 3, path_queries: int = 200) -> Dict:
+    """Measure one case; meant to run in a fresh worker process so peak RSS belongs to this case"""
+    object_data = load_json("config/item/station.json")
+    fixture = build_fixture(case)
+    metrics: Dict = {}
+    with suppress_logging():
+        # Construction is cheap, sample it more often than the other metrics
+        metrics["world_build_ms"] = median_of(repeats * 5, lambda: make_world(fixture, object_data)) * 1000
+
+        world = make_world(fixture, object_data)
+        cells = sorted(world.path_index.walkable)
+        rng = random.Random(1)
+        pairs = [(rng.choice(cells), rng.choice(cells)) for _ in range(path_queries)]
+        # Cold: every query roots a new BFS tree (a fresh world per repeat). Warm: the same queries again,
+        # served from the index
+        cold_times = []
+        for _ in range(repeats):
+            cold = make_world(fixture, object_data)
+            start = time.perf_counter()
+            for a, b in pairs:
+                cold.find_path(a, b)
+            cold_times.append(time.perf_counter() - start)
+        metrics["find_path_cold_us"] = statistics.median(cold_times) / path_queries * 1e6
+        for a, b in pairs:
+            world.find_path(a, b)
+        metrics["find_path_warm_us"] = median_of(repeats, lambda: [world.find_path(a, b) for a, b in pairs]) / path_queries * 1e6
+
+        simulator = Simulator(world, record_history=False)
+        try:
+            plan, _ = SearchPlanner(simulator).candidate(0)
+        except PlanningFailed as e:
+            metrics["error"] = f"planning failed: {e}"
+            metrics["peak_rss_mb"] = peak_rss_mb()
+            return {"case": case, "metrics": metrics}
+        metrics["plan_actions"] = sum(len(actions) for actions in plan.values())
+
+        step_times, run_times = [], []
+        for _ in range(repeats):
+            headless = simulator.clone()
+            steps = 0
+            start = time.perf_counter()
+            headless.submit_plan(plan)
+            while headless.event_queue:
+                headless.step()
+                steps += 1
+            step_times.append(time.perf_counter() - start)
+
+            # run_simulation as the agents use it: history recording on, logging off
+            recording = Simulator(make_world(fixture, object_data))
+            recording.submit_plan(plan)
+            start = time.perf_counter()
+            recording.run_simulation()
+            run_times.append(time.perf_counter() - start)
+        metrics["steps"] = steps
+        step_time = statistics.median(step_times)
+        metrics["steps_per_s"] = steps / step_time if step_time > 0 else None
+        metrics["makespan"] = headless.current_time
+        metrics["done"] = headless.is_done()
+        metrics["run_simulation_ms"] = statistics.median(run_times) * 1000
+    metrics["peak_rss_mb"] = peak_rss_mb()
+    return {"case": case, "metrics": metrics}
+
+def measure(case: Dict, repeats: int, isolate: bool = True) -> Dict:
+    if isolate:
+        # A fresh spawned interpreter per case keeps peak RSS and caches independent
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            return executor.submit(run_case, case, repeats).result()
+    return run_case(case, repeats)
+
+def run_suite(profile: str, repeats: int, isolate: bool = True) -> Dict:
+    results = []
+    cases = sweep_cases(profile)
+    for i, case in enumerate(cases):
+        print(f"[{i + 1}/{len(cases)}] {case['name']}", flush=True)
+        results.append(measure(case, repeats, isolate))
+    return {
+        "meta": {
+            "profile": profile,
+            "repeats": repeats,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """
+    Ratios against the baseline for cases present in both. A metric regresses when it is more than
+    `tolerance` worse (slower, lower throughput or more memory) and beyond its NOISE_FLOOR; cases that
+    stopped solving also count. Timing metrics are only compared when both reports are medians of at
+    least MIN_COMPARE_REPEATS repeats, fewer make single-run noise look like regressions.
+    """
+    base = {r["case"]["name"]: r["metrics"] for r in baseline.get("results", [])}
+    # Reports from before the repeat count was recorded took the best of 3
+    repeats = min(report["meta"].get("repeats", 1), baseline.get("meta", {}).get("repeats", 3))
+    compared = TIME_METRICS + THROUGHPUT_METRICS if repeats >= MIN_COMPARE_REPEATS else []
+    regressions = []
+    for result in report["results"]:
+        name, metrics = result["case"]["name"], result["metrics"]
+        old = base.get(name)
+        if old is None:
+            continue
+        result["baseline_ratio"] = {}
+        for metric in compared + MEMORY_METRICS:
+            new_value, old_value = metrics.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            ratio = new_value / old_value if metric not in THROUGHPUT_METRICS else old_value / new_value
+            result["baseline_ratio"][metric] = round(ratio, 3)
+            if ratio > 1 + tolerance and abs(new_value - old_value) > NOISE_FLOOR.get(metric, 0.0):
+                regressions.append({"case": name, "metric": metric, "baseline": old_value, "current": new_value, "ratio": round(ratio, 3)})
+        if old.get("done") and not metrics.get("done"):
+            regressions.append({"case": name, "metric": "done", "baseline": True, "current": metrics.get("done")})
+    return regressions
+
+def confirm(report: Dict, regressions: List[Dict], repeats: int, isolate: bool = True):
+    """
+    Measure the cases with a timing regression once more and keep the better value of each timing metric,
+    so only slowdowns that show up in every measurement are reported
+    """
+    names = {r["case"] for r in regressions if r["metric"] in TIME_METRICS + THROUGHPUT_METRICS}
+    for result in report["results"]:
+        if result["case"]["name"] not in names:
+            continue
+        print(f"Re-measuring {result['case']['name']}", flush=True)
+        again = measure(result["case"], repeats, isolate)["metrics"]
+        metrics = result["metrics"]
+        for metric in TIME_METRICS + THROUGHPUT_METRICS:
+            if metrics.get(metric) and again.get(metric):
+                better = max if metric in THROUGHPUT_METRICS else min
+                metrics[metric] = better(metrics[metric], again[metric])
+
+def print_table(report: Dict):
+    columns = ["world_build_ms", "find_path_cold_us", "find_path_warm_us", "steps_per_s", "run_simulation_ms", "peak_rss_mb"]
+    print(f"{'case':<42}" + "".join(f"{c:>20}" for c in columns))
+    for result in report["results"]:
+        metrics = result["metrics"]
+        cells = [f"{metrics[c]:>20.2f}" if isinstance(metrics.get(c), (int, float)) else f"{'-':>20}" for c in columns]
+        print(f"{result['case']['name']:<42}" + "".join(cells) + (f"  {metrics['error']}" if "error" in metrics else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling stress benchmark for the game engine")
+    parser.add_argument("--profile", choices=list(PROFILES), default="quick")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=str, default="bench_report.json")
+    parser.add_argument("--baseline", type=str, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--no-isolate", action="store_true", help="Run all cases in this process (peak RSS becomes cumulative)")
+    args = parser.parse_args()
+
+    report = run_suite(args.profile, args.repeats, isolate=not args.no_isolate)
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for _ in range(CONFIRM_ROUNDS):
+            if not any(r["metric"] in TIME_METRICS + THROUGHPUT_METRICS for r in regressions):
+                break
+            # Load spikes on a shared machine last a few seconds
+            time.sleep(1)
+            confirm(report, regressions, args.repeats, isolate=not args.no_isolate)
+            regressions = compare(report, baseline, args.tolerance)
+    report["regressions"] = regressions
+    if not args.update_baseline and args.repeats < MIN_COMPARE_REPEATS:
+        print(f"Timing metrics not compared with the baseline: --repeats must be at least {MIN_COMPARE_REPEATS}")
+
+    print_table(report)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline updated: {args.baseline}")
+    for regression in regressions:
+        print(f"REGRESSION {regression['case']} {regression['metric']}: {regression['baseline']} -> {regression['current']}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
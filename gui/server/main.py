@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.requests import HTTPConnection
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 from collections import deque
@@ -7,6 +8,28 @@ from enum import Enum
 from datetime import datetime
 import json
 import asyncio
+import os
+import re
+import sys
+import time
+import uuid
+import zlib
+
+try:
+    import msgpack
+except ImportError:
+    # 可选依赖：未安装时前端连接只能使用 JSON 协议
+    msgpack = None
+
+# 以脚本方式启动时，使仓库根目录下的 src 包可导入
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.game.history import apply_delta, encode_history
+from src.game.preview import build_simulator, preview_plan
+from src.utils.log_index import open_log_index
+from src.game.simulator import Simulator
 
 config_path = "config/gui_config.json"
 with open(config_path, 'r') as f:
@@ -15,6 +38,37 @@ with open(config_path, 'r') as f:
 API_HOST = config['api']['host']
 API_PORT = config['api']['port']
 
+BROADCAST_CONFIG = config.get('broadcast', {})
+# 每个前端连接的发送队列上限（帧数），超出且无法腾出空间时断开该连接，由客户端重连
+CLIENT_QUEUE_SIZE = BROADCAST_CONFIG.get('queue_size', 256)
+# 过期快照帧的处理方式："coalesce" 丢弃队列中尚未发送的同类旧帧；"drop" 照常排队，队列满时丢弃最早的快照帧
+STALE_FRAME_POLICY = BROADCAST_CONFIG.get('stale_frames', 'coalesce')
+# 供断线重连续传的最近广播帧（字节数上限），超出后最早的帧被淘汰，落后更多的客户端改为接收完整快照
+REPLAY_BUFFER_BYTES = BROADCAST_CONFIG.get('replay_bytes', 8 * 1024 * 1024)
+# permessage-deflate 会为每个连接单独压缩每一帧，本机 GUI 下只是额外的 CPU 开销
+WS_PER_MESSAGE_DEFLATE = BROADCAST_CONFIG.get('per_message_deflate', False)
+# msgpack 协议下不小于该字节数的帧在客户端请求 compress=deflate 时以 zlib 压缩；每帧只压缩一次，所有连接共用
+PACKED_COMPRESS_MIN = BROADCAST_CONFIG.get('compress_min_bytes', 1024)
+SESSION_CONFIG = config.get('sessions', {})
+# 会话空闲（无前端连接、无 agent 连接、无请求）超过该秒数后被回收
+SESSION_IDLE_TIMEOUT = SESSION_CONFIG.get('idle_timeout', 3600)
+# 同时保留的会话数上限
+MAX_SESSIONS = SESSION_CONFIG.get('max_sessions', 64)
+# 不带会话前缀的旧路由（/api/...、/ws、/ws/agent）使用的会话
+DEFAULT_SESSION = "default"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# 执行历史每隔多少帧保存一份完整世界（关键帧），区间请求最多从关键帧重放这么多个增量
+HISTORY_KEYFRAME_INTERVAL = 32
+# 单次区间请求最多返回的帧数
+HISTORY_MAX_RANGE = 1024
+# 运行日志（src/main.py 写入的 env.log、model.log）所在目录，日志接口只读取其中的文件
+LOGS_DIR = os.path.join(ROOT_DIR, "logs")
+# 单次日志窗口请求最多返回的时间步（或对话轮次）数
+LOG_WINDOW_MAX = 200
+if STALE_FRAME_POLICY not in ("coalesce", "drop"):
+    raise ValueError(f"Unknown broadcast.stale_frames policy {STALE_FRAME_POLICY}, expected 'coalesce' or 'drop'")
+
 app = FastAPI()
 
 # 配置 CORS
@@ -30,20 +84,149 @@ app.add_middleware(
 class WSMessageType(str, Enum):
     """WebSocket 消息类型"""
     LOG = "log"
+    LOG_BATCH = "log_batch"
     TASK_STATUS = "task_status"
     MAP_UPDATE = "map_update"
     CONFIG_UPDATE = "config_update"
     AGENTS_UPDATE = "agents_update"
     ACTIONS_UPDATE = "actions_update"
     SYSTEM_RESET = "system_reset"
-    EXECUTION_HISTORY = "execution_history"
+    HISTORY_UPDATE = "history_update"
     PING = "ping"
     PONG = "pong"
     CONNECTED = "connected"
+    SNAPSHOT = "snapshot"
 
-# 全局状态
-class ServerState:
+# 携带完整当前状态的消息，新帧发出后，队列中的旧帧即已过期
+SNAPSHOT_TYPES = {
+    WSMessageType.MAP_UPDATE,
+    WSMessageType.CONFIG_UPDATE,
+    WSMessageType.AGENTS_UPDATE,
+    WSMessageType.ACTIONS_UPDATE,
+    WSMessageType.HISTORY_UPDATE,
+}
+
+# 前端连接可协商的协议：json 为文本帧（默认），msgpack 为二进制帧（需要安装 msgpack）
+PROTOCOLS = ("json", "msgpack") if msgpack is not None else ("json",)
+# msgpack 扩展类型
+EXT_RECORDS = 1  # 对象列表：[[键列表...], [键列表序号, 值...], ...]，每种键组合只编码一次
+EXT_DEFLATE = 2  # zlib 压缩的整帧
+
+def pack_records(value: Any) -> Any:
+    """把对象列表（地图格子、agent、批量日志等）改写为 EXT_RECORDS：键名集中为键表，各对象只保留值"""
+    if isinstance(value, dict):
+        return {key: pack_records(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [pack_records(item) for item in value]
+        if len(items) < 2 or not all(isinstance(item, dict) for item in items):
+            return items
+        shapes: Dict[tuple, int] = {}
+        rows = []
+        for item in items:
+            shape = shapes.setdefault(tuple(item), len(shapes))
+            rows.append([shape, *item.values()])
+        return msgpack.ExtType(EXT_RECORDS, msgpack.packb([[list(keys) for keys in shapes], *rows]))
+    return value
+
+class Frame:
+    """
+    一条待发送的消息。各协议的编码在第一次需要时生成并缓存，广播时所有连接、续传缓冲共用同一份。
+    fields 为附加的顶层字段（如 seq）。握手消息（connected）总是 JSON 文本，客户端据此得知协商的协议。
+    """
+    def __init__(self, message_type: WSMessageType, data: Any, **fields):
+        self.type = message_type
+        self.data = data
+        self.fields = fields
+        self.created = datetime.now()
+        self.encoded: Dict[tuple, Any] = {}
+        self.nbytes: Optional[int] = None  # 第一份编码的字节数
+
+    def payload(self, protocol: str = "json", compress: bool = False):
+        if self.type == WSMessageType.CONNECTED:
+            protocol, compress = "json", False
+        key = (protocol, compress)
+        if key not in self.encoded:
+            encoded = self.encoded[key] = self._encode(protocol, compress)
+            if self.nbytes is None:
+                # JSON 文本按 UTF-8 计字节，中文日志等非 ASCII 字符占多个字节
+                self.nbytes = len(encoded.encode("utf-8")) if isinstance(encoded, str) else len(encoded)
+        return self.encoded[key]
+
+    def _encode(self, protocol: str, compress: bool):
+        if protocol == "msgpack":
+            packed = msgpack.packb({
+                "type": self.type.value,
+                "data": pack_records(self.data),
+                "timestamp": self.created.timestamp(),
+                **self.fields
+            })
+            if compress and len(packed) >= PACKED_COMPRESS_MIN:
+                packed = msgpack.packb(msgpack.ExtType(EXT_DEFLATE, zlib.compress(packed)))
+            return packed
+        text = self.payload("json") if compress else json.dumps({
+            "type": self.type,
+            "data": self.data,
+            "timestamp": self.created.isoformat(),
+            **self.fields
+        }, separators=(",", ":"), ensure_ascii=False)
+        # JSON 协议只压缩快照
+        return zlib.compress(text.encode("utf-8")) if compress and self.type == WSMessageType.SNAPSHOT else text
+
+    @property
+    def size(self) -> int:
+        """已生成的编码中第一份的字节数，用于续传缓冲的容量统计"""
+        if self.nbytes is None:
+            self.payload()
+        return self.nbytes
+
+class HistoryStore:
+    """
+    执行历史（格式见 src/game/history.py）：按到达顺序保存 agent 发来的增量帧，并每隔
+    HISTORY_KEYFRAME_INTERVAL 帧保存一份完整世界作为关键帧。广播只发送历史的元信息，前端按需请求区间，
+    每个区间的第一帧还原为完整世界，其余仍为增量，因此区间可以独立解码。
+    """
     def __init__(self):
+        self.start(None)
+
+    def start(self, run: Optional[str]):
+        self.run = run
+        self.frames: List[dict] = []
+        self.keyframes: Dict[int, dict] = {}
+        self.world: Optional[dict] = None  # 最后一帧的世界
+        self.done = False
+
+    def append(self, frames: List[dict]):
+        for frame in frames:
+            world = frame["world"] if "world" in frame else apply_delta(self.world, frame["delta"])
+            index = len(self.frames)
+            if index % HISTORY_KEYFRAME_INTERVAL == 0:
+                self.keyframes[index] = world
+            self.frames.append({"index": index, "time": frame["time"], "delta": frame["delta"]} if "delta" in frame else frame)
+            self.world = world
+
+    def world_at(self, index: int) -> dict:
+        base = index - index % HISTORY_KEYFRAME_INTERVAL
+        world = self.keyframes[base]
+        for frame in self.frames[base + 1:index + 1]:
+            world = apply_delta(world, frame["delta"])
+        return world
+
+    def range(self, start: int, end: int) -> List[dict]:
+        """帧 [start, end)，第一帧为完整世界"""
+        start, end = max(start, 0), min(end, len(self.frames), start + HISTORY_MAX_RANGE)
+        if start >= end:
+            return []
+        first = {"index": start, "time": self.frames[start]["time"], "world": self.world_at(start)}
+        return [first] + self.frames[start + 1:end]
+
+    def meta(self) -> dict:
+        return {"run": self.run, "length": len(self.frames), "done": self.done}
+
+# 会话状态：每个会话有独立的世界、动作、日志、执行历史和广播组
+class ServerState:
+    def __init__(self, session_id: str = DEFAULT_SESSION):
+        self.session_id = session_id
+        self.last_active = time.monotonic()
         self.current_actions: Dict[str, List[Dict[str, Any]]] = {}
         self.world_state: Optional[dict] = None
         self.agents: List[str] = []
@@ -51,10 +234,23 @@ class ServerState:
         self.orders: List[str] = []
         self.logs: deque = deque(maxlen=1000)
         self.completed = False
-        self.execution_history: List[dict] = []
+        self.history = HistoryStore()
+        self.simulator: Optional[Simulator] = None  # 初始状态的无头模拟器，用于计划预览
         self.agent_ws: Optional[WebSocket] = None  # Human.py 的 WebSocket 连接
+        self.manager = ConnectionManager(self)
 
-state = ServerState()
+    @property
+    def idle(self) -> bool:
+        return not self.manager.connections and self.agent_ws is None
+
+    def summary(self) -> dict:
+        return {
+            "session": self.session_id,
+            "websocket_connections": len(self.manager.connections),
+            "agent_connected": self.agent_ws is not None,
+            "completed": self.completed,
+            "idle_seconds": round(time.monotonic() - self.last_active, 1),
+        }
 
 # 数据模型
 class Action(BaseModel):
@@ -76,111 +272,211 @@ class LogMessage(BaseModel):
     message: str
     timestamp: Optional[str] = None
 
+class Scenario(BaseModel):
+    """测试的初始世界（见 src/game/preview.py 的 scenario_of）"""
+    map: Dict[str, Any]
+    objects: List[Dict[str, Any]]
+    recipes: List[Dict[str, Any]]
+    orders: List[str]
+
+class PreviewRequest(BaseModel):
+    actions: Optional[Dict[str, List[Dict[str, Any]]]] = None  # 缺省时预览服务器上保存的动作
+    until: Optional[int] = None  # 只模拟到该时刻
+
+class HistoryFrames(BaseModel):
+    run: str
+    start: int  # 第一帧的序号，须与已收到的帧数相同
+    frames: List[Dict[str, Any]]
+    done: bool = False
+
+class LogBatch(BaseModel):
+    logs: List[LogMessage]
+    dropped: int = 0  # agent 端因缓冲区已满丢弃的日志条数
+
+class ClientConnection:
+    """
+    一个前端连接：有界发送队列加独立的发送任务。
+    广播只把帧放进队列，慢客户端只会拖慢自己，不会阻塞其他连接和触发广播的 HTTP 请求。
+    """
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager", protocol: str = "json", compress: bool = False):
+        self.websocket = websocket
+        self.manager = manager
+        self.protocol = protocol
+        self.compress = compress
+        self.queue: deque = deque()  # [message_type, Frame]
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.dropped = 0
+        self.closed = False
+        self.writer = asyncio.create_task(self._write())
+
+    def put(self, message_type: WSMessageType, frame: Frame, bounded: bool = True) -> bool:
+        """放入发送队列；队列已满且没有可丢弃的快照帧时返回 False"""
+        if self.closed:
+            return False
+        if message_type in SNAPSHOT_TYPES and STALE_FRAME_POLICY == "coalesce":
+            # 移除旧帧后追加新帧，保持队列按 seq 递增
+            stale = next((frame for frame in self.queue if frame[0] == message_type), None)
+            if stale is not None:
+                self.queue.remove(stale)
+                self.coalesced += 1
+        if bounded and len(self.queue) >= CLIENT_QUEUE_SIZE:
+            stale = next((frame for frame in self.queue if frame[0] in SNAPSHOT_TYPES), None)
+            if stale is None:
+                return False
+            self.queue.remove(stale)
+            self.dropped += 1
+        self.queue.append([message_type, frame])
+        self.ready.set()
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                if not self.queue:
+                    self.ready.clear()
+                    await self.ready.wait()
+                    continue
+                _, frame = self.queue.popleft()
+                payload = frame.payload(self.protocol, self.compress)
+                if isinstance(payload, bytes):
+                    await self.websocket.send_bytes(payload)
+                else:
+                    await self.websocket.send_text(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error sending to client: {e}")
+        finally:
+            self.closed = True
+            self.manager.disconnect(self.websocket)
+
+    async def close(self, code: int = 1000):
+        """停止发送任务并关闭连接"""
+        self.closed = True
+        self.writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
 # WebSocket 连接管理
 class ConnectionManager:
-    def __init__(self):
-        self.connections: set[WebSocket] = set()
+    """一个会话的广播组：该会话的前端连接、广播编号与续传缓冲"""
+    def __init__(self, state: ServerState):
+        self.state = state
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.slow_disconnects = 0
+        # 广播帧按 seq 递增编号；epoch 标识本次服务器进程，客户端据此判断能否续传
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.replay: deque = deque()  # (seq, message_type, Frame)
+        self.replay_bytes = 0
+        # 已被淘汰的帧中最大的 seq，since 小于它的客户端无法续传
+        self.replay_floor = 0
+        self.resumes = 0
+        self.snapshots = 0
 
     async def connect(self, websocket: WebSocket):
-        """接受新的 WebSocket 连接"""
+        """
+        接受新的 WebSocket 连接。客户端带上 epoch 和 since（最后收到的 seq）重连时，只补发之后的广播帧，
+        否则发送一条完整快照。protocol=msgpack 时（服务器已安装 msgpack）之后的帧为 msgpack 二进制帧，
+        compress=deflate 时快照（msgpack 协议下为所有较大的帧）以 zlib 压缩；协商结果在握手消息中返回。
+        """
         await websocket.accept()
-        self.connections.add(websocket)
-        print(f"WebSocket connected. Total connections: {len(self.connections)}")
+        params = websocket.query_params
+        protocol = params.get("protocol", "json")
+        client = ClientConnection(websocket, self,
+                                  protocol=protocol if protocol in PROTOCOLS else "json",
+                                  compress=params.get("compress") == "deflate")
+        self.connections[websocket] = client
+        print(f"WebSocket connected to session {self.state.session_id} ({client.protocol}). Total connections: {len(self.connections)}")
         
-        # 发送初始数据给新连接
-        await self.send_initial_data(websocket)
+        # 初始数据先于之后的广播进入该连接的队列
+        since = params.get("since")
+        if params.get("epoch") == self.epoch and since is not None and since.isdigit() and self.replay_floor <= int(since) <= self.seq:
+            self.resume(client, int(since))
+        else:
+            self.send_initial_data(client)
+
+    def resume(self, client: ClientConnection, since: int):
+        """补发 seq 大于 since 的广播帧"""
+        frames = [(message_type, frame) for seq, message_type, frame in self.replay if seq > since]
+        client.put(WSMessageType.CONNECTED, Frame(WSMessageType.CONNECTED, {
+            "message": "Connected to ParaCook server",
+            "connected": True,
+            "epoch": self.epoch,
+            "resumed": True,
+            "protocol": client.protocol
+        }), bounded=False)
+        for message_type, frame in frames:
+            client.put(message_type, frame, bounded=False)
+        self.resumes += 1
+        print(f"📤 Resumed client from seq {since}: {len(frames)} frames")
+
+    def remember(self, seq: int, message_type: WSMessageType, frame: Frame):
+        """记录广播帧以便续传；快照类帧只保留最新一条"""
+        if message_type in SNAPSHOT_TYPES:
+            for entry in self.replay:
+                if entry[1] == message_type:
+                    self.replay.remove(entry)
+                    self.replay_bytes -= entry[2].size
+                    break
+        self.replay.append((seq, message_type, frame))
+        self.replay_bytes += frame.size
+        while self.replay_bytes > REPLAY_BUFFER_BYTES and len(self.replay) > 1:
+            evicted = self.replay.popleft()
+            self.replay_bytes -= evicted[2].size
+            self.replay_floor = max(self.replay_floor, evicted[0])
 
     def disconnect(self, websocket: WebSocket):
         """断开 WebSocket 连接"""
-        self.connections.discard(websocket)
-        print(f"WebSocket disconnected. Total connections: {len(self.connections)}")
+        client = self.connections.pop(websocket, None)
+        if client is None:
+            return
+        if not client.closed:
+            client.closed = True
+            client.writer.cancel()
+        self.state.last_active = time.monotonic()
+        print(f"WebSocket disconnected from session {self.state.session_id}. Total connections: {len(self.connections)}")
+
+    def send(self, websocket: WebSocket, message_type: WSMessageType, data: Any):
+        """向单个连接发送消息"""
+        client = self.connections.get(websocket)
+        if client is not None:
+            client.put(message_type, Frame(message_type, data))
+
+    def snapshot(self) -> dict:
+        """当前全部状态"""
+        return {
+            "logs": list(self.state.logs),
+            "task_status": {"completed": self.state.completed},
+            "world": self.state.world_state,
+            "config": self._get_config_data(),
+            "agents": self.state.agents,
+            "actions": self.state.current_actions,
+            "history": self.state.history.meta()
+        }
 
-    async def send_initial_data(self, websocket: WebSocket):
-        """向新连接发送当前所有状态"""
+    def send_initial_data(self, client: ClientConnection):
+        """向新连接发送一条包含当前所有状态的快照，version 为快照所对应的最后一个广播 seq"""
         try:
-            print("="*60)
-            print("📤 Sending initial data to new WebSocket client...")
-            
-            # 1. 发送连接成功消息
-            print("  1️⃣ Sending connection confirmation...")
-            await websocket.send_json({
-                "type": WSMessageType.CONNECTED,
-                "data": {
-                    "message": "Connected to ParaCook server",
-                    "connected": True
-                },
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # 2. 发送历史日志
-            log_count = len(state.logs)
-            print(f"  2️⃣ Sending {log_count} log entries...")
-            for log_entry in state.logs:
-                await websocket.send_json({
-                    "type": WSMessageType.LOG,
-                    "data": log_entry,
-                    "timestamp": datetime.now().isoformat()
-                })
-            
-            # 3. 发送任务状态
-            print(f"  3️⃣ Sending task status (completed={state.completed})...")
-            await websocket.send_json({
-                "type": WSMessageType.TASK_STATUS,
-                "data": {
-                    "completed": state.completed,
-                },
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # 4. 发送地图数据
-            if state.world_state:
-                print(f"  4️⃣ Sending world state (tiles={len(state.world_state.get('tiles', []))})...")
-                await websocket.send_json({
-                    "type": WSMessageType.MAP_UPDATE,
-                    "data": state.world_state,
-                    "timestamp": datetime.now().isoformat()
-                })
-            else:
-                print(f"  4️⃣ ⚠️ No world state available")
-            
-            # 5. 发送配置信息
-            config_data = self._get_config_data()
-            print(f"  5️⃣ Sending config (agents={config_data.get('num_agents')}, recipes={config_data.get('recipes_count')})...")
-            await websocket.send_json({
-                "type": WSMessageType.CONFIG_UPDATE,
-                "data": config_data,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # 6. 发送 agent 列表
-            print(f"  6️⃣ Sending agents: {state.agents}")
-            await websocket.send_json({
-                "type": WSMessageType.AGENTS_UPDATE,
-                "data": state.agents,
-                "timestamp": datetime.now().isoformat()
-            })
-            
-            # 7. 发送当前动作
-            if state.current_actions:
-                action_count = sum(len(acts) for acts in state.current_actions.values())
-                print(f"  7️⃣ Sending actions ({action_count} total actions for {len(state.current_actions)} agents)...")
-                await websocket.send_json({
-                    "type": WSMessageType.ACTIONS_UPDATE,
-                    "data": {"actions": state.current_actions},
-                    "timestamp": datetime.now().isoformat()
-                })
-            else:
-                print(f"  7️⃣ No actions to send")
-            
-            print("✅ Initial data sent successfully!")
-            print(f"   Summary:")
-            print(f"   - Logs: {log_count}")
-            print(f"   - Agents: {state.agents}")
-            print(f"   - Recipes: {state.recipes}")
-            print(f"   - Orders: {state.orders}")
-            print(f"   - Task completed: {state.completed}")
-            print("="*60)
-            
+            snapshot = self.snapshot()
+            client.put(WSMessageType.CONNECTED, Frame(WSMessageType.CONNECTED, {
+                "message": "Connected to ParaCook server",
+                "connected": True,
+                "epoch": self.epoch,
+                "resumed": False,
+                "protocol": client.protocol
+            }), bounded=False)
+            frame = Frame(WSMessageType.SNAPSHOT, snapshot, version=self.seq, epoch=self.epoch)
+            payload = frame.payload(client.protocol, client.compress)
+            client.put(WSMessageType.SNAPSHOT, frame, bounded=False)
+            self.snapshots += 1
+            world = snapshot["world"]
+            print(f"📤 Sent snapshot v{self.seq}: {len(snapshot['logs'])} logs, "
+                  f"{len(world.get('tiles', [])) if world else 0} tiles, agents={self.state.agents}, "
+                  f"{len(payload)} bytes ({client.protocol}{', deflate' if client.compress else ''})")
         except Exception as e:
             print(f"❌ Error sending initial data: {e}")
             import traceback
@@ -189,89 +485,153 @@ class ConnectionManager:
     def _get_config_data(self) -> dict:
         """获取配置数据"""
         return {
-            "num_agents": len(state.agents),
-            "world_steps": len(state.logs),
-            "actions_count": sum(len(acts) for acts in state.current_actions.values()),
-            "status": "completed" if state.completed else "running",
-            "recipes_count": len(state.recipes),
-            "orders_count": len(state.orders),
-            "recipes": state.recipes,
-            "orders": state.orders
+            "num_agents": len(self.state.agents),
+            "world_steps": len(self.state.logs),
+            "actions_count": sum(len(acts) for acts in self.state.current_actions.values()),
+            "status": "completed" if self.state.completed else "running",
+            "recipes_count": len(self.state.recipes),
+            "orders_count": len(self.state.orders),
+            "recipes": self.state.recipes,
+            "orders": self.state.orders
         }
 
     async def broadcast(self, message_type: WSMessageType, data: Any):
-        """广播消息到所有前端连接"""
-        if not self.connections:
-            return
-            
-        message = {
-            "type": message_type,
-            "data": data,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        disconnected = set()
-        for ws in self.connections:
-            try:
-                await ws.send_json(message)
-            except WebSocketDisconnect:
-                disconnected.add(ws)
-            except Exception as e:
-                print(f"Error broadcasting to client: {e}")
-                disconnected.add(ws)
+        """
+        广播消息到所有前端连接：编号并序列化一次后放入各连接的发送队列，不等待发送完成。
+        没有连接时也要编号并记录，供之后重连的客户端续传。
+        """
+        self.seq += 1
+        frame = Frame(message_type, data, seq=self.seq)
+        # 在这里为在线连接用到的每种编码各编码一次，编码错误由触发广播的请求报告
+        for protocol, compress in {(client.protocol, client.compress) for client in self.connections.values()}:
+            frame.payload(protocol, compress)
+        self.remember(self.seq, message_type, frame)
+        slow = [client for client in self.connections.values() if not client.put(message_type, frame)]
         
-        # 移除断开的连接
-        self.connections.difference_update(disconnected)
+        # 队列已满的连接跟不上广播，断开后由客户端重连并重新同步
+        for client in slow:
+            self.connections.pop(client.websocket, None)
+            self.slow_disconnects += 1
+            asyncio.create_task(client.close(code=1013))
         
-        if disconnected:
-            print(f"Removed {len(disconnected)} disconnected clients")
+        if slow:
+            print(f"Disconnected {len(slow)} slow clients (send queue full)")
+
+    def stats(self) -> dict:
+        """发送队列统计"""
+        clients = list(self.connections.values())
+        return {
+            "queued_frames": sum(len(client.queue) for client in clients),
+            "coalesced_frames": sum(client.coalesced for client in clients),
+            "dropped_frames": sum(client.dropped for client in clients),
+            "slow_disconnects": self.slow_disconnects,
+            "stale_frames": STALE_FRAME_POLICY,
+            "seq": self.seq,
+            "replay_frames": len(self.replay),
+            "replay_bytes": self.replay_bytes,
+            "resumes": self.resumes,
+            "snapshots": self.snapshots,
+            "protocols": {protocol: sum(client.protocol == protocol for client in clients) for protocol in PROTOCOLS},
+        }
 
     async def add_log(self, log_entry: dict):
         """添加日志并广播"""
-        state.logs.append(log_entry)
+        self.state.logs.append(log_entry)
         await self.broadcast(WSMessageType.LOG, log_entry)
 
-manager = ConnectionManager()
+    async def add_logs(self, log_entries: List[dict]):
+        """批量添加日志，整批作为一帧广播"""
+        self.state.logs.extend(log_entries)
+        await self.broadcast(WSMessageType.LOG_BATCH, log_entries)
+
+class SessionRegistry:
+    """
+    按会话 ID 保存的会话状态。会话在第一次被访问时创建；空闲超过 SESSION_IDLE_TIMEOUT 秒的会话
+    在之后的访问中被回收（惰性清理，无需后台任务）。
+    """
+    def __init__(self):
+        self.sessions: Dict[str, ServerState] = {}
+        self.last_sweep = time.monotonic()
+        self.evicted = 0
+
+    def get(self, session_id: str) -> ServerState:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise HTTPException(status_code=400, detail=f"Invalid session id {session_id!r}")
+        now = time.monotonic()
+        if now - self.last_sweep > min(SESSION_IDLE_TIMEOUT, 60):
+            self.evict_idle(now)
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= MAX_SESSIONS:
+                self.evict_idle(now)
+            if len(self.sessions) >= MAX_SESSIONS:
+                raise HTTPException(status_code=503, detail=f"Too many sessions ({MAX_SESSIONS})")
+            session = self.sessions[session_id] = ServerState(session_id)
+            print(f"🆕 Created session {session_id}")
+        session.last_active = now
+        return session
+
+    def evict_idle(self, now: float):
+        self.last_sweep = now
+        for session_id, session in list(self.sessions.items()):
+            if session.idle and now - session.last_active > SESSION_IDLE_TIMEOUT:
+                del self.sessions[session_id]
+                self.evicted += 1
+                print(f"🗑️ Evicted idle session {session_id}")
+
+    def stats(self) -> dict:
+        return {"count": len(self.sessions), "evicted": self.evicted, "max_sessions": MAX_SESSIONS}
+
+sessions = SessionRegistry()
+
+def session_state(connection: HTTPConnection) -> ServerState:
+    """路由所属会话：/sessions/{session_id} 前缀下为对应会话，旧路由为默认会话"""
+    return sessions.get(connection.path_params.get("session_id", DEFAULT_SESSION))
+
+router = APIRouter()
 
 # ============= API 路由 =============
 
-@app.get("/")
-async def root():
+@router.get("/")
+async def root(state: ServerState = Depends(session_state)):
     return {
         "message": "ParaCook Human Agent API Server",
         "version": "2.0.0",
         "status": "running",
-        "websocket_connections": len(manager.connections),
-        "agent_connected": state.agent_ws is not None
+        "session": state.session_id,
+        "websocket_connections": len(state.manager.connections),
+        "agent_connected": state.agent_ws is not None,
+        "broadcast": state.manager.stats(),
+        "sessions": sessions.stats()
     }
 
-@app.get("/api/actions")
-async def get_actions():
+@router.get("/api/actions")
+async def get_actions(state: ServerState = Depends(session_state)):
     """获取当前的动作列表"""
     return {"success": True, "data": state.current_actions}
 
-@app.post("/api/actions")
-async def save_actions(data: ActionsData):
+@router.post("/api/actions")
+async def save_actions(data: ActionsData, state: ServerState = Depends(session_state)):
     """保存动作列表"""
     state.current_actions = data.actions
     
     # 广播动作更新
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.ACTIONS_UPDATE,
         {"actions": state.current_actions}
     )
     
     # 广播配置更新
-    config_data = manager._get_config_data()
-    await manager.broadcast(
+    config_data = state.manager._get_config_data()
+    await state.manager.broadcast(
         WSMessageType.CONFIG_UPDATE,
         config_data
     )
     
     return {"success": True, "message": "Actions saved"}
 
-@app.post("/api/actions/add")
-async def add_action(agent: str, action: Action):
+@router.post("/api/actions/add")
+async def add_action(agent: str, action: Action, state: ServerState = Depends(session_state)):
     """为指定 agent 添加一个动作"""
     if agent not in state.current_actions:
         state.current_actions[agent] = []
@@ -280,14 +640,14 @@ async def add_action(agent: str, action: Action):
     state.current_actions[agent].append(action_dict)
     
     # 广播动作更新
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.ACTIONS_UPDATE,
         {"actions": state.current_actions}
     )
     
     # 广播配置更新
-    config_data = manager._get_config_data()
-    await manager.broadcast(
+    config_data = state.manager._get_config_data()
+    await state.manager.broadcast(
         WSMessageType.CONFIG_UPDATE,
         config_data
     )
@@ -298,8 +658,8 @@ async def add_action(agent: str, action: Action):
         "data": state.current_actions
     }
 
-@app.delete("/api/actions/{agent}/{index}")
-async def remove_action(agent: str, index: int):
+@router.delete("/api/actions/{agent}/{index}")
+async def remove_action(agent: str, index: int, state: ServerState = Depends(session_state)):
     """删除指定动作"""
     if agent not in state.current_actions:
         raise HTTPException(status_code=404, detail=f"Agent {agent} not found")
@@ -313,42 +673,42 @@ async def remove_action(agent: str, index: int):
         del state.current_actions[agent]
     
     # 广播动作更新
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.ACTIONS_UPDATE,
         {"actions": state.current_actions}
     )
     
     # 广播配置更新
-    config_data = manager._get_config_data()
-    await manager.broadcast(
+    config_data = state.manager._get_config_data()
+    await state.manager.broadcast(
         WSMessageType.CONFIG_UPDATE,
         config_data
     )
     
     return {"success": True, "data": state.current_actions}
 
-@app.delete("/api/actions")
-async def clear_actions():
+@router.delete("/api/actions")
+async def clear_actions(state: ServerState = Depends(session_state)):
     """清空所有动作"""
     state.current_actions = {}
     
     # 广播动作更新
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.ACTIONS_UPDATE,
         {"actions": {}}
     )
     
     # 广播配置更新
-    config_data = manager._get_config_data()
-    await manager.broadcast(
+    config_data = state.manager._get_config_data()
+    await state.manager.broadcast(
         WSMessageType.CONFIG_UPDATE,
         config_data
     )
     
     return {"success": True, "message": "All actions cleared"}
 
-@app.post("/api/actions/execute")
-async def execute_actions():
+@router.post("/api/actions/execute")
+async def execute_actions(state: ServerState = Depends(session_state)):
     """触发执行动作计划（通过 WebSocket 通知 Human.py）"""
     if not state.current_actions:
         return {"success": False, "message": "No actions to execute"}
@@ -363,7 +723,7 @@ async def execute_actions():
             print(f"✅ Sent execute command to Human.py via WebSocket")
             
             # 广播执行状态到前端
-            await manager.broadcast(
+            await state.manager.broadcast(
                 WSMessageType.TASK_STATUS,
                 {
                     "completed": state.completed,
@@ -378,8 +738,30 @@ async def execute_actions():
     else:
         return {"success": False, "message": "Agent not connected"}
 
-@app.get("/api/world")
-async def get_world():
+@router.post("/api/actions/preview")
+async def preview_actions(data: PreviewRequest, state: ServerState = Depends(session_state)):
+    """
+    用服务器内嵌的无头模拟器从初始状态评估草稿计划（整个计划或到 until 时刻为止），
+    返回完成时间、错误和紧凑的时间线；不经过 Human.py，也不改变会话状态
+    """
+    if state.simulator is None:
+        return {"success": False, "message": "Simulator not ready"}
+    start = time.perf_counter()
+    preview = preview_plan(state.simulator, data.actions if data.actions is not None else state.current_actions, data.until)
+    preview["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return {"success": True, "data": preview}
+
+@router.post("/api/simulator")
+async def set_simulator(data: Scenario, state: ServerState = Depends(session_state)):
+    """接收测试的初始世界（由 Human.py 调用），用于计划预览"""
+    try:
+        state.simulator = build_simulator(data.model_dump())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario: {e}")
+    return {"success": True, "agents": list(state.simulator.world.agents)}
+
+@router.get("/api/world")
+async def get_world(state: ServerState = Depends(session_state)):
     """获取当前世界状态"""
     if state.world_state:
         return {
@@ -393,8 +775,8 @@ async def get_world():
         }
     return {"success": False, "message": "World state not ready"}
 
-@app.post("/api/world/update")
-async def update_world(data: WorldState):
+@router.post("/api/world/update")
+async def update_world(data: WorldState, state: ServerState = Depends(session_state)):
     """更新世界状态（由 Human.py 调用）"""
     try:
         print(f"Received world update: agents={data.agents}, orders count={len(data.orders)}")
@@ -404,20 +786,20 @@ async def update_world(data: WorldState):
         state.orders = data.orders
         
         # 广播地图更新
-        await manager.broadcast(
+        await state.manager.broadcast(
             WSMessageType.MAP_UPDATE,
             data.world
         )
         
         # 广播 agent 列表更新
-        await manager.broadcast(
+        await state.manager.broadcast(
             WSMessageType.AGENTS_UPDATE,
             state.agents
         )
         
         # 广播配置更新
-        config_data = manager._get_config_data()
-        await manager.broadcast(
+        config_data = state.manager._get_config_data()
+        await state.manager.broadcast(
             WSMessageType.CONFIG_UPDATE,
             config_data
         )
@@ -429,71 +811,148 @@ async def update_world(data: WorldState):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/world/history")
-async def set_execution_history(data: dict):
-    """接收完整的执行历史"""
+@router.post("/api/world/history/frames")
+async def add_history_frames(data: HistoryFrames, state: ServerState = Depends(session_state)):
+    """接收执行历史的一块增量帧（由 Human.py 在模拟运行期间调用），start 为 0 时开始新的一次运行"""
+    history = state.history
+    if data.start == 0 and data.run != history.run:
+        history.start(data.run)
+    elif data.run != history.run or data.start != len(history.frames):
+        raise HTTPException(status_code=409, detail=f"Expected frame {len(history.frames)} of run {history.run}")
     try:
-        state.execution_history = data.get("history", [])
-        
-        # 通过 WebSocket 广播给所有前端
-        await manager.broadcast(
-            WSMessageType.EXECUTION_HISTORY,
-            {"history": state.execution_history}
-        )
-        
-        return {"success": True, "steps": len(state.execution_history)}
+        history.append(data.frames)
+    except (KeyError, TypeError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed history frame: {e}")
+    history.done = data.done
+
+    # 只广播元信息，前端按需请求帧
+    await state.manager.broadcast(WSMessageType.HISTORY_UPDATE, history.meta())
+    return {"success": True, "steps": len(history.frames)}
+
+@router.post("/api/world/history")
+async def set_execution_history(data: dict, state: ServerState = Depends(session_state)):
+    """接收完整的执行历史（{time, world} 列表），转换为增量帧保存"""
+    try:
+        state.history.start(uuid.uuid4().hex)
+        state.history.append(encode_history(data.get("history", [])))
+        state.history.done = True
+        await state.manager.broadcast(WSMessageType.HISTORY_UPDATE, state.history.meta())
+        return {"success": True, "steps": len(state.history.frames)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/api/world/history")
+async def get_execution_history(start: int = 0, end: Optional[int] = None, run: Optional[str] = None, state: ServerState = Depends(session_state)):
+    """获取执行历史的帧区间 [start, end)（单次最多 HISTORY_MAX_RANGE 帧），第一帧为完整世界，其余为增量"""
+    history = state.history
+    if run is not None and run != history.run:
+        raise HTTPException(status_code=404, detail=f"History of run {run} is no longer available")
+    frames = history.range(start, len(history.frames) if end is None else end)
+    return {"success": True, "data": dict(history.meta(), frames=frames)}
 
-@app.get("/api/agents")
-async def get_agents():
+
+@router.get("/api/agents")
+async def get_agents(state: ServerState = Depends(session_state)):
     """获取 agent 列表"""
     return {"success": True, "data": state.agents}
 
-@app.get("/api/recipes")
-async def get_recipes():
+@router.get("/api/recipes")
+async def get_recipes(state: ServerState = Depends(session_state)):
     """获取配方列表"""
     return {"success": True, "data": state.recipes}
 
-@app.get("/api/orders")
-async def get_orders():
+@router.get("/api/orders")
+async def get_orders(state: ServerState = Depends(session_state)):
     """获取订单列表"""
     return {"success": True, "data": state.orders}
 
-@app.get("/api/logs")
-async def get_logs(limit: int = 100):
+@router.get("/api/logs")
+async def get_logs(limit: int = 100, state: ServerState = Depends(session_state)):
     """获取日志"""
     logs = list(state.logs)[-limit:]
     return {"success": True, "data": logs}
 
-@app.post("/api/logs")
-async def add_log(log: LogMessage):
+@router.post("/api/logs")
+async def add_log(log: LogMessage, state: ServerState = Depends(session_state)):
     """添加日志"""
     log_entry = log.model_dump()
-    await manager.add_log(log_entry)
+    await state.manager.add_log(log_entry)
     return {"success": True}
 
-@app.delete("/api/logs")
-async def clear_logs():
+@router.post("/api/logs/batch")
+async def add_logs(batch: LogBatch, state: ServerState = Depends(session_state)):
+    """批量添加日志（由 Human.py 的日志转发线程调用）"""
+    log_entries = [log.model_dump() for log in batch.logs]
+    if batch.dropped:
+        log_entries.append({
+            "level": "WARNING",
+            "message": f"{batch.dropped} log records were dropped by the agent (log buffer full)",
+            "timestamp": datetime.now().strftime("%H:%M:%S")
+        })
+    if log_entries:
+        await state.manager.add_logs(log_entries)
+    return {"success": True, "count": len(log_entries)}
+
+@router.delete("/api/logs")
+async def clear_logs(state: ServerState = Depends(session_state)):
     """清空日志"""
     state.logs.clear()
     
     # 广播日志清空
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.LOG,
         {"type": "clear"}
     )
     
     return {"success": True, "message": "Logs cleared"}
 
-@app.post("/api/task/complete")
-async def mark_task_complete():
+def run_log_path(path: str) -> str:
+    """LOGS_DIR 下的日志文件的绝对路径，不在其中或不存在时 404"""
+    full = os.path.realpath(os.path.join(LOGS_DIR, path))
+    if not full.startswith(os.path.realpath(LOGS_DIR) + os.sep) or not os.path.isfile(full):
+        raise HTTPException(status_code=404, detail=f"No such run log: {path}")
+    return full
+
+@router.get("/api/runs/logs")
+async def list_run_logs(limit: int = 100):
+    """最近修改的运行日志（相对 LOGS_DIR 的路径）"""
+    def scan():
+        paths = []
+        for root, _, files in os.walk(LOGS_DIR):
+            paths += [os.path.join(root, name) for name in files if name.endswith(".log")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.relpath(path, LOGS_DIR) for path in paths[:limit]]
+    return {"success": True, "data": await asyncio.to_thread(scan)}
+
+@router.get("/api/runs/log/index")
+async def get_run_log_index(path: str):
+    """
+    运行日志的字节偏移索引：时间步（env.log）和对话轮次（model.log）的标签列表，
+    第一项为 None 时表示第一个边界之前的内容；索引保存在日志旁，之后只扫描新追加的部分
+    """
+    index = await asyncio.to_thread(open_log_index, run_log_path(path))
+    return {"success": True, "data": dict(index.summary(), path=path)}
+
+@router.get("/api/runs/log/window")
+async def get_run_log_window(path: str, kind: str = "steps", start: int = 0, count: int = 20):
+    """运行日志中从第 start 个时间步（kind=steps）或对话轮次（kind=turns）起 count 个的原始文本"""
+    if kind not in ("steps", "turns"):
+        raise HTTPException(status_code=400, detail=f"Unknown kind {kind}, expected 'steps' or 'turns'")
+    full = run_log_path(path)
+
+    def read():
+        index = open_log_index(full)
+        begin, end = index.span(kind, start, min(count, LOG_WINDOW_MAX))
+        return {"start": begin, "end": end, "size": index.size, "text": index.read(begin, end)}
+    return {"success": True, "data": await asyncio.to_thread(read)}
+
+@router.post("/api/task/complete")
+async def mark_task_complete(state: ServerState = Depends(session_state)):
     """标记任务完成"""
     state.completed = True
     
     # 广播任务完成
-    await manager.broadcast(
+    await state.manager.broadcast(
         WSMessageType.TASK_STATUS,
         {
             "completed": True,
@@ -502,24 +961,24 @@ async def mark_task_complete():
     )
     
     # 广播配置更新
-    config_data = manager._get_config_data()
-    await manager.broadcast(
+    config_data = state.manager._get_config_data()
+    await state.manager.broadcast(
         WSMessageType.CONFIG_UPDATE,
         config_data
     )
     
     return {"success": True}
 
-@app.get("/api/task/status")
-async def get_task_status():
+@router.get("/api/task/status")
+async def get_task_status(state: ServerState = Depends(session_state)):
     """获取任务状态"""
     return {
         "success": True,
         "completed": state.completed
     }
 
-@app.post("/api/reset")
-async def reset_all():
+@router.post("/api/reset")
+async def reset_all(state: ServerState = Depends(session_state)):
     """重置所有状态（通过 WebSocket 通知 Human.py）"""
     try:
         # 通过 WebSocket 通知 Human.py 重置
@@ -539,7 +998,7 @@ async def reset_all():
         state.current_actions = {}
         
         # 广播系统重置
-        await manager.broadcast(
+        await state.manager.broadcast(
             WSMessageType.SYSTEM_RESET,
             {
                 "message": "System has been reset to initial state",
@@ -548,20 +1007,20 @@ async def reset_all():
         )
         
         # 广播日志清空
-        await manager.broadcast(
+        await state.manager.broadcast(
             WSMessageType.LOG,
             {"type": "clear"}
         )
         
         # 广播任务状态重置
-        await manager.broadcast(
+        await state.manager.broadcast(
             WSMessageType.TASK_STATUS,
             {"completed": False, "reset": True}
         )
         
         # 广播配置更新
-        config_data = manager._get_config_data()
-        await manager.broadcast(
+        config_data = state.manager._get_config_data()
+        await state.manager.broadcast(
             WSMessageType.CONFIG_UPDATE,
             config_data
         )
@@ -573,40 +1032,38 @@ async def reset_all():
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/config")
-async def get_config_info():
+@router.get("/api/config")
+async def get_config_info(state: ServerState = Depends(session_state)):
     """获取配置信息"""
-    config_data = manager._get_config_data()
+    config_data = state.manager._get_config_data()
     return {"success": True, "data": config_data}
 
 # ============= WebSocket 端点 =============
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, state: ServerState = Depends(session_state)):
     """前端 WebSocket 端点"""
-    await manager.connect(websocket)
+    await state.manager.connect(websocket)
     
     try:
         while True:
             data = await websocket.receive_text()
             
             if data == "ping":
-                await websocket.send_json({
-                    "type": "pong",
-                    "timestamp": datetime.now().isoformat()
-                })
+                # 经由发送队列回复，避免与发送任务并发写同一连接
+                state.manager.send(websocket, WSMessageType.PONG, None)
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        state.manager.disconnect(websocket)
     except Exception as e:
         print(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
+        state.manager.disconnect(websocket)
 
-@app.websocket("/ws/agent")
-async def agent_websocket_endpoint(websocket: WebSocket):
+@router.websocket("/ws/agent")
+async def agent_websocket_endpoint(websocket: WebSocket, state: ServerState = Depends(session_state)):
     """Human.py 专用的 WebSocket 端点"""
     await websocket.accept()
     state.agent_ws = websocket
-    print(f"✅ Human.py agent connected via WebSocket")
+    print(f"✅ Human.py agent connected to session {state.session_id} via WebSocket")
     
     try:
         while True:
@@ -619,15 +1076,41 @@ async def agent_websocket_endpoint(websocket: WebSocket):
                     "timestamp": datetime.now().isoformat()
                 })
     except WebSocketDisconnect:
-        print(f"⚠️ Human.py agent disconnected")
-        state.agent_ws = None
+        print(f"⚠️ Human.py agent disconnected from session {state.session_id}")
     except Exception as e:
         print(f"Agent WebSocket error: {e}")
-        state.agent_ws = None
+    finally:
+        # 同一会话的 agent 重连后，旧连接的断开不影响新连接
+        if state.agent_ws is websocket:
+            state.agent_ws = None
+            state.last_active = time.monotonic()
+
+@app.get("/sessions")
+async def list_sessions():
+    """列出所有会话"""
+    return {"success": True, "data": [session.summary() for session in sessions.sessions.values()], **sessions.stats()}
+
+# 旧路由属于默认会话，/sessions/{session_id} 前缀下的同名路由属于对应会话
+app.include_router(router)
+app.include_router(router, prefix="/sessions/{session_id}")
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
+    parser = argparse.ArgumentParser(description="ParaCook GUI server")
+    parser.add_argument("--ready-fd", type=int, help="开始监听后向该文件描述符（管道写端）写入一行 ready 并关闭，供启动本服务器的进程等待")
+    args = parser.parse_args()
     print(f"Starting FastAPI server on http://{API_HOST}:{API_PORT}")
-    print(f"Frontend WebSocket endpoint: ws://{API_HOST}:{API_PORT}/ws")
-    print(f"Agent WebSocket endpoint: ws://{API_HOST}:{API_PORT}/ws/agent")
-    uvicorn.run(app, host=API_HOST, port=API_PORT)
\ No newline at end of file
+    print(f"Frontend WebSocket endpoint: ws://{API_HOST}:{API_PORT}/sessions/<session>/ws (default session: /ws)")
+    print(f"Agent WebSocket endpoint: ws://{API_HOST}:{API_PORT}/sessions/<session>/ws/agent (default session: /ws/agent)")
+    server = uvicorn.Server(uvicorn.Config(app, host=API_HOST, port=API_PORT, ws_per_message_deflate=WS_PER_MESSAGE_DEFLATE))
+    if args.ready_fd is not None:
+        # 启动失败时进程直接退出，管道随之关闭，等待方读到 EOF
+        startup = server.startup
+        async def startup_and_signal(sockets=None):
+            await startup(sockets)
+            if server.started:
+                with os.fdopen(args.ready_fd, "w") as pipe:
+                    pipe.write("ready\n")
+        server.startup = startup_and_signal
+    server.run()
@@ -3,8 +3,11 @@ import config from '../../../../config/gui_config.json'
 
 const API_HOST = config.api.host
 const API_PORT = config.api.port
-const BASE_URL = `http://${API_HOST}:${API_PORT}/api`
-const WS_URL = `ws://${API_HOST}:${API_PORT}/ws`
+// 页面地址中的 ?session=<id> 选择服务器上的会话，缺省为默认会话
+export const SESSION_ID = new URLSearchParams(window.location.search).get('session')
+export const SESSION_PREFIX = SESSION_ID ? `/sessions/${encodeURIComponent(SESSION_ID)}` : ''
+const BASE_URL = `http://${API_HOST}:${API_PORT}${SESSION_PREFIX}/api`
+const WS_URL = `ws://${API_HOST}:${API_PORT}${SESSION_PREFIX}/ws`
 
 const api = axios.create({
   baseURL: BASE_URL,
@@ -29,17 +32,26 @@ export const addAction = (agent, action) => api.post('/actions/add', action, { p
 export const removeAction = (agent, index) => api.delete(`/actions/${agent}/${index}`)
 export const clearActions = () => api.delete('/actions')
 export const executeActions = () => api.post('/actions/execute')
+// 用服务器内嵌的模拟器预览草稿计划（until 为空时模拟到结束）
+export const previewPlan = (actions, until = null) => api.post('/actions/preview', { actions, until })
 
 // World State
 export const getWorld = () => api.get('/world')
 export const getAgents = () => api.get('/agents')
 export const getRecipes = () => api.get('/recipes')
 export const getOrders = () => api.get('/orders')
+// 执行历史的帧区间 [start, end)，第一帧为完整世界，其余为增量
+export const getHistory = (run, start, end) => api.get('/world/history', { params: { run, start, end } })
 
 // Logs
 export const getLogs = (limit = 100) => api.get('/logs', { params: { limit } })
 export const clearLogs = () => api.delete('/logs')
 
+// Run Logs（logs/ 下的 env.log、model.log，按字节偏移索引分窗口读取）
+export const listRunLogs = (limit = 100) => api.get('/runs/logs', { params: { limit } })
+export const getRunLogIndex = (path) => api.get('/runs/log/index', { params: { path } })
+export const getRunLogWindow = (path, kind, start, count) => api.get('/runs/log/window', { params: { path, kind, start, count } })
+
 // Task Status
 export const getTaskStatus = () => api.get('/task/status')
 export const markTaskComplete = () => api.post('/task/complete')
@@ -1,11 +1,15 @@
 import { ref, onMounted, onUnmounted } from 'vue'
 import { ElMessage } from 'element-plus'
 import { wsService } from '../services/websocket.js'
+import { SESSION_PREFIX } from '../api/actions.js'
 import configData from '../../../../config/gui_config.json'
 
 export const API_HOST = configData.api.host
 export const API_PORT = configData.api.port
-export const WS_URL = `ws://${API_HOST}:${API_PORT}/ws`
+export const WS_URL = `ws://${API_HOST}:${API_PORT}${SESSION_PREFIX}/ws`
+// WebSocket 协议：页面地址中的 ?protocol= 优先，其次为配置 web.ws_protocol；msgpack 需要浏览器支持解压
+const requestedProtocol = new URLSearchParams(window.location.search).get('protocol') || configData.web.ws_protocol || 'json'
+export const WS_PROTOCOL = requestedProtocol === 'msgpack' && typeof DecompressionStream !== 'undefined' ? 'msgpack' : 'json'
 
 /**
  * WebSocket Composable
@@ -17,7 +21,7 @@ export function useWebSocket() {
 
   onMounted(() => {
     // 连接 WebSocket
-    wsService.connect(WS_URL)
+    wsService.connect(WS_URL, { protocol: WS_PROTOCOL })
     
     // 订阅连接状态变化
     const unsubscribe = wsService.subscribe('connected', (data) => {
@@ -1,3 +1,5 @@
+import { decode as decodeMsgpack, Deflated } from '../utils/msgpack.js'
+
 /**
  * WebSocket 服务
  * 负责管理与后端的 WebSocket 连接，处理消息分发和自动重连
@@ -12,13 +14,48 @@ class WebSocketService {
     this.isConnected = false
     this.heartbeatTimer = null
     this.url = ''
+    // 续传状态：服务器进程标识和最后收到的广播序号
+    this.epoch = null
+    this.lastSeq = 0
+    // 浏览器支持时请求压缩的快照
+    this.compress = typeof DecompressionStream !== 'undefined'
+    // 按到达顺序处理消息（压缩快照需要异步解压）
+    this.inbox = Promise.resolve()
+    // 请求的协议（json 或 msgpack）和握手消息中服务器确认的协议，服务器不支持时退回 json
+    this.requestedProtocol = 'json'
+    this.protocol = 'json'
+  }
+
+  /**
+   * 带续传参数的连接地址
+   * @returns {string}
+   */
+  connectUrl() {
+    const params = new URLSearchParams()
+    if (this.epoch) {
+      params.set('epoch', this.epoch)
+      params.set('since', String(this.lastSeq))
+    }
+    if (this.compress) {
+      params.set('compress', 'deflate')
+    }
+    if (this.requestedProtocol !== 'json') {
+      params.set('protocol', this.requestedProtocol)
+    }
+    const query = params.toString()
+    return query ? `${this.url}?${query}` : this.url
   }
 
   /**
    * 连接到 WebSocket 服务器
    * @param {string} url - WebSocket URL
+   * @param {Object} [options]
+   * @param {string} [options.protocol] - 'msgpack' 时请求二进制协议
    */
-  connect(url) {
+  connect(url, options = {}) {
+    if (options.protocol) {
+      this.requestedProtocol = options.protocol
+    }
     console.log('WebSocketService connect called with url:', url)
     if (this.ws?.readyState === WebSocket.OPEN) {
       console.log('WebSocket already connected')
@@ -26,10 +63,12 @@ class WebSocketService {
     }
 
     this.url = url
-    console.log('Connecting to WebSocket:', url)
+    const connectUrl = this.connectUrl()
+    console.log('Connecting to WebSocket:', connectUrl)
     
     try {
-      this.ws = new WebSocket(url)
+      this.ws = new WebSocket(connectUrl)
+      this.ws.binaryType = 'arraybuffer'
       this.setupEventHandlers()
     } catch (error) {
       console.error('Failed to create WebSocket:', error)
@@ -50,20 +89,7 @@ class WebSocketService {
     }
 
     this.ws.onmessage = (event) => {
-      try {
-        const message = JSON.parse(event.data)
-        console.log('📨 WebSocket message:', message.type)
-        
-        // 处理 pong 响应
-        if (message.type === 'pong') {
-          return
-        }
-        
-        // 分发消息到监听器
-        this.notifyListeners(message.type, message.data)
-      } catch (error) {
-        console.error('Failed to parse WebSocket message:', error)
-      }
+      this.inbox = this.inbox.then(() => this.handleMessage(event.data))
     }
 
     this.ws.onerror = (error) => {
@@ -82,13 +108,115 @@ class WebSocketService {
       this.stopHeartbeat()
       this.notifyListeners('connected', { connected: false })
       
-      // 如果不是正常关闭，尝试重连
-      if (!event.wasClean) {
+      // 如果不是正常关闭，或服务器因发送队列积压断开（1013），尝试重连
+      if (!event.wasClean || event.code === 1013) {
         this.scheduleReconnect()
       }
     }
   }
 
+  /**
+   * 解码一帧：文本帧为 JSON（握手消息总是文本）；二进制帧在 msgpack 协议下为 msgpack，
+   * 否则为 zlib 压缩的 JSON 快照
+   * @param {string|ArrayBuffer} raw
+   * @returns {Promise<Object>}
+   */
+  async decode(raw) {
+    if (typeof raw === 'string') {
+      return JSON.parse(raw)
+    }
+    if (this.protocol === 'msgpack') {
+      const message = decodeMsgpack(raw)
+      return message instanceof Deflated ? decodeMsgpack(await this.inflateBytes(message.bytes)) : message
+    }
+    return JSON.parse(await this.inflate(raw))
+  }
+
+  /**
+   * 解析并分发一条消息
+   * @param {string|ArrayBuffer} raw - 文本帧或二进制帧
+   */
+  async handleMessage(raw) {
+    try {
+      const message = await this.decode(raw)
+      console.log('📨 WebSocket message:', message.type)
+      
+      // 处理 pong 响应
+      if (message.type === 'pong') {
+        return
+      }
+
+      if (message.type === 'connected') {
+        this.epoch = message.data.epoch
+        this.protocol = message.data.protocol || 'json'
+      }
+
+      if (message.type === 'snapshot') {
+        this.lastSeq = message.version
+        this.applySnapshot(message.data)
+        return
+      }
+
+      // 增量更新：跳过已收到过的帧
+      if (message.seq !== undefined) {
+        if (message.seq <= this.lastSeq) {
+          return
+        }
+        this.lastSeq = message.seq
+      }
+
+      // 批量日志逐条分发给日志监听器
+      if (message.type === 'log_batch') {
+        message.data.forEach(entry => this.notifyListeners('log', entry))
+        return
+      }
+      
+      // 分发消息到监听器
+      this.notifyListeners(message.type, message.data)
+    } catch (error) {
+      console.error('Failed to parse WebSocket message:', error)
+    }
+  }
+
+  /**
+   * 解压 zlib 格式的二进制帧
+   * @param {ArrayBuffer} buffer
+   * @returns {Promise<string>}
+   */
+  async inflate(buffer) {
+    const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'))
+    return await new Response(stream).text()
+  }
+
+  /**
+   * 解压 zlib 格式的字节
+   * @param {Uint8Array} bytes
+   * @returns {Promise<Uint8Array>}
+   */
+  async inflateBytes(bytes) {
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('deflate'))
+    return new Uint8Array(await new Response(stream).arrayBuffer())
+  }
+
+  /**
+   * 把快照拆成各类型的消息分发，组件无需区分快照和增量更新
+   * @param {Object} snapshot
+   */
+  applySnapshot(snapshot) {
+    this.notifyListeners('log', { type: 'clear' })
+    snapshot.logs.forEach(entry => this.notifyListeners('log', entry))
+    this.notifyListeners('task_status', snapshot.task_status)
+    if (snapshot.world) {
+      this.notifyListeners('map_update', snapshot.world)
+    }
+    this.notifyListeners('config_update', snapshot.config)
+    this.notifyListeners('agents_update', snapshot.agents)
+    this.notifyListeners('actions_update', { actions: snapshot.actions })
+    if (snapshot.history) {
+      this.notifyListeners('history_update', snapshot.history)
+    }
+  }
+
   /**
    * 启动心跳
    */
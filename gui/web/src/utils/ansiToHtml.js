@@ -1,47 +1,81 @@
 /**
- * 将 ANSI 颜色代码转换为 HTML
- * @param {string} text - 包含 ANSI 代码的文本
- * @returns {string} - 转换后的 HTML 字符串
+ * ANSI 颜色代码转 HTML：对 SGR 转义序列单遍扫描，
+ * 每段文本只包一层当前样式的 span，输出始终是配对的
  */
-export function ansiToHtml(text) {
-  if (!text) return ''
 
-  const ansiMap = {
-    '\x1b[30m': '<span style="color:#000000">',
-    '\x1b[31m': '<span style="color:#ff0000">',
-    '\x1b[32m': '<span style="color:#00ff00">',
-    '\x1b[33m': '<span style="color:#ffaa00">',
-    '\x1b[34m': '<span style="color:#0000ff">',
-    '\x1b[35m': '<span style="color:#ff00ff">',
-    '\x1b[36m': '<span style="color:#00ffff">',
-    '\x1b[37m': '<span style="color:#aaaaaa">',
-    '\x1b[1m': '<span style="font-weight:bold">',
-    '\x1b[4m': '<span style="text-decoration:underline">',
-    '\x1b[7m': '<span style="background:#555555">',
-    '\x1b[40m': '<span style="background:#000000">',
-    '\x1b[41m': '<span style="background:#ff0000">',
-    '\x1b[42m': '<span style="background:#00ff00">',
-    '\x1b[43m': '<span style="background:#ffaa00">',
-    '\x1b[44m': '<span style="background:#0000ff">',
-    '\x1b[45m': '<span style="background:#ff00ff">',
-    '\x1b[46m': '<span style="background:#00ffff">',
-    '\x1b[47m': '<span style="background:#aaaaaa">',
-    '\x1b[0m': '</span>',
-    '\x1b[m': '</span>',
-  }
+const ANSI_SGR = /\x1b\[([0-9;]*)m/
+
+// ANSI 颜色映射表（深色背景）
+const ansiColorMap = {
+  '30': '#2e3436', '31': '#cc0000', '32': '#4e9a06', '33': '#c4a000',
+  '34': '#3465a4', '35': '#75507b', '36': '#06989a', '37': '#d3d7cf',
+  '90': '#555753', '91': '#ef2929', '92': '#8ae234', '93': '#fce94f',
+  '94': '#729fcf', '95': '#ad7fa8', '96': '#34e2e2', '97': '#eeeeec',
+}
+
+const INITIAL_STATE = { color: null, background: null, bold: false, underline: false, reverse: false }
+
+// (样式, SGR 参数) -> 新样式及其起始标签，日志里的组合很少，缓存后每个转义序列只需一次查表
+const transitions = new Map()
 
-  let result = text
+const escapeHtml = (text) => text
+  .replace(/&/g, '&amp;')
+  .replace(/</g, '&lt;')
+  .replace(/>/g, '&gt;')
 
-  // 替换已知的 ANSI 代码
-  for (const [code, html] of Object.entries(ansiMap)) {
-    result = result.replaceAll(code, html)
+const applySgr = (state, params) => {
+  const key = `${state.key || ''}|${params}`
+  let next = transitions.get(key)
+  if (next) return next
+
+  const style = { ...state }
+  for (const param of (params || '0').split(';')) {
+    const code = param === '' ? 0 : Number(param)
+    if (code === 0) {
+      Object.assign(style, INITIAL_STATE)
+    } else if (code === 1) {
+      style.bold = true
+    } else if (code === 4) {
+      style.underline = true
+    } else if (code === 7) {
+      style.reverse = true
+    } else if (ansiColorMap[code]) {
+      style.color = ansiColorMap[code]
+    } else if (ansiColorMap[code - 10]) {
+      style.background = ansiColorMap[code - 10]
+    }
   }
 
-  // 移除其他未处理的 ANSI 代码
-  result = result.replace(/\x1b\[[0-9;]*m/g, '')
+  const css = []
+  if (style.color) css.push(`color:${style.color}`)
+  if (style.background) css.push(`background-color:${style.background}`, 'padding:0 2px')
+  if (style.bold) css.push('font-weight:bold')
+  if (style.underline) css.push('text-decoration:underline')
+  if (style.reverse) css.push('filter:invert(1)')
+  style.key = css.join(';')
+  next = { state: style, opening: css.length ? `<span style="${style.key}">` : '' }
+  transitions.set(key, next)
+  return next
+}
 
-  // 将换行符转换为 <br>
-  result = result.replace(/\n/g, '<br>')
+/**
+ * 将 ANSI 颜色代码转换为 HTML（文本会被转义）
+ * @param {string} text - 包含 ANSI 代码的文本
+ * @returns {string} - 转换后的 HTML 字符串
+ */
+export function ansiToHtml(text) {
+  if (!text) return ''
 
-  return result
-}
\ No newline at end of file
+  // 转义不会改变转义序列，整段文本只需转义一次；split 的捕获组使奇数位为 SGR 参数
+  const tokens = escapeHtml(text).replace(/\n/g, '<br>').split(new RegExp(ANSI_SGR.source))
+  const parts = [tokens[0]]
+  let current = { state: INITIAL_STATE, opening: '' }
+  for (let i = 1; i < tokens.length; i += 2) {
+    current = applySgr(current.state, tokens[i])
+    const chunk = tokens[i + 1]
+    if (chunk) {
+      parts.push(current.opening ? `${current.opening}${chunk}</span>` : chunk)
+    }
+  }
+  return parts.join('')
+}
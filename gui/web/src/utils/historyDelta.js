@@ -0,0 +1,40 @@
+/**
+ * 执行历史增量帧的解码（格式见 src/game/history.py）
+ * 关键帧 {index, time, world}，增量帧 {index, time, delta}，delta 相对上一帧的世界：
+ *   set   - 整体替换的顶层字段
+ *   lists - 变化的顶层数组 {length, items: {位置: 元素}}
+ */
+
+/**
+ * 在上一帧世界上应用增量，未变化的字段和数组元素与上一帧共享
+ * @param {Object} previous - 上一帧的世界
+ * @param {Object} delta - 增量
+ * @returns {Object} - 新的世界
+ */
+export function applyDelta(previous, delta) {
+  const world = { ...previous, ...delta.set }
+  for (const [key, change] of Object.entries(delta.lists)) {
+    const items = (previous[key] || []).slice(0, change.length)
+    while (items.length < change.length) {
+      items.push(null)
+    }
+    for (const [position, item] of Object.entries(change.items)) {
+      items[Number(position)] = item
+    }
+    world[key] = items
+  }
+  return world
+}
+
+/**
+ * 解码一段帧
+ * @param {Array} frames - 帧列表，第一帧为关键帧（或提供 world）
+ * @param {Object} [world] - 第一帧为增量时，其之前的世界
+ * @returns {Array} - {index, time, world} 列表
+ */
+export function decodeFrames(frames, world = null) {
+  return frames.map(frame => {
+    world = frame.world !== undefined ? frame.world : applyDelta(world, frame.delta)
+    return { index: frame.index, time: frame.time, world }
+  })
+}
@@ -0,0 +1,143 @@
+/**
+ * MessagePack 解码（只解码，前端只向服务器发送文本 ping）
+ * 服务器的 msgpack 协议（见 gui/server/main.py 的 Frame）使用两种扩展类型：
+ *   1 - 对象列表：[[键列表...], [键列表序号, 值...], ...]，解码为对象数组
+ *   2 - zlib 压缩的整帧，解码为 Deflated，由调用方解压后再次解码
+ */
+
+export const EXT_RECORDS = 1
+export const EXT_DEFLATE = 2
+
+export class Deflated {
+  constructor(bytes) {
+    this.bytes = bytes
+  }
+}
+
+const textDecoder = new TextDecoder()
+
+class Decoder {
+  constructor(bytes) {
+    this.bytes = bytes
+    this.view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength)
+    this.pos = 0
+  }
+
+  str(length) {
+    const start = this.pos
+    this.pos += length
+    // 短的 ASCII 字符串（键名、格子名等）逐字节拼接比 TextDecoder 快
+    if (length < 24) {
+      let result = ''
+      for (let i = start; i < this.pos; i++) {
+        const byte = this.bytes[i]
+        if (byte > 0x7f) {
+          return textDecoder.decode(this.bytes.subarray(start, this.pos))
+        }
+        result += String.fromCharCode(byte)
+      }
+      return result
+    }
+    return textDecoder.decode(this.bytes.subarray(start, this.pos))
+  }
+
+  bin(length) {
+    const start = this.pos
+    this.pos += length
+    return this.bytes.subarray(start, this.pos)
+  }
+
+  array(length) {
+    const result = new Array(length)
+    for (let i = 0; i < length; i++) {
+      result[i] = this.value()
+    }
+    return result
+  }
+
+  map(length) {
+    const result = {}
+    for (let i = 0; i < length; i++) {
+      const key = this.value()
+      result[key] = this.value()
+    }
+    return result
+  }
+
+  ext(length) {
+    const type = this.view.getInt8(this.pos)
+    this.pos += 1
+    const data = this.bin(length)
+    if (type === EXT_RECORDS) {
+      const [shapes, ...rows] = new Decoder(data).value()
+      return rows.map(row => {
+        const keys = shapes[row[0]]
+        const item = {}
+        for (let i = 0; i < keys.length; i++) {
+          item[keys[i]] = row[i + 1]
+        }
+        return item
+      })
+    }
+    if (type === EXT_DEFLATE) {
+      return new Deflated(data)
+    }
+    throw new Error(`Unknown MessagePack extension type ${type}`)
+  }
+
+  value() {
+    const view = this.view
+    const byte = this.bytes[this.pos++]
+    if (byte <= 0x7f) return byte
+    if (byte >= 0xe0) return byte - 0x100
+    if (byte >= 0xa0 && byte <= 0xbf) return this.str(byte - 0xa0)
+    if (byte >= 0x90 && byte <= 0x9f) return this.array(byte - 0x90)
+    if (byte >= 0x80 && byte <= 0x8f) return this.map(byte - 0x80)
+
+    const pos = this.pos
+    switch (byte) {
+      case 0xc0: return null
+      case 0xc2: return false
+      case 0xc3: return true
+      case 0xc4: this.pos += 1; return this.bin(view.getUint8(pos))
+      case 0xc5: this.pos += 2; return this.bin(view.getUint16(pos))
+      case 0xc6: this.pos += 4; return this.bin(view.getUint32(pos))
+      case 0xc7: this.pos += 1; return this.ext(view.getUint8(pos))
+      case 0xc8: this.pos += 2; return this.ext(view.getUint16(pos))
+      case 0xc9: this.pos += 4; return this.ext(view.getUint32(pos))
+      case 0xca: this.pos += 4; return view.getFloat32(pos)
+      case 0xcb: this.pos += 8; return view.getFloat64(pos)
+      case 0xcc: this.pos += 1; return view.getUint8(pos)
+      case 0xcd: this.pos += 2; return view.getUint16(pos)
+      case 0xce: this.pos += 4; return view.getUint32(pos)
+      case 0xcf: this.pos += 8; return Number(view.getBigUint64(pos))
+      case 0xd0: this.pos += 1; return view.getInt8(pos)
+      case 0xd1: this.pos += 2; return view.getInt16(pos)
+      case 0xd2: this.pos += 4; return view.getInt32(pos)
+      case 0xd3: this.pos += 8; return Number(view.getBigInt64(pos))
+      case 0xd4: return this.ext(1)
+      case 0xd5: return this.ext(2)
+      case 0xd6: return this.ext(4)
+      case 0xd7: return this.ext(8)
+      case 0xd8: return this.ext(16)
+      case 0xd9: this.pos += 1; return this.str(view.getUint8(pos))
+      case 0xda: this.pos += 2; return this.str(view.getUint16(pos))
+      case 0xdb: this.pos += 4; return this.str(view.getUint32(pos))
+      case 0xdc: this.pos += 2; return this.array(view.getUint16(pos))
+      case 0xdd: this.pos += 4; return this.array(view.getUint32(pos))
+      case 0xde: this.pos += 2; return this.map(view.getUint16(pos))
+      case 0xdf: this.pos += 4; return this.map(view.getUint32(pos))
+      default: throw new Error(`Invalid MessagePack byte 0x${byte.toString(16)}`)
+    }
+  }
+}
+
+/**
+ * 解码一帧
+ * @param {ArrayBuffer|Uint8Array} buffer
+ * @returns {any}
+ */
+export function decode(buffer) {
+  const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer)
+  return new Decoder(bytes).value()
+}
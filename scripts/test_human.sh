@@ -1,7 +1,26 @@
-
 #!/bin/bash
+# Stop the GUI server and the frontend (each in its own process group) and any running tests, but not
+# the caller: `kill 0` would signal the whole process group, which includes it when run from another script
+server_pid=""
+web_pid=""
+job_pids=()
+stop_all() {
+    for pid in $server_pid $web_pid; do
+        kill -- "-$pid" 2> /dev/null
+    done
+}
 # Capture Ctrl+C and kill all child processes
-trap "echo 'kill all child processes'; kill 0; exit" SIGINT
+trap "echo 'kill all child processes'; kill \${job_pids[@]} 2> /dev/null; stop_all; exit 130" SIGINT
+
+# Session ids are limited to 64 characters of [A-Za-z0-9_-] (SESSION_ID_PATTERN in gui/server/main.py)
+session_id() {
+    local id
+    id=$(echo -n "$1" | tr -c 'A-Za-z0-9_-' '_')
+    if [[ ${#id} -gt 64 ]]; then
+        id="${id:0:51}-$(echo -n "$1" | sha1sum | cut -c1-12)"
+    fi
+    echo "$id"
+}
 
 # Please enter the model name as your name
 MODELS=("name")
@@ -12,8 +31,28 @@ AGENT_NUMS=(2)
 ORDERS_NUMS=(2)
 SEEDS=(42)
 
-MAX_JOBS=1
+# Tests run concurrently, each in its own session of one shared GUI server
+MAX_JOBS=4
 job_count=0
+status=0
+
+# Start the GUI server and the frontend once for all tests
+API_URL="http://$(jq -r '.api.host' config/gui_config.json):$(jq -r '.api.port' config/gui_config.json)"
+WEB_URL="http://$(jq -r '.web.host' config/gui_config.json):$(jq -r '.web.port' config/gui_config.json)"
+# The server writes "ready" to the FIFO once it listens; if it fails to start, it exits and the read sees EOF
+ready_fifo=$(mktemp -u)
+mkfifo "$ready_fifo"
+setsid python gui/server/main.py --ready-fd 3 3> "$ready_fifo" > /dev/null 2>&1 &
+server_pid=$!
+setsid bash -c "cd gui/web && npm run dev" > /dev/null 2>&1 &
+web_pid=$!
+read -r -t 60 ready < "$ready_fifo"
+rm -f "$ready_fifo"
+if [[ "$ready" != "ready" ]]; then
+    echo "GUI server failed to start at $API_URL (run python gui/server/main.py to see the error)" >&2
+    stop_all
+    exit 1
+fi
 
 for MODEL in "${MODELS[@]}"; do
     for METHOD in "${MOTHODS[@]}"; do
@@ -28,15 +67,19 @@ for MODEL in "${MODELS[@]}"; do
 
                         map="data/cook/maps/${RECIPE}/seed_${SEED}/agent_num_${AGENT_NUM}"
                         result_path="${RECIPE}/seed_${SEED}/agent_num_${AGENT_NUM}/orders_num_${ORDERS_NUM}"
+                        session=$(session_id "${MODEL}-${METHOD}-${RECIPE}-seed${SEED}-agents${AGENT_NUM}-orders${ORDERS_NUM}")
+                        echo "${result_path}: ${WEB_URL}/?session=${session}"
 
                         python -m src.main --model $MODEL \
                                            --agent $METHOD \
                                            --map $map \
                                            --orders $orders \
-                                           --result-path $result_path &
+                                           --result-path $result_path \
+                                           --gui-session $session &
+                        job_pids+=($!)
                         ((job_count++))
                         if [[ $job_count -ge $MAX_JOBS ]]; then
-                            wait -n
+                            wait -n "${job_pids[@]}"
                             ((job_count--))
                         fi
                     done
@@ -45,4 +88,10 @@ for MODEL in "${MODELS[@]}"; do
         done
     done
 done
-wait
\ No newline at end of file
+# A finished test keeps its exit status for `wait` even after `wait -n` returned it
+for pid in "${job_pids[@]}"; do
+    wait "$pid" || status=1
+done
+# Stop the GUI server and the frontend
+stop_all
+exit $status
@@ -1,5 +1,8 @@
 from src.agent.model.model import Model
 from src.agent.method.agent import Agent
+from src.agent.method.Human.history_streamer import HistoryStreamer
+from src.agent.method.Human.log_forwarder import BatchLogForwarder
+from src.game.preview import scenario_of
 from src.game.const import *
 from src.game.world_state import World
 from src.game.simulator import Simulator
@@ -10,14 +13,14 @@ from copy import deepcopy
 import subprocess
 import sys
 import os
+import signal
 import time
+import uuid
 import requests
 from typing import Optional
-import threading
 import logging
 import asyncio
 import websockets
-from concurrent.futures import ThreadPoolExecutor
 
 config_path = "config/gui_config.json"
 with open(config_path, 'r') as f:
@@ -25,24 +28,38 @@ with open(config_path, 'r') as f:
 
 API_URL = f"http://{config['api']['host']}:{config['api']['port']}"
 WEB_URL = f"http://{config['web']['host']}:{config['web']['port']}"
-WS_URL = f"ws://{config['api']['host']}:{config['api']['port']}/ws/agent"
+WS_URL = f"ws://{config['api']['host']}:{config['api']['port']}"
+# 自己启动服务器时使用的会话，其路由与不带会话前缀的旧路由相同
+DEFAULT_SESSION = "default"
+
+SERVER_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../gui/server/main.py'))
+WEB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../../gui/web'))
 
 class HumanAgent(Agent):
-    def __init__(self, model: Model, log_dir: str | None = None, api_url: str = API_URL):
+    def __init__(self, model: Model, log_dir: str | None = None, api_url: str = API_URL, session_id: str | None = None):
         super().__init__(model)
-        self.api_url = api_url
-        self.ws_url = WS_URL
+        self.server_url = api_url
+        self.session_id = session_id
+        self.use_session(session_id or DEFAULT_SESSION)
         self.session = requests.Session()
         self.log_handler = None
-        self.should_stop_logging = False
-        
-        # WebSocket 事件标志
-        self.execute_event = threading.Event()
-        self.reset_event = threading.Event()
-        self.current_actions = {}
-        self.ws_thread = None
-        self.ws_running = False
+        self.simulator: Optional[Simulator] = None  # 最近一次执行后的模拟器，用于生成结果
+        self.processes = []  # 启动的服务器与前端进程
         
+    def use_session(self, session_id: str):
+        """之后的 API 与 WebSocket 请求都发往服务器上的该会话"""
+        self.session_id = session_id
+        self.api_url = f"{self.server_url}/sessions/{session_id}"
+        self.ws_url = f"{WS_URL}/sessions/{session_id}/ws/agent"
+        self.web_url = WEB_URL if session_id == DEFAULT_SESSION else f"{WEB_URL}/?session={session_id}"
+
+    def find_server(self) -> bool:
+        """服务器是否已在运行（例如由 scripts/test_human.sh 启动，供多个测试共享）"""
+        try:
+            return self.session.get(f"{self.server_url}/sessions", timeout=1).ok
+        except requests.exceptions.RequestException:
+            return False
+
     def _call_api(self, method: str, endpoint: str, data: dict = {}, retries: int = 3) -> Optional[dict]:
         """调用 API 的辅助方法"""
         url = f"{self.api_url}{endpoint}"
@@ -81,6 +98,12 @@ class HumanAgent(Agent):
         else:
             logger.warning("Failed to update world state on server")
     
+    def upload_scenario(self, simulator: Simulator):
+        """把初始世界发送到服务器，服务器据此在本地预览草稿计划"""
+        result = self._call_api("POST", "/api/simulator", scenario_of(simulator.world))
+        if not (result and result.get("success")):
+            logger.warning("Failed to upload the scenario, plan preview is unavailable")
+
     def get_actions(self) -> Optional[dict]:
         """从服务器获取当前动作列表"""
         result = self._call_api("GET", "/api/actions")
@@ -89,7 +112,10 @@ class HumanAgent(Agent):
         return None
     
     def send_log(self, level: str, message: str):
-        """发送日志到服务器（保留原始 ANSI 颜色代码）"""
+        """发送日志到服务器（保留原始 ANSI 颜色代码）；日志转发启动后与其他日志一起按顺序批量发送"""
+        if self.log_handler:
+            self.log_handler.submit(level, message)
+            return
         data = {
             "level": level,
             "message": message,
@@ -98,26 +124,15 @@ class HumanAgent(Agent):
         self._call_api("POST", "/api/logs", data)
     
     def clear_logs(self):
-        """清空服务器日志"""
+        """清空服务器日志（先发送完已缓冲的日志，以免旧日志出现在清空之后）"""
+        if self.log_handler:
+            self.log_handler.flush()
         self._call_api("DELETE", "/api/logs")
     
     def start_log_forwarding(self):
-        """启动日志转发线程"""
-        class LogForwarder(logging.Handler):
-            def __init__(self, human_agent):
-                super().__init__()
-                self.human_agent = human_agent
-                
-            def emit(self, record):
-                try:
-                    level = record.levelname
-                    message = self.format(record)
-                    self.human_agent.send_log(level, message)
-                except:
-                    pass
-        
+        """启动日志转发：日志进入有界缓冲区，由后台线程批量发送到 /api/logs/batch"""
         # 创建并保存 handler 引用
-        self.log_handler = LogForwarder(self)
+        self.log_handler = BatchLogForwarder(self.api_url)
         self.log_handler.setLevel(logging.DEBUG)
         
         # 使用与文件日志相同的格式
@@ -129,258 +144,242 @@ class HumanAgent(Agent):
         logger.info("Log forwarding started")
     
     def stop_log_forwarding(self):
-        """停止日志转发"""
+        """停止日志转发（发送完剩余日志）"""
         if self.log_handler:
             logger.removeHandler(self.log_handler)
+            self.log_handler.close()
+            stats = self.log_handler.stats()
             self.log_handler = None
+            logger.info(f"Log forwarding stopped: {stats['sent']} records in {stats['batches']} batches, "
+                        f"{stats['dropped']} dropped, {stats['failed']} failed")
 
-    def wait_for_server(self, timeout: int = 30) -> bool:
-        """等待 API 服务器启动"""
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            try:
-                response = requests.get(f"{self.api_url}/", timeout=2)
-                if response.status_code == 200:
-                    logger.info(f"API server is ready at {self.api_url}")
-                    return True
-            except requests.exceptions.RequestException:
-                pass
-            time.sleep(1)
-        
-        logger.error(f"API server did not start within {timeout} seconds")
-        return False
-    
-    def _run_websocket_loop(self):
-        """在独立线程中运行 WebSocket 连接"""
-        async def connect_and_listen():
-            retry_count = 0
-            max_retries = 5
-            
-            while self.ws_running and retry_count < max_retries:
-                try:
-                    logger.info(f"Connecting to WebSocket: {self.ws_url}")
-                    async with websockets.connect(self.ws_url) as websocket:
-                        logger.info("✅ WebSocket connected to agent endpoint")
-                        retry_count = 0  # 重置重试计数
-                        
-                        # 持续接收消息
-                        async for message in websocket:
-                            if not self.ws_running:
-                                break
-                                
-                            try:
-                                data = json.loads(message)
-                                msg_type = data.get('type')
-                                
-                                if msg_type == 'execute':
-                                    logger.info("📨 Received execute command via WebSocket")
-                                    self.current_actions = data.get('data', {})
-                                    self.execute_event.set()
-                                    
-                                elif msg_type == 'reset':
-                                    logger.info("📨 Received reset command via WebSocket")
-                                    self.reset_event.set()
-                                    
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Failed to parse WebSocket message: {e}")
-                                
-                except websockets.exceptions.WebSocketException as e:
-                    if self.ws_running:
-                        retry_count += 1
-                        logger.warning(f"WebSocket connection lost, retrying ({retry_count}/{max_retries})...")
-                        await asyncio.sleep(2)
-                except Exception as e:
-                    if self.ws_running:
-                        logger.error(f"WebSocket error: {e}")
-                        await asyncio.sleep(2)
-            
-            if retry_count >= max_retries:
-                logger.error("WebSocket connection failed after maximum retries")
-        
-        # 创建新的事件循环并运行
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    async def start_server(self, output, timeout: float = 30) -> asyncio.subprocess.Process:
+        """启动 API 服务器，等待其通过管道发出就绪信号（开始监听后立即返回）"""
+        read_fd, write_fd = os.pipe()
         try:
-            loop.run_until_complete(connect_and_listen())
+            server_proc = await asyncio.create_subprocess_exec(
+                sys.executable, SERVER_PATH, "--ready-fd", str(write_fd),
+                pass_fds=(write_fd,),
+                stdout=output,
+                stderr=output,
+            )
         finally:
-            loop.close()
-    
-    def start_websocket(self):
-        """启动 WebSocket 连接"""
-        self.ws_running = True
-        self.ws_thread = threading.Thread(target=self._run_websocket_loop, daemon=True)
-        self.ws_thread.start()
-        logger.info("WebSocket connection thread started")
-    
-    def stop_websocket(self):
-        """停止 WebSocket 连接"""
-        self.ws_running = False
-        if self.ws_thread:
-            self.ws_thread.join(timeout=5)
-            logger.info("WebSocket connection stopped")
-    
-    def run_test(self, simulator: Simulator, recipes: list, examples: list = [], retries=3) -> dict:
-        """
-        Start a Vue.js web GUI for human interaction to control agents in the simulator.
-        """
-        # 启动 FastAPI 服务器
-        server_path = os.path.join(os.path.dirname(__file__), '../../../../gui/server/main.py')
-        server_path = os.path.abspath(server_path)
-        
-        output = sys.stdout if os.environ.get("DEBUG") else subprocess.DEVNULL
+            os.close(write_fd)
 
-        server_proc = subprocess.Popen(
-            [sys.executable, server_path],
-            stdout=output,
-            stderr=output,
-        )
-        
-        # 等待服务器启动
-        if not self.wait_for_server():
-            server_proc.terminate()
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(read_fd, "rb"))
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            line = b""
+        finally:
+            transport.close()
+        if line.strip() != b"ready":
+            # 启动失败（如端口被占用）时服务器进程退出，管道读到 EOF
+            if server_proc.returncode is None:
+                server_proc.terminate()
+            await server_proc.wait()
             raise RuntimeError("Failed to start API server")
-        
-        # 启动 WebSocket 连接
-        self.start_websocket()
-        time.sleep(2)  # 给 WebSocket 一些时间建立连接
-        
-        # 启动日志转发
-        self.start_log_forwarding()
-        
-        # 初始化服务器状态
+        logger.info(f"API server is ready at {self.server_url}")
+        return server_proc
+
+    async def listen(self, messages: asyncio.Queue, connected: asyncio.Event, max_retries: int = 5):
+        """保持与服务器 /ws/agent 的 WebSocket 连接，把 execute / reset 消息放入队列；放弃重连时放入 None"""
+        retry_count = 0
+        while retry_count < max_retries:
+            try:
+                logger.info(f"Connecting to WebSocket: {self.ws_url}")
+                async with websockets.connect(self.ws_url) as websocket:
+                    logger.info("✅ WebSocket connected to agent endpoint")
+                    retry_count = 0  # 重置重试计数
+                    connected.set()
+                    async for message in websocket:
+                        try:
+                            data = json.loads(message)
+                        except json.JSONDecodeError as e:
+                            logger.error(f"Failed to parse WebSocket message: {e}")
+                            continue
+                        if data.get('type') in ('execute', 'reset'):
+                            logger.info(f"📨 Received {data['type']} command via WebSocket")
+                            await messages.put(data)
+            except (websockets.exceptions.WebSocketException, OSError) as e:
+                retry_count += 1
+                logger.warning(f"WebSocket connection lost ({e}), retrying ({retry_count}/{max_retries})...")
+                await asyncio.sleep(0.5 * retry_count)
+        logger.error("WebSocket connection failed after maximum retries")
+        await messages.put(None)
+
+    def reset(self, simulator_copy: Simulator) -> Simulator:
+        """重置模拟器到初始状态并同步到服务器"""
+        logger.info("=" * 60)
+        logger.info("🔄 Resetting simulator to initial state...")
+        logger.info("=" * 60)
+        simulator = deepcopy(simulator_copy)
         self.clear_logs()
         self.update_world_state(simulator)
-        
-        # 启动 Vue.js 前端（开发模式）
-        web_path = os.path.join(os.path.dirname(__file__), '../../../../gui/web')
-        web_path = os.path.abspath(web_path)
-        
+        logger.info("Simulator reset complete")
+        return simulator
+
+    def execute(self, simulator_copy: Simulator, actions: dict) -> Optional[Simulator]:
+        """从初始状态执行动作计划，运行期间把执行历史流式发送到服务器；计划无法加载时返回 None"""
+        self.clear_logs()
         logger.info("=" * 60)
-        logger.info(f"Starting API server: {server_path}")
-        logger.info(f"Starting Vue.js web interface from: {web_path}")
-        
-        # 启动 npm run dev
-        web_proc = subprocess.Popen(
-            ['npm', 'run', 'dev'],
-            cwd=web_path,
-            stdout=output,
-            stderr=output,
-        )
-        
-        # 保存模拟器副本
+        logger.info("Received new actions, executing simulation...")
+        logger.info("=" * 60)
+
+        simulator = deepcopy(simulator_copy)
+        try:
+            simulator.load_plan(actions)
+        except Exception as e:
+            logger.error(f"Failed to load actions: {e}")
+            return None
+
+        # 边运行边把执行历史以增量帧分块发送，前端无需等待模拟结束即可回放
+        streamer = HistoryStreamer(self.api_url)
+        streamer.start()
+        simulator.history_listener = streamer
+        try:
+            simulator.run_simulation()
+        finally:
+            simulator.history_listener = None
+            frame_count = streamer.finish()
+        logger.info(f"Collected {frame_count} time steps from simulation")
+        if streamer.error:
+            logger.warning(f"{streamer.error}; {streamer.failed} of {frame_count} history frames not sent")
+        else:
+            logger.info("Execution history sent to frontend")
+
+        # 更新世界状态
+        self.update_world_state(simulator)
+        logger.info(f"Simulation completed. Remaining orders: {len(simulator.world.orders)}")
+        return simulator
+
+    async def serve(self, simulator: Simulator) -> Optional[dict]:
+        """
+        在单个事件循环中驱动人工测试：等待服务器就绪信号，等待 execute / reset 消息并依次处理，
+        前端或服务器进程退出时结束。阻塞操作（HTTP 调用、模拟运行）放到线程中执行，
+        以免阻塞 WebSocket 的收发与心跳。
+        """
+        output = None if os.environ.get("DEBUG") else subprocess.DEVNULL
         simulator_copy = deepcopy(simulator)
-        final_result = None
-        
+        self.simulator = simulator
+        server_proc = web_proc = listener = None
+        waiters = {}
         try:
+            if await asyncio.to_thread(self.find_server):
+                # 共享已在运行的服务器和前端，使用独立的会话
+                self.use_session(self.session_id if self.session_id not in (None, DEFAULT_SESSION) else uuid.uuid4().hex[:8])
+                logger.info(f"Using the running API server at {self.server_url}, session {self.session_id}")
+            else:
+                # 启动 FastAPI 服务器
+                logger.info(f"Starting API server: {SERVER_PATH}")
+                server_proc = await self.start_server(output)
+                self.processes.append(server_proc)
+
+            # 启动 WebSocket 连接
+            messages = asyncio.Queue()
+            connected = asyncio.Event()
+            listener = asyncio.create_task(self.listen(messages, connected))
+            connecting = asyncio.create_task(connected.wait())
+            await asyncio.wait({listener, connecting}, return_when=asyncio.FIRST_COMPLETED)
+            connecting.cancel()
+            if not connected.is_set():
+                raise RuntimeError("Failed to connect to the agent WebSocket endpoint")
+
+            # 启动日志转发并初始化服务器状态
+            self.start_log_forwarding()
+            await asyncio.to_thread(self.clear_logs)
+            await asyncio.to_thread(self.update_world_state, simulator)
+            await asyncio.to_thread(self.upload_scenario, simulator_copy)
+
+            if server_proc is not None:
+                # 启动 Vue.js 前端（开发模式）
+                logger.info(f"Starting Vue.js web interface from: {WEB_PATH}")
+                web_proc = await asyncio.create_subprocess_exec('npm', 'run', 'dev', cwd=WEB_PATH, stdout=output, stderr=output)
+                self.processes.append(web_proc)
+
+            logger.info("=" * 60)
             logger.info("Human Agent Interface Started")
             logger.info(f"API Server: {self.api_url}")
             logger.info(f"WebSocket: {self.ws_url}")
-            logger.info(f"Web Interface: {WEB_URL}")
+            logger.info(f"Web Interface: {self.web_url}")
             logger.info("Press Ctrl+C to stop")
             logger.info("=" * 60)
 
+            # 自己启动的前端或服务器进程退出时结束
+            waiters = {asyncio.create_task(proc.wait()): name for proc, name in ((web_proc, "Frontend"), (server_proc, "API server")) if proc is not None}
             while True:
-                # 检查前端进程
-                if web_proc.poll() is not None:
-                    logger.warning("Frontend process has stopped unexpectedly")
+                next_message = asyncio.create_task(messages.get())
+                done, _ = await asyncio.wait({next_message, *waiters}, return_when=asyncio.FIRST_COMPLETED)
+                if next_message not in done:
+                    next_message.cancel()
+                    logger.warning(f"{waiters[done.pop()]} process has stopped unexpectedly")
                     break
-                
-                # 等待重置事件（非阻塞，超时 0.1 秒）
-                if self.reset_event.wait(timeout=0.1):
-                    self.reset_event.clear()
-                    
-                    logger.info("=" * 60)
-                    logger.info("🔄 Resetting simulator to initial state...")
-                    logger.info("=" * 60)
-                    
-                    # 重置模拟器
-                    simulator = deepcopy(simulator_copy)
-                    
-                    # 更新服务器状态
-                    self.clear_logs()
-                    self.update_world_state(simulator)
-                    
-                    logger.info("Simulator reset complete")
+                message = next_message.result()
+                if message is None:
+                    break
+
+                if message['type'] == 'reset':
+                    self.simulator = await asyncio.to_thread(self.reset, simulator_copy)
                     continue
-                
-                # 等待执行事件（非阻塞，超时 0.1 秒）
-                if self.execute_event.wait(timeout=0.1):
-                    self.execute_event.clear()
-                    
-                    # 清空日志
-                    self.clear_logs()
+
+                executed = await asyncio.to_thread(self.execute, simulator_copy, message.get('data', {}))
+                if executed is None:
+                    continue
+                self.simulator = executed
+
+                # 检查是否完成所有订单
+                if len(executed.world.orders) == 0:
                     logger.info("=" * 60)
-                    logger.info("Received new actions, executing simulation...")
+                    logger.info("🎉 All orders completed successfully! 🎉")
                     logger.info("=" * 60)
-                    
-                    # 重新加载模拟器并执行
-                    simulator = deepcopy(simulator_copy)
-                    try:
-                        simulator.load_plan(self.current_actions)
-                    except Exception as e:
-                        logger.error(f"Failed to load actions: {e}")
-                        continue
-                    
-                    simulator.run_simulation()
+                    self.send_log("SUCCESS", "All orders completed successfully!")
+                    await asyncio.to_thread(self._call_api, "POST", "/api/task/complete")
+                    return self.create_result(executed, 0)
+            return None
 
-                    # 🆕 收集并发送执行历史
-                    execution_history = simulator.state_history
-                    logger.info(f"Collected {len(execution_history)} time steps from simulation")
-                    
-                    # 一次性发送历史到服务器
-                    history_result = self._call_api("POST", "/api/world/history", {
-                        "history": execution_history
-                    })
-                    
-                    if history_result and history_result.get("success"):
-                        logger.info("Execution history sent to frontend")
+        finally:
+            for task in list(waiters) + ([listener] if listener else []):
+                task.cancel()
+            # 在服务器退出前发送完剩余日志
+            await asyncio.to_thread(self.stop_log_forwarding)
 
-                    # 更新世界状态
-                    self.update_world_state(simulator)
-                    
-                    # 检查是否完成所有订单
-                    remaining_orders = len(simulator.world.orders)
-                    logger.info(f"Simulation completed. Remaining orders: {remaining_orders}")
-                    
-                    if remaining_orders == 0:
-                        logger.info("=" * 60)
-                        logger.info("🎉 All orders completed successfully! 🎉")
-                        logger.info("=" * 60)
-                        self.send_log("SUCCESS", "All orders completed successfully!")
-                        self._call_api("POST", "/api/task/complete")
-                        final_result = self.create_result(simulator, 0)
-                        time.sleep(3)
-                        break
-                
-                time.sleep(0.1)  # 短暂休眠，避免 CPU 占用过高
-        
+            logger.info("Cleaning up processes...")
+            for proc in (web_proc, server_proc):
+                if proc is not None and proc.returncode is None:
+                    try:
+                        proc.terminate()
+                    except ProcessLookupError:
+                        pass
+            for proc in (web_proc, server_proc):
+                if proc is None:
+                    continue
+                try:
+                    await asyncio.wait_for(proc.wait(), 5)
+                except asyncio.TimeoutError:
+                    logger.warning("Processes did not terminate gracefully, forcing kill...")
+                    proc.kill()
+                    await proc.wait()
+            logger.info("Shutdown complete")
+
+    def run_test(self, simulator: Simulator, recipes: list, examples: list = [], retries=3) -> dict:
+        """
+        Start a Vue.js web GUI for human interaction to control agents in the simulator.
+        """
+        final_result = None
+        try:
+            final_result = asyncio.run(self.serve(simulator))
         except KeyboardInterrupt:
             logger.info("\n" + "=" * 60)
             logger.info("Received interrupt signal, shutting down...")
             logger.info("=" * 60)
-        
-        finally:
-            # 停止 WebSocket
-            self.stop_websocket()
-            
-            # 清理日志转发
-            for handler in logger.handlers[:]:
-                if handler.__class__.__name__ == 'LogForwarder':
-                    logger.removeHandler(handler)
-            
-            logger.info("Cleaning up processes...")
-            time.sleep(1)
-            web_proc.terminate()
-            server_proc.terminate()
-            
-            try:
-                web_proc.wait(timeout=5)
-                server_proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                logger.warning("Processes did not terminate gracefully, forcing kill...")
-                web_proc.kill()
-                server_proc.kill()
-            
-            logger.info("Shutdown complete")
-        
-        return final_result if final_result else self.create_result(simulator, 0)
\ No newline at end of file
+            # 再次 Ctrl+C 会中断 serve 中的清理，此时直接结束仍在运行的子进程
+            for proc in self.processes:
+                try:
+                    os.kill(proc.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+        self.processes = []
+
+        return final_result if final_result else self.create_result(self.simulator or simulator, 0)
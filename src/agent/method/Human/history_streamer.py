@@ -0,0 +1,134 @@
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import requests
+
+from src.game.history import HistoryEncoder
+
+class HistoryStreamer:
+    """
+    模拟运行期间把执行历史以增量帧（见 src/game/history.py）分块发送到 GUI 服务器的 /api/world/history/frames。
+    作为 Simulator.history_listener 使用：每记录一个状态只在模拟线程中编码一帧，由后台线程攒够 chunk_size 帧
+    或每隔 flush_interval 秒发送一次，模拟速度与 GUI 延迟无关，前端在模拟结束前就可以开始回放。
+    本次运行的帧都保留到结束：网络错误或 5xx 时下次连同新帧一起重发；服务器回 409（收到的帧数与 start 不符）时
+    按服务器已有的帧数重新对齐；其他 4xx 或连续 max_failures 次失败后停止发送。
+    """
+    def __init__(self, api_url: str, chunk_size: int = 64, flush_interval: float = 0.5, timeout: float = 5, max_failures: int = 3):
+        self.url = f"{api_url}/api/world/history/frames"
+        self.meta_url = f"{api_url}/api/world/history"
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.session = requests.Session()
+        self.condition = threading.Condition()
+        self.run_id: Optional[str] = None
+        self.encoder = HistoryEncoder()
+        self.frames: List[Dict] = []
+        self.acked = 0  # 服务器已确认的帧数
+        self.finishing = False
+        self.done_sent = False
+        self.error: Optional[str] = None
+        self.worker: Optional[threading.Thread] = None
+
+    @property
+    def sent(self) -> int:
+        return self.acked
+
+    @property
+    def failed(self) -> int:
+        """未送达的帧数（运行结束后）"""
+        return len(self.frames) - self.acked if self.error else 0
+
+    def start(self) -> str:
+        """开始新一次运行的历史并启动后台线程，返回运行 ID"""
+        self.run_id = uuid.uuid4().hex
+        self.encoder = HistoryEncoder()
+        self.frames = []
+        self.acked = 0
+        self.finishing = False
+        self.done_sent = False
+        self.error = None
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+        return self.run_id
+
+    def __call__(self, state: Dict):
+        frame = self.encoder.encode(state)
+        with self.condition:
+            self.frames.append(frame)
+            if len(self.frames) - self.acked >= self.chunk_size:
+                self.condition.notify_all()
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self.condition:
+                if not self.finishing:
+                    self.condition.wait(self.flush_interval)
+                if self.error or self.done_sent:
+                    return
+                start = self.acked
+                frames = self.frames[start:]
+                done = self.finishing
+            if not frames and not done:
+                continue
+            try:
+                response = self.session.post(self.url, json={
+                    "run": self.run_id, "start": start, "frames": frames, "done": done,
+                }, timeout=self.timeout)
+                if response.status_code == 409:
+                    # 有一块丢失或重复送达：按服务器已有的帧数对齐，下次从那里重发
+                    failures += 1
+                    self._resync()
+                else:
+                    response.raise_for_status()
+                    failures = 0
+                    with self.condition:
+                        self.acked = start + len(frames)
+                        self.done_sent = done
+            except requests.exceptions.HTTPError as e:
+                if e.response is not None and e.response.status_code < 500:
+                    self._stop(f"Server rejected history frames: {e}")
+                failures += 1
+            except requests.exceptions.RequestException as e:
+                failures += 1
+                if failures >= self.max_failures:
+                    self._stop(f"History streaming failed {failures} times: {e}")
+            if failures >= self.max_failures:
+                self._stop(f"History streaming failed {failures} times")
+            elif failures and done:
+                time.sleep(self.flush_interval)
+
+    def _resync(self):
+        try:
+            response = self.session.get(self.meta_url, params={"start": 0, "end": 0}, timeout=self.timeout)
+            response.raise_for_status()
+            meta = response.json()["data"]
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            self._stop(f"Failed to resynchronize the history stream: {e}")
+            return
+        with self.condition:
+            same_run = meta.get("run") == self.run_id and meta.get("length", 0) <= len(self.frames)
+            self.acked = meta["length"] if same_run else 0
+
+    def _stop(self, error: str):
+        with self.condition:
+            if self.error is None:
+                self.error = error
+            self.condition.notify_all()
+
+    def finish(self) -> int:
+        """发送剩余帧并标记历史完整（最多等待 timeout 秒），返回帧总数"""
+        with self.condition:
+            self.finishing = True
+            self.condition.notify_all()
+        if self.worker is not None:
+            self.worker.join(timeout=self.timeout)
+            if self.worker.is_alive():
+                self._stop("Timed out sending the history")
+            else:
+                self.session.close()
+        return self.encoder.index
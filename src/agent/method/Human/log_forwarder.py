@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+
+class BatchLogForwarder(logging.Handler):
+    """
+    把日志批量转发到 GUI 服务器的 /api/logs/batch。
+    emit 只把记录放进有界缓冲区，由后台线程打包发送，模拟速度与 GUI 延迟无关；
+    缓冲区满时丢弃最早的记录并计数，丢弃条数随下一批发送给服务器。
+    后台线程不能使用 logger（否则日志会再次进入本 handler）。
+    """
+    def __init__(self, api_url: str, capacity: int = 10000, batch_size: int = 500, flush_interval: float = 0.05, timeout: float = 5):
+        super().__init__()
+        self.url = f"{api_url}/api/logs/batch"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.buffer = deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.running = True
+        # 统计
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self._unreported_drops = 0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.submit(record.levelname, self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def submit(self, level: str, message: str):
+        """放入一条日志（保留原始 ANSI 颜色代码）"""
+        entry = {"level": level, "message": message, "timestamp": time.strftime("%H:%M:%S")}
+        with self.condition:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+                self._unreported_drops += 1
+            self.buffer.append(entry)
+            if len(self.buffer) == 1 or len(self.buffer) >= self.batch_size:
+                self.condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.buffer and not self._unreported_drops:
+                    self.condition.wait()
+                if not self.buffer and not self._unreported_drops:
+                    return
+                # 稍等片刻以凑成一批（flush 和 close 会提前唤醒）
+                if self.running and len(self.buffer) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                dropped, self._unreported_drops = self._unreported_drops, 0
+                self.in_flight = len(batch)
+            try:
+                response = self.session.post(self.url, json={"logs": batch, "dropped": dropped}, timeout=self.timeout)
+                response.raise_for_status()
+                self.sent += len(batch)
+                self.batches += 1
+            except requests.exceptions.RequestException:
+                self.failed += len(batch)
+                time.sleep(0.5)
+            with self.condition:
+                self.in_flight = 0
+                self.condition.notify_all()
+
+    def flush(self, timeout: float = 5):
+        """等待已缓冲的日志发送完（最多 timeout 秒），用于清空日志等需要先后顺序的操作之前"""
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.condition.notify_all()
+            while (self.buffer or self.in_flight) and self.worker.is_alive():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self.condition.wait(min(remaining, self.flush_interval))
+
+    def close(self):
+        """发送剩余日志后停止后台线程"""
+        self.flush()
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.worker.join(timeout=self.timeout)
+        self.session.close()
+        super().close()
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "batches": self.batches, "dropped": self.dropped, "failed": self.failed, "buffered": len(self.buffer)}
@@ -6,38 +6,27 @@ from src.game.world_state import World
 from src.game.simulator import Simulator
 from src.utils.logger_config import logger, log_model_conversation, COLOR_CODES, RESET
 
-import json
 from copy import deepcopy
 
 class IOAgent(Agent):
-    def __init__(self, model: Model, log_dir: str):
+    def __init__(self, model: Model, log_dir: str, samples: int = 1, sample_temperature: float = 0.7):
         super().__init__(model, log_dir)
         self.INSTRUCTION = INSTRUCTION
         self.REFINE_INSTRUCTION = REFINE_INSTRUCTION
+        # samples > 1: request that many plans concurrently per attempt and keep the best valid one
+        self.samples = samples
+        self.sample_temperature = sample_temperature
 
     def initiate_chat(self, examples: list = []):
-        messages = [
-            {"role": "system", "content": self.INSTRUCTION.format(
-                INTERACT_TIME=INTERACT_TIME,
-                PROCESS_CUT_TIME=PROCESS_CUT_TIME,
-                PROCESS_POT_COOK_TIME=PROCESS_POT_COOK_TIME,
-                PROCESS_PAN_COOK_TIME=PROCESS_PAN_COOK_TIME,
-                PROCESS_WASH_PLATE_TIME=PROCESS_WASH_PLATE_TIME,
-                RETURN_DIRTY_PLATE_TIME=RETURN_DIRTY_PLATE_TIME,
-            )},
-        ]
-        for ex in examples:
-            ex_mod = __import__(f"src.agent.method.IO.example.{ex}", fromlist=['input', 'output'])
-            messages.append({"role": "user", "content": ex_mod.input})
-            messages.append({"role": "assistant", "content": ex_mod.output})
-
-        self.chat_history = messages.copy()
+        self.chat_history = self.compile_chat("src.agent.method.IO", examples)
 
     def run_test(self, simulator: Simulator, recipes: list, examples: list = [], retries=3) -> dict:
         """Run test with the given world and simulator, using the provided examples for context."""
         self.initiate_chat(examples)
         simulator_copy = deepcopy(simulator)
         simulator = simulator_copy
+        if self.samples > 1:
+            return self.run_sampled(simulator_copy, recipes, retries)
         prompt = None
         plan = {}
         count = 0
@@ -45,11 +34,12 @@ class IOAgent(Agent):
         while count < retries:
             try:
                 if count == 0:
-                    prompt = f"Map JSON:\n{json.dumps(simulator.world.map_data)}\n\nRecipes:\n{recipes}\n\nOrders:\n{str(simulator.world.orders)}"
+                    prompt = self.task_prompt(simulator, recipes)
                 else:
                     prompt = self.REFINE_INSTRUCTION.format(error=str(retry_error), world_json=simulator.world.to_json())
-                plan = self.get_actions(prompt)
+                plan = self.get_actions(prompt, simulator.world)
                 log_model_conversation(f"{COLOR_CODES['BLUE']}plan: {plan}{RESET}")
+                plan = self.repair_plan(simulator_copy, plan)
                 simulator = deepcopy(simulator_copy)
                 simulator.submit_plan(plan)
                 simulator.run_simulation(raise_on_error=True)
@@ -60,4 +50,84 @@ class IOAgent(Agent):
                 count += 1
                 if count == retries:
                     return self.create_result(simulator, count, plan, str(e))
-        return self.create_result(simulator, count, plan)
\ No newline at end of file
+        if self.retime:
+            plan = self.postprocess_plan(simulator_copy, plan)
+            simulator = deepcopy(simulator_copy)
+            simulator.submit_plan(plan)
+            simulator.run_simulation(raise_on_error=True)
+        return self.create_result(simulator, count, plan)
+
+    def sample_plans(self, prompt: str, simulator: Simulator) -> list:
+        """
+        Request self.samples plans for the prompt concurrently and evaluate each on a headless clone of
+        the simulator. Returns one dict per sample with its response, plan and EvaluationResult; the
+        plan and evaluation are None when the request or the parsing failed, with the reason in "error".
+        """
+        samples = []
+        for response in self.sample_chat(prompt, self.samples, self.sample_temperature):
+            sample = {"response": response, "plan": None, "evaluation": None, "error": None}
+            if isinstance(response, Exception):
+                sample["error"] = f"Request failed: {response}"
+            else:
+                try:
+                    sample["plan"] = self.repair_plan(simulator, self.parse_actions(response))
+                    sample["evaluation"] = simulator.evaluate(sample["plan"])
+                    sample["error"] = sample["evaluation"].error
+                except Exception as e:
+                    sample["error"] = str(e)
+            samples.append(sample)
+        return samples
+
+    def run_sampled(self, simulator: Simulator, recipes: list, retries: int) -> dict:
+        """
+        Best-of-N variant of run_test: every attempt samples several plans, keeps the valid one with the
+        shortest makespan (plans that serve all orders first), and only falls back to a REFINE prompt,
+        listing the errors of all samples, when none of them is valid.
+        """
+        prompt = self.task_prompt(simulator, recipes)
+        attempts = []
+        for count in range(retries):
+            samples = self.sample_plans(prompt, simulator)
+            attempts.append([
+                {
+                    "valid": sample["evaluation"] is not None and sample["evaluation"].valid,
+                    "done": sample["evaluation"] is not None and sample["evaluation"].done,
+                    "time": sample["evaluation"].time if sample["evaluation"] is not None else None,
+                    "error": sample["error"],
+                }
+                for sample in samples
+            ])
+            valid = [sample for sample in samples if sample["evaluation"] is not None and sample["evaluation"].valid]
+            logger.info(f"{COLOR_CODES['CYAN']}Attempt {count+1}: {len(valid)}/{len(samples)} sampled plans valid{RESET}")
+            if valid:
+                best = min(valid, key=lambda sample: (not sample["evaluation"].done, sample["evaluation"].time))
+                self.add_response(best["response"])
+                log_model_conversation(f"{COLOR_CODES['BLUE']}plan: {best['plan']}{RESET}")
+                plan = self.postprocess_plan(simulator, best["plan"])
+                run_simulator = deepcopy(simulator)
+                run_simulator.submit_plan(plan)
+                run_simulator.run_simulation(raise_on_error=True)
+                result = self.create_result(run_simulator, count, plan)
+                result["samples"] = attempts
+                return result
+
+            # The sample that ran furthest stays in the chat history and is the plan the model refines
+            evaluated = [sample for sample in samples if sample["evaluation"] is not None]
+            responded = [sample for sample in samples if isinstance(sample["response"], str)]
+            representative = max(evaluated, key=lambda sample: sample["evaluation"].time) if evaluated else next(iter(responded), None)
+            failed_simulator, plan = simulator, {}
+            if representative is not None:
+                self.add_response(representative["response"])
+                plan = representative["plan"] or {}
+                if representative["evaluation"] is not None:
+                    failed_simulator = representative["evaluation"].simulator
+            others = [sample["error"] for sample in samples if sample is not representative]
+            error = representative["error"] if representative is not None else others.pop(0)
+            if others:
+                error += ". The other sampled plans failed with: " + "; ".join(others)
+            logger.error(f"{COLOR_CODES['RED']}All sampled plans failed on attempt {count+1}: {error}{RESET}")
+            prompt = self.REFINE_INSTRUCTION.format(error=error, world_json=failed_simulator.world.to_json())
+
+        result = self.create_result(failed_simulator, retries, plan, error)
+        result["samples"] = attempts
+        return result
@@ -5,20 +5,10 @@ from src.game.const import *
 
 
 class MultiStepReActAgent(ReActAgent):
-    def __init__(self, model: Model, log_dir: str):
-        super().__init__(model, log_dir)
+    def __init__(self, model: Model, log_dir: str, observation: str = "full", keyframe_interval: int = 5, decision: str = "joint"):
+        super().__init__(model, log_dir, observation, keyframe_interval, decision)
         self.INSTRUCTION = INSTRUCTION
         self.REFINE_INSTRUCTION = REFINE_INSTRUCTION
 
     def initiate_chat(self, examples: list = []):
-        messages = [
-            {"role": "system", "content": self.INSTRUCTION.format(
-                INTERACT_TIME=INTERACT_TIME,
-                PROCESS_CUT_TIME=PROCESS_CUT_TIME,
-                PROCESS_POT_COOK_TIME=PROCESS_POT_COOK_TIME,
-                PROCESS_PAN_COOK_TIME=PROCESS_PAN_COOK_TIME,
-                PROCESS_WASH_PLATE_TIME=PROCESS_WASH_PLATE_TIME,
-                RETURN_DIRTY_PLATE_TIME=RETURN_DIRTY_PLATE_TIME,
-            )},
-        ]
-        self.chat_history = messages.copy()
+        self.chat_history = self.compile_chat("src.agent.method.MultiStepReAct")
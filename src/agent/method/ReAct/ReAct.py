@@ -1,6 +1,8 @@
 from src.agent.model.model import Model
 from src.agent.method.agent import Agent
 from src.agent.method.ReAct.instruction import INSTRUCTION, REFINE_INSTRUCTION
+from src.agent.method.ReAct.observation import ObservationEncoder
+from src.agent.method.ReAct.decentralized import DECISION_MODES, PerAgentDecider
 from src.game.const import *
 from src.game.world_state import World
 from src.game.simulator import Simulator
@@ -10,26 +12,23 @@ import json
 from copy import deepcopy
 
 class ReActAgent(Agent):
-    def __init__(self, model: Model, log_dir: str):
+    def __init__(self, model: Model, log_dir: str, observation: str = "full", keyframe_interval: int = 5, decision: str = "joint"):
         super().__init__(model, log_dir)
         self.INSTRUCTION = INSTRUCTION
         self.REFINE_INSTRUCTION = REFINE_INSTRUCTION
+        self.observation_encoder = ObservationEncoder(observation, keyframe_interval)
+        if decision not in DECISION_MODES:
+            raise ValueError(f"Unknown decision mode {decision}, expected one of {DECISION_MODES}")
+        # "joint": one prompt decides for all agents; "per_agent": see PerAgentDecider
+        self.decision = decision
 
     def initiate_chat(self, examples: list = []):
-        messages = [
-            {"role": "system", "content": self.INSTRUCTION.format(
-                INTERACT_TIME=INTERACT_TIME,
-                PROCESS_CUT_TIME=PROCESS_CUT_TIME,
-                PROCESS_POT_COOK_TIME=PROCESS_POT_COOK_TIME,
-                PROCESS_PAN_COOK_TIME=PROCESS_PAN_COOK_TIME,
-                PROCESS_WASH_PLATE_TIME=PROCESS_WASH_PLATE_TIME,
-                RETURN_DIRTY_PLATE_TIME=RETURN_DIRTY_PLATE_TIME,
-            )},
-        ]
-        self.chat_history = messages.copy()
+        self.chat_history = self.compile_chat("src.agent.method.ReAct")
 
     def run_test(self, simulator: Simulator, recipes: list, examples: list = [], retries=3) -> dict:
         self.initiate_chat(examples)
+        if self.decision == "per_agent":
+            return self.run_per_agent(simulator, recipes, retries)
 
         prompt = None
         plan = None
@@ -45,10 +44,12 @@ class ReActAgent(Agent):
                         if simulator.is_done() or len(simulator.get_finished_agents()) == len(simulator.world.agents):
                             break
                     if not prompt:
-                        prompt = f"Map JSON:\n{json.dumps(simulator.world.map_data)}\n\nRecipes:\n{recipes}\n\nOrders:\n{str(simulator.world.orders)}"
+                        prompt = self.task_prompt(simulator, recipes)
                     else:
-                        prompt = f"Observation:\n{simulator.status()}\nCurrent World State:\n{simulator.world.to_json()}\n"
-                    plan = self.get_actions(prompt)
+                        prompt = self.observation_encoder.encode(simulator)
+                        turn = self.observation_encoder.turns[-1]
+                        logger.info(f"Observation ({turn['kind']}): {turn['tokens']} tokens, full observation {turn['full_tokens']} tokens")
+                    plan = self.get_actions(prompt, simulator.world)
                     log_model_conversation(f"{COLOR_CODES['BLUE']}next actions: {json.dumps(plan, indent=2)}{RESET}")
                     
                     # Check if plan is empty
@@ -60,10 +61,60 @@ class ReActAgent(Agent):
                 count += 1
                 count_max = max(count_max, count)
                 if count == retries:
-                    return self.create_result(simulator, count_max, error_msg=str(e))
+                    result = self.create_result(simulator, count_max, error_msg=str(e))
+                    result["observation_tokens"] = self.observation_encoder.report()
+                    return result
                 prompt = self.REFINE_INSTRUCTION.format(error=str(e), last_plan=simulator.get_agent_plan(), world_json=simulator.world.to_json())
-                plan = self.get_actions(prompt)
+                plan = self.get_actions(prompt, simulator.world)
                 log_model_conversation(f"{COLOR_CODES['BLUE']}plan after refinement: {json.dumps(plan, indent=2)}{RESET}")
                 simulator = deepcopy(simulator_copy)
+                # The world was rolled back, the next observation must be a full one
+                self.observation_encoder.reset()
 
-        return self.create_result(simulator, count_max)
\ No newline at end of file
+        result = self.create_result(simulator, count_max)
+        result["observation_tokens"] = self.observation_encoder.report()
+        return result
+
+    def run_per_agent(self, simulator: Simulator, recipes: list, retries=3) -> dict:
+        """
+        Decentralized ReAct loop. On a simulation error the simulator goes back to the last decision
+        point, and the agents decided there get the refine prompt and decide again.
+        """
+        decider = PerAgentDecider(self, self.chat_history[0]["content"], list(simulator.world.agents),
+                                  self.observation_encoder.mode, self.observation_encoder.keyframe_interval)
+        task_prompt = self.task_prompt(simulator, recipes)
+        prompts = None
+        count = 0
+        while len(simulator.get_finished_agents()) < len(simulator.world.agents) and not simulator.is_done():
+            if prompts is None:
+                names = simulator.get_decision_agents()
+                if not names:
+                    break
+                prompts = {name: decider.prompt(name, simulator, task_prompt) for name in names}
+            checkpoint, history_length = simulator.clone(), len(simulator.state_history)
+            plan = None
+            try:
+                plan = decider.decide(prompts, simulator.world)
+                log_model_conversation(f"{COLOR_CODES['BLUE']}next actions: {json.dumps(plan, indent=2)}{RESET}")
+                simulator.submit_plan(plan)
+                simulator.next_decision_step()
+                prompts = None
+            except Exception as e:
+                logger.error(f"{COLOR_CODES['RED']}Simulation error on attempt {count+1}: {e}{RESET}")
+                count += 1
+                if count == retries:
+                    result = self.create_result(simulator, count, error_msg=str(e))
+                    result["decision"] = decider.report()
+                    return result
+                checkpoint.state_history = simulator.state_history[:history_length]
+                simulator = checkpoint
+                decider.reset_observations()
+                last_plan = plan if plan is not None else simulator.get_agent_plan()
+                prompts = {
+                    name: self.REFINE_INSTRUCTION.format(error=str(e), last_plan=last_plan, world_json=simulator.world.to_json())
+                    for name in prompts
+                }
+
+        result = self.create_result(simulator, count)
+        result["decision"] = decider.report()
+        return result
@@ -0,0 +1,92 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.agent.method.agent import Agent, HistoryManager
+from src.agent.method.ReAct.instruction import AGENT_INSTRUCTION
+from src.agent.method.ReAct.observation import ObservationEncoder
+from src.game.simulator import Simulator
+from src.utils.logger_config import logger
+from src.utils.utils import count_tokens
+
+DECISION_MODES = ["joint", "per_agent"]
+
+class PerAgentDecider:
+    """
+    Decentralized decisions for ReAct: every world agent gets its own chat context (system prompt with
+    a section naming the agent it controls, its task prompt, and its own turns) and its own observation
+    encoder. At a decision point only the idle agents are asked, concurrently, and their sub-plans are
+    merged into one plan for submit_plan; agents still executing actions are not queried.
+    Each context logs to a subdirectory of the parent's log directory named after the agent.
+    """
+    def __init__(self, parent: Agent, system_prompt: str, agent_names: list, observation: str, keyframe_interval: int):
+        self.contexts = {}
+        self.encoders = {}
+        for name in agent_names:
+            context = Agent(parent.model, os.path.join(parent.log_dir, name) if parent.log_dir else None)
+            context.history = HistoryManager(parent.history.policy)
+            context.stream = parent.stream
+            teammates = ", ".join(other for other in agent_names if other != name) or "none"
+            context.chat_history = [{"role": "system", "content": system_prompt + AGENT_INSTRUCTION.format(agent_name=name, teammates=teammates)}]
+            self.contexts[name] = context
+            self.encoders[name] = ObservationEncoder(observation, keyframe_interval)
+        self.decisions = []
+
+    def prompt(self, name: str, simulator: Simulator, task_prompt: str) -> str:
+        """Task prompt on the agent's first turn, its observation afterwards"""
+        if len(self.contexts[name].chat_history) == 1:
+            return f"{task_prompt}\n\nYou control {name}."
+        return self.encoders[name].encode(simulator) + f"\nNext actions for {name}:"
+
+    def reset_observations(self):
+        """The world was rolled back, every agent's next observation must be a full one"""
+        for encoder in self.encoders.values():
+            encoder.reset()
+
+    def request(self, name: str, prompt: str, world) -> list:
+        plan = self.contexts[name].get_actions(prompt, world)
+        if name not in plan:
+            raise ValueError(f"The response for {name} contains no actions for {name}")
+        others = [key for key in plan if key != name]
+        if others:
+            logger.warning(f"Ignoring actions for {others} in the response for {name}")
+        return plan[name]
+
+    def decide(self, prompts: dict, world) -> dict:
+        """Query the agents of `prompts` concurrently; returns the merged plan"""
+        names = list(prompts)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            futures = {name: executor.submit(self.request, name, prompts[name], world) for name in names}
+            # Wait for every request so no context is left mid-turn, then report the first failure
+            results = {name: (future.exception(), future) for name, future in futures.items()}
+        self.decisions.append({
+            "agents": names,
+            "wall_s": time.perf_counter() - start,
+            "prompt_tokens": {name: count_tokens(prompts[name]) for name in names},
+        })
+        for name, (error, future) in results.items():
+            if error is not None:
+                raise error
+        return {name: future.result() for name, (_, future) in results.items()}
+
+    def report(self) -> dict:
+        requests = sum(len(decision["agents"]) for decision in self.decisions)
+        prompt_tokens = sum(sum(decision["prompt_tokens"].values()) for decision in self.decisions)
+        return {
+            "mode": "per_agent",
+            "decision_points": len(self.decisions),
+            "requests": requests,
+            "avg_agents_per_decision": requests / len(self.decisions) if self.decisions else 0.0,
+            "avg_wall_s": sum(decision["wall_s"] for decision in self.decisions) / len(self.decisions) if self.decisions else 0.0,
+            "avg_prompt_tokens": prompt_tokens / requests if requests else 0.0,
+            "agents": {
+                name: {
+                    "history_tokens": context.history.report(),
+                    "observation_tokens": self.encoders[name].report(),
+                    "streaming": context.stream_report(),
+                }
+                for name, context in self.contexts.items()
+            },
+            "decisions": self.decisions,
+        }
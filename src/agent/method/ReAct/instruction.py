@@ -205,4 +205,19 @@ Output format:
     "plan": ...
 }}
 ```
-"""
\ No newline at end of file
+"""
+AGENT_INSTRUCTION = """
+
+## 7. Decentralized Control
+You control only {agent_name}. The other agents ({teammates}) are controlled by teammates who receive the same observations and decide at the same time as you, so coordinate through the world state: do not take items or stations another agent is clearly heading for.
+You are asked only when {agent_name} has no actions left. Output a plan that contains {agent_name} alone:
+
+```json
+{{
+    "reasoning": "...",
+    "plan": {{
+      "{agent_name}": [{{"action": "MoveTo", "target": [x1, y1]}}]
+    }}
+}}
+```
+"""
@@ -0,0 +1,84 @@
+from src.agent.method.agent import DELTA_MARKER
+from src.game.simulator import Simulator
+from src.utils.utils import count_tokens
+
+OBSERVATION_MODES = ["full", "delta"]
+
+def index_world(world_json: dict) -> dict:
+    """Agents and stations of World.to_json() keyed by name; walls never change and are left out"""
+    return {
+        "agents": {agent["name"]: agent for agent in world_json["agents"]},
+        "tiles": {tile["name"]: tile for tile in world_json["tiles"] if tile["type"] == "station"},
+    }
+
+class ObservationEncoder:
+    """
+    Builds the per-turn observation prompt of ReAct agents.
+    "full" repeats the status and the whole world JSON every turn. "delta" sends the whole world only
+    on keyframes (the first turn after a reset and every `keyframe_interval` turns), and otherwise only
+    the agents and stations whose JSON changed since the previous decision point: positions, holdings,
+    station items, cooking progress, dirty plates.
+    Token counts of every turn, and of the full observation it replaced, are kept for reporting.
+    History policies that drop turns (LastKTurns) keep every turn back to the last keyframe.
+    """
+    def __init__(self, mode: str = "full", keyframe_interval: int = 5):
+        if mode not in OBSERVATION_MODES:
+            raise ValueError(f"Unknown observation mode {mode}, expected one of {OBSERVATION_MODES}")
+        self.mode = mode
+        self.keyframe_interval = keyframe_interval
+        self.turns = []
+        self.reset()
+
+    def reset(self):
+        """Forget the reference state, e.g. after the simulator has been rolled back; the next turn is a keyframe"""
+        self.reference = None
+        self.reference_time = None
+        self.since_keyframe = 0
+
+    def encode(self, simulator: Simulator) -> str:
+        status = simulator.status()
+        world_json = simulator.world.to_json()
+        full = f"Observation:\n{status}\nCurrent World State:\n{world_json}\n"
+        state = index_world(world_json)
+
+        keyframe = self.mode == "full" or self.reference is None
+        if self.keyframe_interval > 0 and self.since_keyframe >= self.keyframe_interval:
+            keyframe = True
+        if keyframe:
+            prompt = full
+            self.since_keyframe = 0
+        else:
+            changes = {
+                key: [obj for name, obj in state[key].items() if self.reference[key].get(name) != obj]
+                for key in ["agents", "tiles"]
+            }
+            if changes["agents"] or changes["tiles"]:
+                # Same repr as the keyframe world state
+                changed = str(changes)
+            else:
+                changed = "No changes."
+            prompt = (f"Observation:\n{status}\n{DELTA_MARKER} {self.reference_time} "
+                      f"(objects not listed are unchanged since then):\n{changed}\n")
+        self.since_keyframe += 1
+        self.reference = state
+        self.reference_time = simulator.current_time
+
+        self.turns.append({
+            "time": simulator.current_time,
+            "kind": "keyframe" if keyframe else "delta",
+            "tokens": count_tokens(prompt),
+            "full_tokens": count_tokens(full),
+        })
+        return prompt
+
+    def report(self) -> dict:
+        tokens = sum(turn["tokens"] for turn in self.turns)
+        full_tokens = sum(turn["full_tokens"] for turn in self.turns)
+        return {
+            "mode": self.mode,
+            "keyframe_interval": self.keyframe_interval,
+            "tokens": tokens,
+            "full_tokens": full_tokens,
+            "saved_ratio": 1 - tokens / full_tokens if full_tokens else 0.0,
+            "turns": self.turns,
+        }
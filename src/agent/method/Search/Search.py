@@ -0,0 +1,31 @@
+# src/agent/method/Search/Search.py
+
+import json
+
+from src.agent.model.model import Model
+from src.agent.method.agent import Agent
+from src.agent.method.Search.planner import SearchPlanner
+from src.game.simulator import Simulator
+from src.utils.logger_config import logger, log_model_conversation, COLOR_CODES, RESET
+
+class SearchAgent(Agent):
+    """Non-LLM reference agent: searches subtask assignments and emits an executable plan"""
+    def __init__(self, model: Model|None = None, log_dir: str|None = None, num_candidates: int = 200, seed: int = 0):
+        super().__init__(model, log_dir)
+        self.num_candidates = num_candidates
+        self.seed = seed
+
+    def run_test(self, simulator: Simulator, recipes: list, examples: list = [], retries=3) -> dict:
+        planner = SearchPlanner(simulator, num_candidates=self.num_candidates, seed=self.seed)
+        plan, stats = planner.search()
+        logger.info(f"{COLOR_CODES['CYAN']}Search statistics: {stats}{RESET}")
+        if plan is None:
+            logger.error(f"{COLOR_CODES['RED']}Search found no valid plan{RESET}")
+            return self.create_result(simulator, 0, {}, "Search found no valid plan")
+        plan = self.postprocess_plan(simulator, plan)
+        log_model_conversation(f"{COLOR_CODES['YELLOW']}Search plan: {json.dumps(plan)}{RESET}")
+        simulator.submit_plan(plan)
+        simulator.run_simulation()
+        result = self.create_result(simulator, 0, plan)
+        result["search_stats"] = stats
+        return result
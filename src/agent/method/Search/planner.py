@@ -0,0 +1,424 @@
+# src/agent/method/Search/planner.py
+#
+# Search-based reference planner. Orders are decomposed into high-level subtasks
+# (prepare an ingredient, wash a plate, assemble and serve a dish), a randomized
+# list scheduler assigns them to agents and expands them into MoveTo/Interact/
+# Process/Wait actions, and every candidate plan is scored on the simulator's
+# headless evaluation path. The shortest valid plan wins.
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.game.const import *
+from src.game.object import ChoppingBoard, Dispenser, Pan, Plate, PlateReturn, Pot, ServingWindow, Sink, Stove, Table
+from src.game.simulator import Simulator
+
+POT_INGREDIENTS = ["rice", "pasta"]  # Boiled raw, everything else is chopped and fried
+OPEN = None  # End time of a reservation that is not released yet
+
+@dataclass
+class Subtask:
+    kind: str  # "ingredient", "wash" or "assemble"
+    dish: int  # Index of the order the subtask contributes to
+    item: str | None = None
+    state: str | None = None
+    cookware: str | None = None
+    priority: float = 0.0
+
+@dataclass
+class DishState:
+    plate_station: str | None = None  # Station holding the dish's plate
+    plate_ready: Tuple[int, str] | None = None  # (time, agent) the plate is available
+    drops: List[Tuple[int, str]] = field(default_factory=list)  # Ingredients put on the plate
+    cooking: List[Tuple[str, int]] = field(default_factory=list)  # (stove, ready time)
+    served: Tuple[int, str] | None = None
+
+class Timeline:
+    """Action list of one agent together with its position and clock"""
+    def __init__(self, name: str, pos: Tuple[int, int]):
+        self.name = name
+        self.pos = pos
+        self.time = 0
+        self.actions: List[Dict] = []
+
+    def move(self, cell: Tuple[int, int], dist: int):
+        if cell != self.pos:
+            self.actions.append({"action": "MoveTo", "target": [cell[0], cell[1]]})
+            self.time += dist
+            self.pos = cell
+
+    def wait_until(self, time: int):
+        if time > self.time:
+            self.actions.append({"action": "Wait", "duration": time - self.time})
+            self.time = time
+
+    def interact(self, station: str):
+        self.actions.append({"action": "Interact", "target": station})
+        self.time += INTERACT_TIME
+
+    def process(self, station: str, duration: int):
+        self.actions.append({"action": "Process", "target": station})
+        self.time += duration
+
+class PlanningFailed(Exception):
+    """The candidate ordering cannot be turned into a plan"""
+    pass
+
+def after(event: Tuple[int, str], agent_name: str) -> int:
+    """Earliest time an agent may rely on an event; other agents' events need a strictly later time point"""
+    time, owner = event
+    return time if owner == agent_name else time + 1
+
+class CandidateBuilder:
+    """Expands one ordering of subtasks into a concrete multi-agent plan with a model makespan"""
+    def __init__(self, planner: "SearchPlanner", rng: random.Random, noise: float):
+        self.planner = planner
+        self.rng = rng
+        self.noise = noise
+        self.timelines = {name: Timeline(name, pos) for name, pos in planner.agent_positions.items()}
+        self.reservations: Dict[str, List[List]] = {name: [] for name in planner.stations}
+        self.dishes = [DishState() for _ in planner.orders]
+        self.dirty_pickups: List[Tuple[int, str]] = []
+
+    # ---------- resources ----------
+
+    def _slot(self, station: str, earliest: int, duration: int | None) -> int:
+        """Earliest start >= earliest of a [start, start+duration] booking (duration None = open ended)"""
+        start = earliest
+        for begin, end, _ in sorted(self.reservations[station], key=lambda r: r[0]):
+            if end is OPEN:
+                if duration is not None and start + duration < begin:
+                    return start
+                raise PlanningFailed(f"{station} is held by an unfinished dish")
+            if (duration is not None and start + duration < begin) or start > end:
+                continue
+            start = end + 1
+        return start
+
+    def _reserve(self, station: str, start: int, end: int | None, dish: int):
+        self.reservations[station].append([start, end, dish])
+
+    def _release(self, station: str, dish: int, time: int):
+        for reservation in self.reservations[station]:
+            if reservation[1] is OPEN and reservation[2] == dish:
+                reservation[1] = time
+                return
+
+    def _reach(self, timeline: Timeline, station: str) -> Tuple[Tuple[int, int], int]:
+        reach = self.planner.path_index.nearest_adjacent(timeline.pos, self.planner.stations[station])
+        if reach is None:
+            raise PlanningFailed(f"{timeline.name} cannot reach {station}")
+        return reach
+
+    def _pick_station(self, timeline: Timeline, candidates: List[str], duration: int | None) -> Tuple[str, Tuple[int, int], int, int]:
+        """Among candidate stations, the one that can be used the earliest: (station, cell, distance, start)"""
+        best = None
+        for station in candidates:
+            try:
+                cell, dist = self._reach(timeline, station)
+                start = self._slot(station, timeline.time + dist, duration)
+            except PlanningFailed:
+                continue
+            if best is None or start < best[3]:
+                best = (station, cell, dist, start)
+        if best is None:
+            raise PlanningFailed(f"No usable station among {candidates}")
+        return best
+
+    def _go(self, timeline: Timeline, station: str):
+        cell, dist = self._reach(timeline, station)
+        timeline.move(cell, dist)
+
+    # ---------- subtasks ----------
+
+    def choose_agent(self, subtask: Subtask) -> Timeline:
+        """Agent that can start the subtask the earliest, perturbed by noise for diversity"""
+        first_station = self._first_station(subtask)
+        best, best_score = None, None
+        for timeline in self.timelines.values():
+            reach = self.planner.path_index.nearest_adjacent(timeline.pos, self.planner.stations[first_station])
+            if reach is None:
+                continue
+            score = timeline.time + reach[1] + self.rng.uniform(0, self.noise)
+            if best_score is None or score < best_score:
+                best, best_score = timeline, score
+        if best is None:
+            raise PlanningFailed(f"No agent can reach {first_station}")
+        return best
+
+    def _first_station(self, subtask: Subtask) -> str:
+        if subtask.kind == "ingredient":
+            return self.planner.dispenser_for(subtask.item)
+        if subtask.kind == "wash":
+            return self.planner.plate_return
+        return self.dishes[subtask.dish].plate_station
+
+    def run(self, subtask: Subtask):
+        timeline = self.choose_agent(subtask)
+        if subtask.kind == "ingredient":
+            self.prepare_ingredient(timeline, subtask)
+        elif subtask.kind == "wash":
+            self.wash_plate(timeline, subtask)
+        else:
+            self.assemble(timeline, subtask)
+
+    def prepare_ingredient(self, timeline: Timeline, subtask: Subtask):
+        dish = self.dishes[subtask.dish]
+        dispenser = self.planner.dispenser_for(subtask.item)
+        self._go(timeline, dispenser)
+        timeline.interact(dispenser)
+
+        needs_chopping = subtask.state == "chopped" or (subtask.state == "cooked" and subtask.cookware == "pan")
+        if needs_chopping:
+            board, cell, dist, start = self._pick_station(timeline, self.planner.chopping_boards, PROCESS_CUT_TIME)
+            timeline.move(cell, dist)
+            timeline.wait_until(start)
+            timeline.interact(board)
+            timeline.process(board, PROCESS_CUT_TIME)
+            timeline.interact(board)
+            self._reserve(board, start, timeline.time, subtask.dish)
+
+        if subtask.state == "cooked":
+            cook_time = PROCESS_POT_COOK_TIME if subtask.cookware == "pot" else PROCESS_PAN_COOK_TIME
+            stoves = self.planner.stoves[subtask.cookware]
+            try:
+                stove, cell, dist, start = self._pick_station(timeline, stoves, OPEN)
+                shared = False
+            except PlanningFailed:
+                # Every cookware of this kind is busy: share one already cooking for the same dish
+                shared_stoves = [s for s, _ in dish.cooking if s in stoves]
+                if not shared_stoves:
+                    raise
+                stove = shared_stoves[0]
+                cell, dist = self._reach(timeline, stove)
+                start = timeline.time + dist
+                shared = True
+            timeline.move(cell, dist)
+            timeline.wait_until(start)
+            timeline.interact(stove)
+            if shared:
+                # Cooking time accumulates per ingredient in the same cookware
+                index = next(i for i, (s, _) in enumerate(dish.cooking) if s == stove)
+                ready = max(dish.cooking[index][1] + cook_time, timeline.time + cook_time)
+                dish.cooking[index] = (stove, ready)
+            else:
+                self._reserve(stove, timeline.time, OPEN, subtask.dish)
+                dish.cooking.append((stove, timeline.time + cook_time))
+            return
+
+        # Raw or chopped ingredient goes straight onto the dish's plate
+        self._go(timeline, dish.plate_station)
+        timeline.wait_until(after(dish.plate_ready, timeline.name))
+        timeline.interact(dish.plate_station)
+        dish.drops.append((timeline.time, timeline.name))
+
+    def wash_plate(self, timeline: Timeline, subtask: Subtask):
+        source = self.dishes[subtask.dish - self.planner.num_plates].served
+        self._go(timeline, self.planner.plate_return)
+        earliest = source[0] + RETURN_DIRTY_PLATE_TIME
+        if self.dirty_pickups:
+            earliest = max(earliest, after(self.dirty_pickups[-1], timeline.name))
+        timeline.wait_until(earliest)
+        timeline.interact(self.planner.plate_return)
+        self.dirty_pickups.append((timeline.time, timeline.name))
+
+        sink, cell, dist, start = self._pick_station(timeline, self.planner.sinks, PROCESS_WASH_PLATE_TIME)
+        timeline.move(cell, dist)
+        timeline.wait_until(start)
+        timeline.interact(sink)
+        timeline.process(sink, PROCESS_WASH_PLATE_TIME)
+        timeline.interact(sink)
+        self._reserve(sink, start, timeline.time, subtask.dish)
+
+        table, cell, dist, start = self._pick_station(timeline, self.planner.free_tables, OPEN)
+        timeline.move(cell, dist)
+        timeline.wait_until(start)
+        timeline.interact(table)
+        self._reserve(table, timeline.time, OPEN, subtask.dish)
+        dish = self.dishes[subtask.dish]
+        dish.plate_station = table
+        dish.plate_ready = (timeline.time, timeline.name)
+
+    def assemble(self, timeline: Timeline, subtask: Subtask):
+        dish = self.dishes[subtask.dish]
+        self._go(timeline, dish.plate_station)
+        ready = after(dish.plate_ready, timeline.name)
+        for drop in dish.drops:
+            ready = max(ready, after(drop, timeline.name))
+        timeline.wait_until(ready)
+        timeline.interact(dish.plate_station)
+        self._release(dish.plate_station, subtask.dish, timeline.time)
+
+        for stove, cooked_at in sorted(dish.cooking, key=lambda c: c[1]):
+            self._go(timeline, stove)
+            timeline.wait_until(cooked_at)
+            timeline.interact(stove)
+            self._release(stove, subtask.dish, timeline.time)
+
+        window = self.planner.serving_window
+        self._go(timeline, window)
+        if subtask.dish > 0:
+            timeline.wait_until(after(self.dishes[subtask.dish - 1].served, timeline.name))
+        timeline.interact(window)
+        dish.served = (timeline.time, timeline.name)
+
+    def build(self, subtasks: List[Subtask], plate_stations: List[str]) -> Tuple[Dict[str, List[Dict]], int]:
+        for index, station in enumerate(plate_stations):
+            if index < len(self.dishes):
+                self.dishes[index].plate_station = station
+                self.dishes[index].plate_ready = (0, "")
+                self._reserve(station, 0, OPEN, index)
+        for subtask in subtasks:
+            self.run(subtask)
+        plan = {name: timeline.actions for name, timeline in self.timelines.items()}
+        return plan, max(timeline.time for timeline in self.timelines.values())
+
+class SearchPlanner:
+    """
+    Randomized list-scheduling search over subtask orderings and agent assignments.
+    Candidate 0 is the deterministic greedy schedule; the others perturb subtask
+    priorities and agent choice. All candidates are checked with Simulator.evaluate.
+    """
+    def __init__(self, simulator: Simulator, num_candidates: int = 200, seed: int = 0, noise: float = 6.0):
+        self.simulator = simulator
+        self.num_candidates = num_candidates
+        self.seed = seed
+        self.noise = noise
+
+        world = simulator.world
+        self.path_index = world.path_index
+        self.orders = list(world.orders)
+        self.recipes = {recipe["name"]: recipe for recipe in world.recipes}
+        self.agent_positions = {name: (agent.x, agent.y) for name, agent in world.agents.items()}
+
+        self.stations: Dict[str, Tuple[int, int]] = {}
+        self.dispensers: Dict[str, List[str]] = {}
+        self.chopping_boards: List[str] = []
+        self.stoves: Dict[str, List[str]] = {"pan": [], "pot": []}
+        self.sinks: List[str] = []
+        self.plate_tables: List[str] = []
+        self.free_tables: List[str] = []
+        self.plate_return = None
+        self.serving_window = None
+        for obj in world.objects.values():
+            if isinstance(obj, Dispenser):
+                self.dispensers.setdefault(obj.provides, []).append(obj.name)
+            elif isinstance(obj, ChoppingBoard):
+                self.chopping_boards.append(obj.name)
+            elif isinstance(obj, Stove) and isinstance(obj.item, Pan):
+                self.stoves["pan"].append(obj.name)
+            elif isinstance(obj, Stove) and isinstance(obj.item, Pot):
+                self.stoves["pot"].append(obj.name)
+            elif isinstance(obj, Sink):
+                self.sinks.append(obj.name)
+            elif isinstance(obj, Table):
+                # Any table can take a washed plate once its own plate has been used
+                self.free_tables.append(obj.name)
+                if isinstance(obj.item, Plate):
+                    self.plate_tables.append(obj.name)
+            elif isinstance(obj, PlateReturn) and self.plate_return is None:
+                self.plate_return = obj.name
+            elif isinstance(obj, ServingWindow) and self.serving_window is None:
+                self.serving_window = obj.name
+            else:
+                continue
+            self.stations[obj.name] = obj.get_pos()
+        self.num_plates = len(self.plate_tables)
+
+    def dispenser_for(self, item: str) -> str:
+        if item not in self.dispensers:
+            raise PlanningFailed(f"No dispenser provides {item}")
+        return self.dispensers[item][0]
+
+    def decompose(self) -> List[Subtask]:
+        """High-level subtasks in dependency order"""
+        subtasks = []
+        for index, order in enumerate(self.orders):
+            if index >= self.num_plates:
+                subtasks.append(Subtask("wash", index))
+            for ingredient in self.recipes[order]["ingredients"]:
+                item, state = ingredient["item"], ingredient["state"]
+                cookware = None
+                if state == "cooked":
+                    cookware = ingredient.get("cookware") or ("pot" if item in POT_INGREDIENTS else "pan")
+                subtasks.append(Subtask("ingredient", index, item, state, cookware))
+            subtasks.append(Subtask("assemble", index))
+        return subtasks
+
+    def _ordering(self, rng: random.Random, spread: float) -> List[Subtask]:
+        """Random priorities that keep each dish's dependencies in front of it"""
+        subtasks = self.decompose()
+        for subtask in subtasks:
+            if subtask.kind == "assemble":
+                subtask.priority = subtask.dish + 1.0
+            elif subtask.kind == "wash":
+                # Right after the dish whose plate it recycles has been served
+                subtask.priority = subtask.dish - self.num_plates + 1.0 + rng.uniform(0.0, 0.01)
+            elif subtask.state == "cooked":
+                subtask.priority = subtask.dish + rng.uniform(-spread, 0.9)
+            else:
+                subtask.priority = subtask.dish + rng.uniform(0.02, 0.9)
+        ordered = sorted(subtasks, key=lambda s: s.priority)
+
+        # Re-establish hard dependencies that the random keys may have broken
+        result, done_assembly, done_wash = [], set(), set()
+        pending = list(ordered)
+        while pending:
+            for i, subtask in enumerate(pending):
+                if subtask.kind == "wash" and subtask.dish - self.num_plates not in done_assembly:
+                    continue
+                if subtask.kind == "ingredient" and subtask.state != "cooked" and subtask.dish >= self.num_plates and subtask.dish not in done_wash:
+                    continue
+                if subtask.kind == "assemble":
+                    own = [s for s in pending if s.dish == subtask.dish and s is not subtask]
+                    if own or (subtask.dish > 0 and subtask.dish - 1 not in done_assembly):
+                        continue
+                break
+            else:
+                raise PlanningFailed("Cyclic subtask dependencies")
+            subtask = pending.pop(i)
+            if subtask.kind == "assemble":
+                done_assembly.add(subtask.dish)
+            elif subtask.kind == "wash":
+                done_wash.add(subtask.dish)
+            result.append(subtask)
+        return result
+
+    def candidate(self, index: int) -> Tuple[Dict[str, List[Dict]], int]:
+        """Build candidate `index`; 0 is the deterministic greedy schedule"""
+        rng = random.Random(self.seed * 100003 + index)
+        noise = 0.0 if index == 0 else self.noise
+        spread = 0.0 if index == 0 else 1.5
+        plate_stations = list(self.plate_tables)
+        if index > 0:
+            rng.shuffle(plate_stations)
+        builder = CandidateBuilder(self, rng, noise)
+        return builder.build(self._ordering(rng, spread), plate_stations)
+
+    def search(self) -> Tuple[Optional[Dict[str, List[Dict]]], Dict]:
+        """Return the best valid plan (or None) and search statistics"""
+        best_plan, best_time = None, None
+        seen = set()
+        stats = {"candidates": 0, "failed": 0, "duplicates": 0, "evaluated": 0, "invalid": 0}
+        for index in range(self.num_candidates):
+            stats["candidates"] += 1
+            try:
+                plan, _ = self.candidate(index)
+            except PlanningFailed:
+                stats["failed"] += 1
+                continue
+            key = repr(plan)
+            if key in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(key)
+            result = self.simulator.evaluate(plan)
+            stats["evaluated"] += 1
+            if not (result.valid and result.done):
+                stats["invalid"] += 1
+                continue
+            if best_time is None or result.time < best_time:
+                best_plan, best_time = plan, result.time
+        stats["best_time"] = best_time
+        return best_plan, stats
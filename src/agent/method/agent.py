@@ -1,16 +1,185 @@
 # Base class for all agents
-import os, datetime
+import os, datetime, json, re, time
+from concurrent.futures import ThreadPoolExecutor
 
 from src.agent.model.model import Model, PredictConfig
-from src.utils.utils import extract_json
+from src.agent.method.plan_optimizer import retime_plan
+from src.agent.method.plan_repair import repair_plan
+from src.agent.method.prompt_blocks import PromptBlock, example_blocks, system_block, task_block
+from src.agent.method.streaming import PlanStreamParser, validate_actions
+from src.utils.utils import extract_json, count_tokens
 from src.utils.logger_config import logger, log_model_conversation, COLOR_CODES, RESET
 
+# Every REFINE_INSTRUCTION starts with this sentence
+REFINE_MARKER = "Your previous action plan occurred an error"
+
+# Delta observations of ObservationEncoder start with the status followed by this phrase
+DELTA_MARKER = "Changes since time"
+
+def is_refine_prompt(message: dict) -> bool:
+    return message["role"] == "user" and REFINE_MARKER in message["content"][:200]
+
+def is_delta_observation(message: dict) -> bool:
+    return message["role"] == "user" and message["content"].startswith("Observation:") and DELTA_MARKER in message["content"]
+
+def compact_plan(content: str) -> str | None:
+    """The plan of an assistant message as one-line JSON without the reasoning, None if it cannot be parsed"""
+    try:
+        actions = extract_json(content)
+    except Exception:
+        return None
+    if isinstance(actions, dict) and "plan" in actions:
+        actions = actions["plan"]
+    return json.dumps(actions, separators=(",", ":"))
+
+class HistoryPolicy:
+    """
+    Decides which messages of the chat history are sent to the model.
+    `pinned` is the number of leading messages that are always kept (system prompt, few-shot examples
+    and the task prompt); the remaining messages alternate user/assistant and end with the new user message.
+    The base policy sends everything.
+    """
+    name = "full"
+
+    def __init__(self, turns: int = 4):
+        self.turns = turns
+
+    def compact(self, messages: list, pinned: int) -> list:
+        return messages
+
+class LastKTurns(HistoryPolicy):
+    """
+    Pinned messages plus the last `turns` user turns. The dropped turns are replaced by a single
+    assistant note, so user and assistant messages keep alternating after the pinned task prompt.
+    A delta observation only makes sense together with the turns back to its keyframe, so the window
+    is extended to the last full observation when it would start on a delta.
+    """
+    name = "last_k"
+
+    def summarize(self, dropped: list) -> str:
+        return f"({len(dropped) // 2 + 1} earlier turns omitted)"
+
+    def compact(self, messages: list, pinned: int) -> list:
+        turns = messages[pinned:]
+        keep = 2 * self.turns - 1
+        if len(turns) <= keep + 1:
+            return messages
+        start = len(turns) - keep
+        while start > 0 and is_delta_observation(turns[start]):
+            start -= 2
+        if start <= 1:
+            return messages
+        dropped, recent = turns[:start], turns[start:]
+        return messages[:pinned] + [{"role": "assistant", "content": self.summarize(dropped)}] + recent
+
+class StateDigest(LastKTurns):
+    """Like LastKTurns, but the note is a digest of the plans issued (and errors reported) in the dropped turns"""
+    name = "digest"
+
+    def summarize(self, dropped: list) -> str:
+        lines = []
+        time = "0"
+        for message in dropped:
+            if message["role"] == "user":
+                match = re.search(r"Current time: (\d+)", message["content"])
+                time = match.group(1) if match else "?"
+                if is_refine_prompt(message):
+                    error = message["content"].split("simulation:", 1)[-1].split("\n", 1)[0].strip()
+                    lines.append(f"- error reported: {error}")
+            elif message["role"] == "assistant":
+                plan = compact_plan(message["content"])
+                lines.append(f"- time {time}: plan {plan if plan is not None else '(unparsable)'}")
+        return "Summary of my earlier turns (observations omitted):\n" + "\n".join(lines)
+
+class DropSupersededPlans(HistoryPolicy):
+    """
+    Keeps every turn, but only the latest assistant message in full. Earlier plans are cut down to their
+    one-line plan JSON (the reasoning is dropped), and plans rejected by a refine prompt are replaced by a note.
+    """
+    name = "drop_superseded"
+
+    def compact(self, messages: list, pinned: int) -> list:
+        result = messages[:pinned]
+        last_assistant = max((i for i in range(pinned, len(messages)) if messages[i]["role"] == "assistant"), default=-1)
+        for i in range(pinned, len(messages)):
+            message = messages[i]
+            if message["role"] == "assistant" and i != last_assistant:
+                if i + 1 < len(messages) and is_refine_prompt(messages[i + 1]):
+                    message = dict(message, content="(plan rejected by the simulator, superseded by a later plan)")
+                else:
+                    plan = compact_plan(message["content"])
+                    if plan is not None:
+                        message = dict(message, content=plan)
+            result.append(message)
+        return result
+
+HISTORY_POLICIES = {policy.name: policy for policy in [HistoryPolicy, LastKTurns, StateDigest, DropSupersededPlans]}
+
+class HistoryManager:
+    """Applies a HistoryPolicy to the chat history before every request and counts the tokens it saves"""
+    def __init__(self, policy: HistoryPolicy | None = None):
+        self.policy = policy or HistoryPolicy()
+        self.pinned = 0
+        self.session = None
+        self.calls = 0
+        self.full_tokens = 0
+        self.sent_tokens = 0
+        self._token_cache = {}
+
+    def _tokens(self, messages: list) -> int:
+        total = 0
+        for message in messages:
+            content = message.get("content", "")
+            if not isinstance(content, str):
+                content = str(content)
+            if content not in self._token_cache:
+                self._token_cache[content] = count_tokens(content)
+            total += self._token_cache[content]
+        return total
+
+    def add_block(self, block: PromptBlock):
+        """Reuse the token count of a compiled prompt block instead of counting its text again"""
+        self._token_cache[block.text] = block.tokens
+
+    def messages_for(self, chat_history: list) -> list:
+        # A new history list (initiate_chat) starts a session: everything up to the first task prompt is pinned
+        if self.session != id(chat_history) or self.pinned > len(chat_history):
+            self.session = id(chat_history)
+            self.pinned = len(chat_history)
+        messages = self.policy.compact(chat_history, self.pinned)
+        self.calls += 1
+        self.full_tokens += self._tokens(chat_history)
+        self.sent_tokens += self._tokens(messages)
+        return messages
+
+    def report(self) -> dict:
+        return {
+            "policy": self.policy.name,
+            "turns": self.policy.turns,
+            "calls": self.calls,
+            "full_tokens": self.full_tokens,
+            "sent_tokens": self.sent_tokens,
+            "saved_tokens": self.full_tokens - self.sent_tokens,
+        }
+
 class Agent:
     def __init__(self, model: Model | None = None, log_dir: str | None = None):
         self.model = model
         self.chat_history = []
         self.log_dir = log_dir
         self.log_initiated = False
+        self.history = HistoryManager()
+        # Re-time valid plans before executing them (see plan_optimizer)
+        self.retime = False
+        self.retime_report = None
+        # Repair small mistakes of model plans locally before falling back to a refine prompt (see plan_repair)
+        self.repair = False
+        self.repair_attempts = []
+        # Stream responses and validate action lists while they arrive (see stream_chat)
+        self.stream = False
+        self.stream_stats = []
+        # Tokens of the compiled prompt blocks of the current test (see prompt_blocks)
+        self.prompt_tokens = {}
 
     def log_conversation(self, log_file="model.log", full: bool = False) -> None:
         """Log the conversation to a file."""
@@ -43,21 +212,132 @@ class Agent:
             f.write(log_content)
         logger.info(f"Logged conversation to {log_path}")
 
+    def compile_chat(self, package: str, examples: list = []) -> list:
+        """
+        System prompt and few-shot examples of `package` (the agent's method package) as chat messages.
+        The formatted INSTRUCTION and the examples are compiled once per process and shared by every test.
+        """
+        system = system_block(self.INSTRUCTION)
+        messages = [{"role": "system", "content": system.text}]
+        self.history.add_block(system)
+        example_tokens = 0
+        for ex_input, ex_output in example_blocks(package, tuple(examples)):
+            self.history.add_block(ex_input)
+            self.history.add_block(ex_output)
+            messages.append({"role": "user", "content": ex_input.text})
+            messages.append({"role": "assistant", "content": ex_output.text})
+            example_tokens += ex_input.tokens + ex_output.tokens
+        self.prompt_tokens = {"system": system.tokens, "examples": example_tokens}
+        return messages
+
+    def task_prompt(self, simulator, recipes: list) -> str:
+        """Map, recipes and orders of the test, compiled once per map"""
+        task = task_block(simulator.world.map_data, recipes, simulator.world.orders)
+        self.prompt_tokens["task"] = task.tokens
+        self.history.add_block(task)
+        return task.text
+
     def chat(self, user_input: str, chat_history=None) -> str:
         if not self.model:
             raise ValueError("Model is not defined for this agent to chat.")
         if chat_history:
             self.chat_history = chat_history
         self.chat_history.append({"role": "user", "content": user_input})
-        response = self.model.predict(PredictConfig(messages=self.chat_history, temperature=0, response_format={ "type": "json_object" }))
-        self.chat_history.append({"role": "assistant", "content": response})
+        messages = self.history.messages_for(self.chat_history)
+        # The pinned part (system prompt, examples, task with the map) is the cacheable prefix
+        response = self.model.predict(PredictConfig(messages=messages, temperature=0, response_format={ "type": "json_object" }, cache_prefix=self.history.pinned))
+        self.add_response(response)
+        return response
+
+    def sample_chat(self, user_input: str, n: int, temperature: float) -> list:
+        """
+        Send the same request n times concurrently. Returns the responses in request order, with the
+        exception in place of a response for failed requests. The chat history only gets the user
+        message; the caller picks the response to keep with add_response().
+        """
+        if not self.model:
+            raise ValueError("Model is not defined for this agent to chat.")
+        self.chat_history.append({"role": "user", "content": user_input})
+        messages = self.history.messages_for(self.chat_history)
+        config = PredictConfig(messages=messages, temperature=temperature, response_format={ "type": "json_object" }, cache_prefix=self.history.pinned)
 
+        def request(_):
+            try:
+                return self.model.predict(config)
+            except Exception as e:
+                logger.error(f"{COLOR_CODES['RED']}Sample request failed: {e}{RESET}")
+                return e
+
+        with ThreadPoolExecutor(max_workers=n) as executor:
+            return list(executor.map(request, range(n)))
+
+    def add_response(self, response: str):
+        self.chat_history.append({"role": "assistant", "content": response})
         self.log_conversation(full=not self.log_initiated)
         self.log_initiated = True
+
+    def stream_chat(self, user_input: str, world) -> str:
+        """
+        chat() over a streamed response. Each agent's action list is checked with validate_actions as
+        soon as it is complete; on the first error the stream is dropped and a ValueError raised without
+        waiting for the rest of the output. The partial response stays in the chat history, and the
+        agent's retry loop handles the error like a simulation error (a refine prompt quoting it).
+        With repair enabled, MoveTo targets are not checked, since repair_plan fixes them locally.
+        """
+        if not self.model:
+            raise ValueError("Model is not defined for this agent to chat.")
+        self.chat_history.append({"role": "user", "content": user_input})
+        messages = self.history.messages_for(self.chat_history)
+        config = PredictConfig(messages=messages, temperature=0, response_format={ "type": "json_object" }, cache_prefix=self.history.pinned)
+        parser = PlanStreamParser()
+        stats = {"first_token_s": None, "first_action_s": None, "total_s": None, "chars": 0, "aborted": None}
+        self.stream_stats.append(stats)
+        start = time.perf_counter()
+        chunks = self.model.stream(config)
+        response = ""
+        try:
+            for chunk in chunks:
+                if stats["first_token_s"] is None:
+                    stats["first_token_s"] = time.perf_counter() - start
+                response += chunk
+                for agent_name, actions, error, in_plan in parser.feed(chunk):
+                    # Top-level arrays are only action lists when named after an agent
+                    if not in_plan and agent_name not in world.agents:
+                        continue
+                    error = error or validate_actions(world, agent_name, actions, check_positions=not self.repair)
+                    if error:
+                        stats["aborted"] = error
+                        logger.error(f"{COLOR_CODES['RED']}Aborting streamed response after {len(response)} characters: {error}{RESET}")
+                        raise ValueError(f"Invalid plan for {agent_name}: {error}")
+                    if stats["first_action_s"] is None:
+                        stats["first_action_s"] = time.perf_counter() - start
+                        logger.info(f"First complete action list ({agent_name}) after {stats['first_action_s']:.2f}s")
+        finally:
+            chunks.close()
+            stats["total_s"] = time.perf_counter() - start
+            stats["chars"] = len(response)
+            self.add_response(response)
         return response
 
-    def get_actions(self, prompt: str) -> dict:
-        response = self.chat(prompt)
+    def stream_report(self) -> dict | None:
+        if not self.stream:
+            return None
+        first_actions = [s["first_action_s"] for s in self.stream_stats if s["first_action_s"] is not None]
+        return {
+            "requests": len(self.stream_stats),
+            "aborted": sum(1 for s in self.stream_stats if s["aborted"]),
+            "avg_time_to_first_action_s": sum(first_actions) / len(first_actions) if first_actions else None,
+            "avg_total_s": sum(s["total_s"] for s in self.stream_stats) / len(self.stream_stats) if self.stream_stats else None,
+            "requests_detail": self.stream_stats,
+        }
+
+    def get_actions(self, prompt: str, world=None) -> dict:
+        """Query the model for a plan; with streaming enabled and a world given, validate it while it arrives"""
+        if self.stream and world is not None:
+            return self.parse_actions(self.stream_chat(prompt, world))
+        return self.parse_actions(self.chat(prompt))
+
+    def parse_actions(self, response: str) -> dict:
         log_model_conversation(f"{COLOR_CODES['YELLOW']}Model output: {response}{RESET}")
         if not isinstance(response, str):
             raise ValueError("Model response is not a string.")
@@ -73,6 +353,44 @@ class Agent:
             raise ValueError("Failed to parse model output as JSON.") from e
         return actions
     
+    def postprocess_plan(self, simulator, plan: dict) -> dict:
+        """Optional post-processing of a valid plan; `simulator` must hold the state the plan starts from"""
+        if not self.retime:
+            return plan
+        try:
+            result = retime_plan(simulator, plan)
+        except ValueError as e:
+            logger.warning(f"Plan not re-timed: {e}")
+            return plan
+        self.retime_report = result.report()
+        logger.info(f"{COLOR_CODES['CYAN']}Re-timed plan: time {result.original_time} -> {result.time} ({len(result.changes)} changes){RESET}")
+        return result.plan
+
+    def repair_plan(self, simulator, plan: dict) -> dict:
+        """Locally repaired plan if the model plan fails; `simulator` must hold the state the plan starts from"""
+        if not self.repair or not isinstance(plan, dict):
+            return plan
+        result = repair_plan(simulator, plan)
+        if not result.repaired and not result.repairs and result.error is None:
+            return plan  # Valid as it is
+        self.repair_attempts.append(result.report())
+        for repair in result.repairs:
+            logger.info(f"{COLOR_CODES['CYAN']}Plan repair: {repair}{RESET}")
+        if result.repaired:
+            logger.info(f"{COLOR_CODES['CYAN']}Repaired plan locally with {len(result.repairs)} changes, no refine round needed{RESET}")
+        else:
+            logger.warning(f"Local plan repair failed: {result.error}")
+        return result.plan
+
+    def repair_report(self) -> dict | None:
+        if not self.repair:
+            return None
+        return {
+            "attempts": len(self.repair_attempts),
+            "repaired": sum(1 for attempt in self.repair_attempts if attempt["repaired"]),
+            "details": self.repair_attempts,
+        }
+
     def create_result(self, simulator, retry_count: int, plan: dict|None = None, error_msg: str|None = None) -> dict:
         world = simulator.world
         return {
@@ -98,5 +416,11 @@ class Agent:
             },
             "error": error_msg,
             "retry_count": retry_count,
+            "history_tokens": self.history.report(),
+            "prompt_cache": self.model.cache_report() if self.model is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "retime": self.retime_report,
+            "repair": self.repair_report(),
+            "streaming": self.stream_report(),
             "plan": { name: agent.all_actions for (name, agent) in simulator.world.agents.items() } if plan is None else plan
         }
\ No newline at end of file
@@ -0,0 +1,196 @@
+# src/agent/method/plan_optimizer.py
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.game.simulator import Simulator
+
+@dataclass
+class RetimeResult:
+    """Outcome of re-timing a plan"""
+    plan: Dict[str, List[Dict]]
+    original_time: int
+    time: int
+    evaluations: int  # Simulator runs spent
+    changes: List[str] = field(default_factory=list)
+
+    @property
+    def slack(self) -> int:
+        return self.original_time - self.time
+
+    def report(self) -> dict:
+        return {
+            "original_time": self.original_time,
+            "time": self.time,
+            "slack": self.slack,
+            "slack_ratio": self.slack / self.original_time if self.original_time else 0.0,
+            "evaluations": self.evaluations,
+            "changes": self.changes,
+        }
+
+class PlanRetimer:
+    """
+    Removes slack from a valid plan without changing the order of any agent's Interact/Process actions.
+    Each pass tries to drop Wait and MoveTo actions (oversized waits, no-op moves, detours through an
+    intermediate tile), then shortens Waits of several agents that overlap in time by the same amount
+    (slack the agents share, e.g. a pause kept for a handoff, which no single agent can give up alone),
+    and then shrinks the remaining Waits one at a time, so later actions start earlier. Every candidate
+    is checked on a headless clone: it must stay valid, serve at least the same orders, and not finish
+    later than the best plan so far.
+    The result is a local optimum of these moves, not necessarily the minimum makespan of the plan.
+    """
+    def __init__(self, simulator: Simulator, max_passes: int = 5):
+        self.simulator = simulator
+        self.max_passes = max_passes
+        self.evaluations = 0
+        self.best_time = 0
+        self.done = False
+        self.finished = 0
+
+    def check(self, plan: Dict[str, List[Dict]]) -> Optional[int]:
+        """Makespan of the candidate if it is acceptable, else None"""
+        self.evaluations += 1
+        # Anything still running after the best makespan cannot be an improvement
+        result = self.simulator.evaluate(plan, until=self.best_time)
+        if not result.valid or result.simulator.event_queue:
+            return None
+        if result.done != self.done or len(result.simulator.world.finished_orders) < self.finished:
+            return None
+        return result.time
+
+    def optimize(self, plan: Dict[str, List[Dict]]) -> RetimeResult:
+        base = self.simulator.evaluate(plan)
+        self.evaluations += 1
+        if not base.valid:
+            raise ValueError(f"Plan is not valid: {base.error}")
+        self.done = base.done
+        self.finished = len(base.simulator.world.finished_orders)
+        self.best_time = base.time
+
+        plan = {name: [dict(action) for action in actions] for name, actions in plan.items()}
+        changes = []
+        for _ in range(self.max_passes):
+            joint = self.joint_pass(plan, changes)
+            dropped = self.drop_pass(plan, changes)
+            shrunk = self.shrink_pass(plan, changes)
+            if not dropped and not joint and not shrunk:
+                break
+        return RetimeResult(plan, base.time, self.best_time, self.evaluations, changes)
+
+    def drop_pass(self, plan: Dict[str, List[Dict]], changes: List[str]) -> bool:
+        changed = False
+        for name, actions in plan.items():
+            i = len(actions) - 1
+            # Back to front, so indices of untried actions do not shift
+            while i >= 0:
+                action = actions[i]
+                if action["action"] in ("Wait", "MoveTo"):
+                    candidate = dict(plan, **{name: actions[:i] + actions[i + 1:]})
+                    time = self.check(candidate)
+                    if time is not None:
+                        changes.append(f"{name}: dropped {action} (time {self.best_time} -> {time})")
+                        del actions[i]
+                        self.best_time = time
+                        changed = True
+                i -= 1
+        return changed
+
+    def wait_intervals(self, plan: Dict[str, List[Dict]]) -> Dict[str, Dict[int, Tuple[int, int]]]:
+        """(start, end) of every Wait of the plan when it runs, by agent and index in its action list"""
+        offset = {name: len(agent.all_actions) for name, agent in self.simulator.world.agents.items()}
+        started = dict(offset)
+        intervals = {name: {} for name in plan}
+
+        def record(clone: Simulator):
+            # Every action started since the last step started at the current time
+            for name, agent in clone.world.agents.items():
+                count = len(agent.all_actions) - len(agent.action_queue)
+                for index in range(started[name], count):
+                    action = agent.all_actions[index]
+                    if name in intervals and action.get("action") == "Wait":
+                        start = clone.current_time
+                        intervals[name][index - offset[name]] = (start, start + action.get("duration", 1))
+                started[name] = count
+
+        self.evaluations += 1
+        self.simulator.evaluate(plan, on_step=record)
+        return intervals
+
+    def aligned_waits(self, plan: Dict[str, List[Dict]]) -> List[Tuple[Dict[str, int], int]]:
+        """
+        Groups of Waits of at least two agents that all run during a common time window, as
+        ({agent: action index}, shortest duration in the group); each Wait anchors one group, joined by
+        the other agents' Wait that overlaps the window most.
+        """
+        intervals = self.wait_intervals(plan)
+        groups, seen = [], set()
+        for name, waits in intervals.items():
+            for index, (start, end) in waits.items():
+                group = {name: index}
+                for other, other_waits in intervals.items():
+                    if other == name:
+                        continue
+                    overlaps = [(min(end, e) - max(start, s), i, s, e) for i, (s, e) in other_waits.items()]
+                    overlap, i, s, e = max(overlaps, default=(0, None, 0, 0))
+                    if overlap > 0:
+                        group[other] = i
+                        start, end = max(start, s), min(end, e)
+                key = frozenset(group.items())
+                if len(group) > 1 and key not in seen:
+                    seen.add(key)
+                    groups.append((group, end - start, min(plan[n][i].get("duration", 1) for n, i in group.items())))
+        # Widest shared windows first
+        return [(group, shortest) for group, _, shortest in sorted(groups, key=lambda item: -item[1])]
+
+    def joint_pass(self, plan: Dict[str, List[Dict]], changes: List[str]) -> bool:
+        changed = False
+        while True:
+            for group, shortest in self.aligned_waits(plan):
+                # Longest cut first, which may exceed the overlap when the Waits are not exactly aligned;
+                # a Wait cut to zero is dropped
+                for cut in range(shortest, 0, -1):
+                    candidate = dict(plan)
+                    for name, i in group.items():
+                        action = plan[name][i]
+                        shortened = [dict(action, duration=action.get("duration", 1) - cut)] if action.get("duration", 1) > cut else []
+                        candidate[name] = plan[name][:i] + shortened + plan[name][i + 1:]
+                    time = self.check(candidate)
+                    if time is not None:
+                        changes.append(f"{', '.join(sorted(group))}: aligned Waits cut by {cut} (time {self.best_time} -> {time})")
+                        plan.update(candidate)
+                        self.best_time = time
+                        break
+                else:
+                    continue
+                changed = True
+                # Start times have moved, find the groups again
+                break
+            else:
+                return changed
+
+    def shrink_pass(self, plan: Dict[str, List[Dict]], changes: List[str]) -> bool:
+        changed = False
+        for name, actions in plan.items():
+            for i, action in enumerate(actions):
+                if action["action"] != "Wait" or action.get("duration", 1) <= 1:
+                    continue
+                duration = action["duration"]
+                # Smallest acceptable duration, probed upwards: waiting too long can break a handoff just
+                # like waiting too little, so acceptability is not monotone and a binary search would miss it
+                for shorter in range(1, duration):
+                    candidate = dict(plan, **{name: actions[:i] + [dict(action, duration=shorter)] + actions[i + 1:]})
+                    time = self.check(candidate)
+                    if time is not None:
+                        changes.append(f"{name}: Wait {duration} -> {shorter} (time {self.best_time} -> {time})")
+                        actions[i] = dict(action, duration=shorter)
+                        self.best_time = time
+                        changed = True
+                        break
+        return changed
+
+def retime_plan(simulator: Simulator, plan: Dict[str, List[Dict]], max_passes: int = 5) -> RetimeResult:
+    """
+    Equivalent of a valid plan with its slack removed, a local optimum of PlanRetimer's moves;
+    `simulator` must hold the state the plan starts from
+    """
+    return PlanRetimer(simulator, max_passes).optimize(plan)
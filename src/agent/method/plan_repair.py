@@ -0,0 +1,261 @@
+# src/agent/method/plan_repair.py
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.game.const import PROCESS_PAN_COOK_TIME, PROCESS_POT_COOK_TIME, PROCESS_WASH_PLATE_TIME, RETURN_DIRTY_PLATE_TIME
+from src.game.object import Pan, PlateReturn, Pot, Station, Stove
+from src.game.simulator import EvaluationResult, Simulator
+
+# Longest time anything in the kitchen takes to become ready
+MAX_WAIT = max(PROCESS_PAN_COOK_TIME, PROCESS_POT_COOK_TIME, PROCESS_WASH_PLATE_TIME, RETURN_DIRTY_PLATE_TIME)
+# Interactions per agent, counted back from the error, a Wait is searched before
+RECENT_INTERACTIONS = 2
+# Ratio between successive Wait durations tried before an interaction
+WAIT_GROWTH = 1.5
+
+@dataclass
+class RepairResult:
+    """Outcome of repairing a plan; `plan` is the original one unless `repaired`"""
+    plan: Dict[str, List[Dict]]
+    repaired: bool
+    error: Optional[str]  # Error of the best plan reached when the repair failed
+    evaluations: int  # Simulator runs spent
+    repairs: List[str] = field(default_factory=list)
+
+    def report(self) -> dict:
+        return {
+            "repaired": self.repaired,
+            "error": self.error,
+            "evaluations": self.evaluations,
+            "repairs": self.repairs,
+        }
+
+class PlanRepairer:
+    """
+    Fixes small mistakes in a model plan without asking the model again.
+    A static pass follows every agent's position through its MoveTo actions: targets that are not
+    empty floor are snapped to the reachable cell next to the station the agent uses next (or next to
+    the target), and an Interact/Process on a station that is not adjacent gets its preceding MoveTo
+    retargeted, or a MoveTo inserted. A dynamic pass then runs the plan on headless clones and, at the
+    failing action, inserts the shortest Wait taken from the pending timings (cookware still cooking,
+    dirty plates being returned, teammates finishing their action) that gets the run past that action;
+    when none does, a Wait is searched before the agents' recent interactions, because food taken out of
+    a pan too early only shows up as a wrong dish at the serving window.
+    """
+    def __init__(self, simulator: Simulator, max_rounds: int = 10, max_evaluations: int = 300):
+        self.simulator = simulator
+        self.max_rounds = max_rounds
+        self.max_evaluations = max_evaluations
+        self.world = simulator.world
+        self.path_index = simulator.world.path_index
+        self.evaluations = 0
+
+    def repair(self, plan: Dict[str, List[Dict]]) -> RepairResult:
+        result = self.evaluate(plan)
+        if result.valid:
+            return RepairResult(plan, False, None, self.evaluations)
+        repairs = []
+        candidate = {name: self.repair_positions(name, actions, repairs) if name in self.world.agents and isinstance(actions, list) else actions
+                     for name, actions in plan.items()}
+        if repairs:
+            result = self.evaluate(candidate)
+        for _ in range(self.max_rounds):
+            if result.valid:
+                return RepairResult(candidate, True, None, self.evaluations, repairs)
+            waited = self.insert_wait(candidate, result, repairs)
+            if waited is None:
+                break
+            candidate, result = waited
+        return RepairResult(plan, False, result.error, self.evaluations, repairs)
+
+    def evaluate(self, plan: Dict[str, List[Dict]]) -> EvaluationResult:
+        self.evaluations += 1
+        return self.simulator.evaluate(plan)
+
+    def station_of(self, action) -> Optional[Station]:
+        if not isinstance(action, dict) or action.get("action") not in ("Interact", "Process"):
+            return None
+        station = self.world.get_object_by_name(action.get("target")) if isinstance(action.get("target"), str) else None
+        return station if isinstance(station, Station) else None
+
+    def snap(self, position: Tuple[int, int], target: Tuple[int, int], station: Optional[Station]) -> Optional[Tuple[int, int]]:
+        """Reachable floor cell replacing a bad MoveTo target: next to `station` if given, else closest to the target"""
+        if station is not None:
+            nearest = self.path_index.nearest_adjacent(position, (station.x, station.y))
+            if nearest is not None:
+                return nearest[0]
+        distances = self.path_index.bfs_tree(position)[0]
+        if not distances:
+            return None
+        return min(distances, key=lambda cell: (abs(cell[0] - target[0]) + abs(cell[1] - target[1]), distances[cell]))
+
+    def repair_positions(self, name: str, actions: List[Dict], repairs: List[str]) -> List[Dict]:
+        agent = self.world.agents[name]
+        position = (agent.x, agent.y)
+        move_start = position  # Where the last MoveTo started
+        repaired = []
+        for i, action in enumerate(actions):
+            if not isinstance(action, dict):
+                repaired.append(action)
+                continue
+            station = self.station_of(action)
+            if action.get("action") == "MoveTo":
+                target = action.get("target")
+                if not isinstance(target, (list, tuple)) or len(target) != 2 or not all(isinstance(v, int) for v in target):
+                    repaired.append(action)
+                    continue
+                target = tuple(target)
+                if target != position and self.path_index.distance(position, target) < 0:
+                    # Not empty floor, or cut off: go next to the station used next instead
+                    following = next((a for a in actions[i + 1:] if not (isinstance(a, dict) and a.get("action") == "Wait")), None)
+                    snapped = self.snap(position, target, self.station_of(following))
+                    if snapped is None:
+                        repaired.append(action)
+                        continue
+                    repairs.append(f"{name}: action {i} MoveTo {list(target)} -> {list(snapped)} (not reachable floor)")
+                    action, target = dict(action, target=list(snapped)), snapped
+                move_start, position = position, target
+            elif station is not None and not self.world.is_adjacent(position, (station.x, station.y)):
+                after_move = bool(repaired) and isinstance(repaired[-1], dict) and repaired[-1].get("action") == "MoveTo"
+                nearest = self.path_index.nearest_adjacent(move_start if after_move else position, (station.x, station.y))
+                if nearest is not None:
+                    cell = nearest[0]
+                    if after_move:
+                        # The agent walked to the wrong cell: walk next to the station instead
+                        repairs.append(f"{name}: action {i - 1} MoveTo {repaired[-1]['target']} -> {list(cell)} (next to {station.name})")
+                        repaired[-1] = dict(repaired[-1], target=list(cell))
+                    else:
+                        repairs.append(f"{name}: inserted MoveTo {list(cell)} before action {i} (next to {station.name})")
+                        repaired.append({"action": "MoveTo", "target": list(cell)})
+                        move_start = position
+                    position = cell
+            repaired.append(action)
+        return repaired
+
+    def failing_action(self, plan: Dict[str, List[Dict]], result: EvaluationResult) -> Optional[Tuple[str, int]]:
+        """(agent, index in its plan) of the action that raised the error, None if it cannot be told"""
+        simulator = result.simulator
+        name = simulator.acting_agent
+        if name is None or name not in plan:
+            return None
+        agent = simulator.world.agents[name]
+        # An error in complete_current_action leaves the action current, one in assign_next_action at the queue head
+        current = 1 if agent.current_action is not None and not agent.is_idle else 0
+        index = len(plan[name]) - len(agent.action_queue) - current
+        return (name, index) if 0 <= index < len(plan[name]) else None
+
+    def pending_waits(self, simulator: Simulator) -> List[int]:
+        """Time until each pending event of the failed run: cooking done, dirty plate back, teammate done"""
+        now = simulator.current_time
+        waits = set()
+        for station in simulator.world.timed_stations:
+            if isinstance(station, Stove) and isinstance(station.item, (Pan, Pot)) and station.item.is_cooking:
+                cookware = station.item
+                waits.add(cookware.required_cook_time - cookware.processed_cook_time - (now - cookware.current_time))
+            elif isinstance(station, PlateReturn):
+                waits.update(t - now for t in station.return_time)
+        for agent in simulator.world.agents.values():
+            if not agent.is_idle:
+                waits.add(agent.finish_time - now)
+        return sorted(wait for wait in waits if wait > 0)
+
+    @staticmethod
+    def progress(result: EvaluationResult) -> int:
+        """Non-Wait actions started before the run stopped"""
+        return sum(
+            sum(1 for action in agent.all_actions if action.get("action") != "Wait") - sum(1 for action in agent.action_queue if action.get("action") != "Wait")
+            for agent in result.simulator.world.agents.values()
+        )
+
+    def recent_interactions(self, plan: Dict[str, List[Dict]], result: EvaluationResult, failing: Tuple[str, int]) -> List[Tuple[str, int]]:
+        """
+        The last `RECENT_INTERACTIONS` Interact actions each agent started before the error, stove ones
+        first. A dish that fails only when it is served usually got its food out of the pan or pot before
+        the cooking was done, or its plate picked up before a teammate had put everything on it.
+        """
+        points = []
+        for name, actions in plan.items():
+            agent = result.simulator.world.agents.get(name)
+            if agent is None or not isinstance(actions, list):
+                continue
+            started = failing[1] if name == failing[0] else len(actions) - len(agent.action_queue)
+            found = 0
+            for index in range(min(started, len(actions)) - 1, -1, -1):
+                if found == RECENT_INTERACTIONS:
+                    break
+                if isinstance(actions[index], dict) and actions[index].get("action") == "Interact" and self.station_of(actions[index]) is not None:
+                    points.append((name, index))
+                    found += 1
+        return sorted(points, key=lambda point: not isinstance(self.station_of(plan[point[0]][point[1]]), Stove))
+
+    def try_wait(self, plan: Dict[str, List[Dict]], point: Tuple[str, int], wait: int, failing: Tuple[str, int], reached: int):
+        """
+        (plan, result) with a Wait inserted at `point` if the run then gets past the failing action without
+        falling behind elsewhere, else None. Getting further in total is not enough: delaying the failing
+        action alone lets the other agents run longer.
+        """
+        if self.evaluations >= self.max_evaluations:
+            return None
+        name, index = point
+        actions = plan[name]
+        candidate = dict(plan, **{name: actions[:index] + [{"action": "Wait", "duration": wait}] + actions[index:]})
+        candidate_result = self.evaluate(candidate)
+        if candidate_result.valid:
+            return candidate, candidate_result
+        # Position of the failing action in the candidate plan
+        failed_index = failing[1] + (1 if name == failing[0] and index <= failing[1] else 0)
+        new_failing = self.failing_action(candidate, candidate_result)
+        if new_failing is None or (new_failing[0] == failing[0] and new_failing[1] <= failed_index):
+            return None
+        if self.progress(candidate_result) < reached:
+            return None
+        return candidate, candidate_result
+
+    def search_wait(self, plan: Dict[str, List[Dict]], point: Tuple[str, int], failing: Tuple[str, int], reached: int, limit: int):
+        """
+        Shortest helpful Wait up to `limit` among geometrically growing durations; (wait, plan, result) or
+        None. Not a binary search: waiting too long can break a handoff just like waiting too little.
+        """
+        wait = 1
+        while wait <= limit:
+            found = self.try_wait(plan, point, wait, failing, reached)
+            if found is not None:
+                return (wait,) + found
+            wait = max(wait + 1, int(wait * WAIT_GROWTH))
+        return None
+
+    def insert_wait(self, plan: Dict[str, List[Dict]], result: EvaluationResult, repairs: List[str]):
+        """
+        (plan, result) with a Wait that gets the run past the failing action, None if no Wait does.
+        Candidates are the pending timings of the failed run before the failing action, and the shortest
+        helpful Wait before each of the agents' recent interactions; a valid plan wins, then the run that
+        gets furthest, then the shorter Wait.
+        """
+        failing = self.failing_action(plan, result)
+        if failing is None:
+            return None
+        reached = self.progress(result)
+        candidates = []
+        for wait in self.pending_waits(result.simulator):
+            found = self.try_wait(plan, failing, wait, failing, reached)
+            if found is not None:
+                candidates.append((failing, wait) + found)
+                break
+        # Long enough for anything started before the error, and for one more thing to get ready
+        limit = result.simulator.current_time + MAX_WAIT
+        for point in self.recent_interactions(plan, result, failing):
+            found = self.search_wait(plan, point, failing, reached, limit)
+            if found is not None:
+                candidates.append((point,) + found)
+        if not candidates:
+            return None
+        point, wait, candidate, candidate_result = max(
+            candidates, key=lambda c: (c[3].valid, self.progress(c[3]), -c[1])
+        )
+        repairs.append(f"{point[0]}: inserted Wait {wait} before action {point[1]} ({result.error})")
+        return candidate, candidate_result
+
+def repair_plan(simulator: Simulator, plan: Dict[str, List[Dict]], max_rounds: int = 10, max_evaluations: int = 300) -> RepairResult:
+    """Locally repaired version of a model plan; `simulator` must hold the state the plan starts from"""
+    return PlanRepairer(simulator, max_rounds, max_evaluations).repair(plan)
@@ -0,0 +1,86 @@
+# src/agent/method/prompt_blocks.py
+
+import importlib
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from src.game.const import (
+    INTERACT_TIME, PROCESS_CUT_TIME, PROCESS_PAN_COOK_TIME, PROCESS_POT_COOK_TIME, PROCESS_WASH_PLATE_TIME, RETURN_DIRTY_PLATE_TIME,
+)
+from src.utils.utils import count_tokens, load_data
+
+# Game constants every INSTRUCTION is formatted with
+PROMPT_CONSTANTS = (
+    ("INTERACT_TIME", INTERACT_TIME),
+    ("PROCESS_CUT_TIME", PROCESS_CUT_TIME),
+    ("PROCESS_POT_COOK_TIME", PROCESS_POT_COOK_TIME),
+    ("PROCESS_PAN_COOK_TIME", PROCESS_PAN_COOK_TIME),
+    ("PROCESS_WASH_PLATE_TIME", PROCESS_WASH_PLATE_TIME),
+    ("RETURN_DIRTY_PLATE_TIME", RETURN_DIRTY_PLATE_TIME),
+)
+# Maps (and task prompts) kept compiled; a batch run rarely uses more maps than this
+MAX_MAP_BLOCKS = 64
+
+@dataclass(frozen=True)
+class PromptBlock:
+    """A compiled part of a prompt and its size in tokens, counted once when the block is built"""
+    text: str
+    tokens: int
+
+# id(map_data) -> (map_data, block); the map data is kept so a recycled id cannot match
+_MAP_BLOCKS: Dict[int, Tuple[dict, PromptBlock]] = {}
+_TASK_BLOCKS: Dict[tuple, Tuple[dict, PromptBlock]] = {}
+
+def make_block(text: str) -> PromptBlock:
+    return PromptBlock(text, count_tokens(text))
+
+@lru_cache(maxsize=None)
+def system_block(instruction: str, constants: tuple = PROMPT_CONSTANTS) -> PromptBlock:
+    """An agent's INSTRUCTION formatted with the game constants"""
+    return make_block(instruction.format(**dict(constants)))
+
+@lru_cache(maxsize=None)
+def example_blocks(package: str, examples: Tuple[str, ...]) -> Tuple[Tuple[PromptBlock, PromptBlock], ...]:
+    """(input, output) blocks of the few-shot examples `package`.example.<name>, imported on first use"""
+    blocks = []
+    for ex in examples:
+        ex_mod = importlib.import_module(f"{package}.example.{ex}")
+        blocks.append((make_block(ex_mod.input), make_block(ex_mod.output)))
+    return tuple(blocks)
+
+@lru_cache(maxsize=MAX_MAP_BLOCKS)
+def _load_map(path: str, mtime_ns: int) -> dict:
+    return load_data(path)
+
+def load_map(path: str) -> dict:
+    """
+    Map data of a map file, loaded once per process (and again only if the file changes), so the
+    compiled map and task blocks are reused by every test on that map. The data must not be modified.
+    """
+    return _load_map(os.path.abspath(path), os.stat(path).st_mtime_ns)
+
+def _remember(cache: dict, key, value):
+    if len(cache) >= MAX_MAP_BLOCKS:
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+def map_block(map_data: dict) -> PromptBlock:
+    """The map serialized as it appears in the task prompt, compiled once per map data object"""
+    entry = _MAP_BLOCKS.get(id(map_data))
+    if entry is None or entry[0] is not map_data:
+        entry = (map_data, make_block(json.dumps(map_data)))
+        _remember(_MAP_BLOCKS, id(map_data), entry)
+    return entry[1]
+
+def task_block(map_data: dict, recipes: list, orders: list) -> PromptBlock:
+    """The task prompt with the map, recipe and order blocks, compiled once per (map, recipes, orders)"""
+    key = (id(map_data), tuple(recipes), tuple(orders))
+    entry = _TASK_BLOCKS.get(key)
+    if entry is None or entry[0] is not map_data:
+        text = f"Map JSON:\n{map_block(map_data).text}\n\nRecipes:\n{recipes}\n\nOrders:\n{str(orders)}"
+        entry = (map_data, make_block(text))
+        _remember(_TASK_BLOCKS, key, entry)
+    return entry[1]
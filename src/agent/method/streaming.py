@@ -0,0 +1,125 @@
+# src/agent/method/streaming.py
+
+import json
+from typing import List, Optional, Tuple
+
+from src.game.object import Station
+from src.game.world_state import World
+from src.utils.utils import loads_tolerant
+
+ACTION_TYPES = {"MoveTo", "Interact", "Process", "Wait", "Finish"}
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+
+class PlanStreamParser:
+    """
+    Incremental scanner over a streamed model response. Text chunks are fed as they arrive and every
+    agent action list is returned as soon as its closing bracket has been seen. Action lists are the
+    arrays directly inside a "plan" object, or directly inside the top-level object when the model left
+    out the wrapper. Text outside JSON objects, including <think> sections, is skipped.
+    """
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []  # Open containers: [kind, key, start offset]
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = None
+        self.key = None  # Key of the value being scanned in the innermost object
+
+    def feed(self, chunk: str) -> List[Tuple[str, object, Optional[str], bool]]:
+        """
+        Scan the new text. Returns (agent, actions, error, in_plan) for each action list completed by the
+        chunk; `error` is set when the list is not valid JSON, `in_plan` when it sits inside a "plan" object.
+        """
+        self.text += chunk
+        text = self.text
+        completed = []
+        while self.pos < len(text):
+            ch = text[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start + 1:self.pos]
+                self.pos += 1
+                continue
+            if not self.stack:
+                if ch == "<" and THINK_OPEN.startswith(text[self.pos:self.pos + len(THINK_OPEN)]):
+                    if len(text) - self.pos < len(THINK_OPEN):
+                        break  # Could be the start of a <think> tag, wait for more text
+                    if text.startswith(THINK_OPEN, self.pos):
+                        end = text.find(THINK_CLOSE, self.pos)
+                        if end < 0:
+                            break
+                        self.pos = end + len(THINK_CLOSE)
+                        continue
+                if ch == "{":
+                    self.stack.append(["object", None, self.pos])
+                    self.key = None
+                self.pos += 1
+                continue
+
+            if ch == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif ch == ":":
+                self.key = self.last_string
+            elif ch == ",":
+                self.key = None
+            elif ch in "{[":
+                key = self.key if self.stack[-1][0] == "object" else None
+                self.stack.append(["object" if ch == "{" else "array", key, self.pos])
+                self.key = None
+            elif ch in "}]":
+                kind, key, start = self.stack.pop()
+                if kind == "array" and key is not None and self.stack and self.stack[-1][0] == "object":
+                    in_plan = len(self.stack) == 2 and self.stack[-1][1] == "plan"
+                    if in_plan or len(self.stack) == 1:
+                        actions, error = None, None
+                        try:
+                            actions = loads_tolerant(text[start:self.pos + 1])
+                        except json.JSONDecodeError as e:
+                            error = f"malformed action list: {e}"
+                        completed.append((key, actions, error, in_plan))
+                self.key = None
+            self.pos += 1
+        return completed
+
+def is_coordinate(value) -> bool:
+    """[x, y] with integral numbers; the simulator accepts floats like 3.0 as well"""
+    return (isinstance(value, (list, tuple)) and len(value) == 2
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) and float(v).is_integer() for v in value))
+
+def validate_actions(world: World, agent_name: str, actions, check_positions: bool = True) -> Optional[str]:
+    """
+    Static checks of one agent's action list that do not depend on the simulation state. Returns the
+    first error the simulator would certainly raise, or None. With `check_positions` off, MoveTo targets
+    that are not free floor tiles pass, for plans that plan_repair will snap to a neighbouring tile.
+    """
+    if agent_name not in world.agents:
+        return f"Agent {agent_name} does not exist in the world"
+    if not isinstance(actions, list):
+        return f"Action plan for Agent {agent_name} is not a list"
+    for i, action in enumerate(actions):
+        if not isinstance(action, dict) or action.get("action") not in ACTION_TYPES:
+            return f"Action {i} of {agent_name} is not a valid action: {action}"
+        action_type = action["action"]
+        if action_type == "MoveTo":
+            target = action.get("target")
+            if not is_coordinate(target):
+                return f"MoveTo target of {agent_name} is not a coordinate: {target}"
+            if check_positions and not world.path_index.is_walkable(tuple(target)):
+                return f"MoveTo target {target} of {agent_name} is not an empty floor tile"
+        elif action_type in ("Interact", "Process"):
+            target = action.get("target")
+            if not isinstance(target, str) or not isinstance(world.get_object_by_name(target), Station):
+                return f"{action_type} target of {agent_name} is not a station: {target}"
+        elif action_type == "Wait":
+            duration = action.get("duration", 1)
+            if not isinstance(duration, (int, float)) or duration < 0:
+                return f"Wait duration of {agent_name} is not a non-negative number: {duration}"
+    return None
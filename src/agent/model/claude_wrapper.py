@@ -6,6 +6,8 @@ import anthropic
 from src.agent.model.model import Model, PredictConfig
 from src.utils.logger_config import logger, COLOR_CODES, RESET
 
+EPHEMERAL = {"type": "ephemeral"}
+
 class ClaudeWrapper(Model):
     def __init__(self, name):
         super().__init__(name=name)
@@ -13,13 +15,85 @@ class ClaudeWrapper(Model):
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable is required")
         self.is_chat_model = True
+        # Client override, e.g. a fake provider for offline runs
+        self.client = None
 
-    def predict(self, config: PredictConfig) -> str:
-        prompt = config.prompt
+    def build_messages(self, config: PredictConfig) -> tuple[str | None, list]:
+        """
+        System prompt and content-block messages of a request; config.messages itself is left untouched.
+        Cache breakpoints (at most 4 per request, the system prompt takes one) go on the last message of
+        the stable prefix and on the latest user message, so the next turn reuses both the prefix and
+        the conversation so far.
+        """
         system_prompt = config.system_prompt
+        if config.messages is None:
+            return system_prompt, [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": config.prompt, "cache_control": EPHEMERAL}
+                    ]
+                }
+            ]
         messages = config.messages
-        temperature = config.temperature
-        max_tokens = config.max_tokens
+        cache_prefix = config.cache_prefix
+        if messages and messages[0]["role"] == "system":
+            system_prompt = messages[0]["content"]
+            messages = messages[1:]
+            cache_prefix -= 1
+        blocks = []
+        for msg in messages:
+            content = msg["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            else:
+                content = [dict(block) for block in content]
+            blocks.append({"role": msg["role"], "content": content})
+
+        breakpoints = {cache_prefix - 1} if cache_prefix > 0 else set()
+        user_turns = [i for i, msg in enumerate(blocks) if msg["role"] == "user"]
+        if user_turns:
+            breakpoints.add(user_turns[-1])
+        for i in breakpoints:
+            if i < len(blocks) and blocks[i]["content"]:
+                blocks[i]["content"][-1]["cache_control"] = EPHEMERAL
+        return system_prompt, blocks
+
+    def stream(self, config: PredictConfig):
+        client = self.client or anthropic.Anthropic(api_key=self.api_key)
+        system_prompt, messages = self.build_messages(config)
+        kwargs = {
+            "model": self.name,
+            "messages": messages
+        }
+        if system_prompt:
+            kwargs["system"] = [
+                {
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": EPHEMERAL  # Use Prompt Caching
+                }
+            ]
+        if config.temperature is not None:
+            kwargs["temperature"] = config.temperature
+        if config.max_tokens is not None:
+            kwargs["max_tokens"] = config.max_tokens
+        else:
+            kwargs["max_tokens"] = 21332 # default max tokens
+
+        with client.messages.stream(**kwargs) as stream:
+            for text_chunk in stream.text_stream:
+                yield text_chunk
+            final_message = stream.get_final_message()
+            if hasattr(final_message, 'usage'):
+                usage = final_message.usage
+                logger.info(f"{COLOR_CODES['PURPLE']}Usage: {usage}{RESET}")
+                # input_tokens only counts the tokens after the last cache breakpoint
+                cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+                cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+                self.record_usage(usage.input_tokens + cache_read + cache_write, cache_read, cache_write)
+
+    def predict(self, config: PredictConfig) -> str:
         retries = config.retries or 3
         delay = config.delay or 1
         attempt = 0
@@ -27,67 +101,7 @@ class ClaudeWrapper(Model):
 
         while attempt < retries:
             try:
-                client = anthropic.Anthropic(api_key=self.api_key)
-                cache_block_count = 0
-
-                kwargs = {
-                    "model": self.name,
-                    "messages": messages
-                }
-                if system_prompt:
-                    kwargs["system"] = [
-                        {
-                            "type": "text",
-                            "text": system_prompt,
-                            "cache_control": {"type": "ephemeral"}  # Use Prompt Caching
-                        }
-                    ]
-                    cache_block_count += 1
-                if temperature is not None:
-                    kwargs["temperature"] = temperature
-                if max_tokens is not None:
-                    kwargs["max_tokens"] = max_tokens
-                else:
-                    kwargs["max_tokens"] = 21332 # default max tokens
-
-                if messages is None:
-                    messages = [
-                        {
-                            "role": "user", 
-                            "content": [
-                                {"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}
-                            ]
-                        }
-                    ]
-                    cache_block_count += 1
-                else:
-                    if messages[0]["role"] == "system":
-                        system_prompt = messages[0]["content"]
-                        messages = messages[1:]
-                    for msg in messages:
-                        content = msg["content"]
-                        if msg["role"] == "user" and isinstance(content, str):
-                            if cache_block_count < 4:
-                                msg["content"] = [{"type": "text", "text": content, "cache_control": {"type": "ephemeral"}}]
-                                cache_block_count += 1
-                            else:
-                                msg["content"] = [{"type": "text", "text": content}]
-                        elif msg["role"] == "assistant" and isinstance(content, str):
-                            msg["content"] = [{"type": "text", "text": content}]
-                kwargs["messages"] = messages
-
-                with client.messages.stream(**kwargs) as stream:
-                    collected_text = ""
-                    for text_chunk in stream.text_stream:
-                        # print(text_chunk, end="", flush=True)
-                        collected_text += text_chunk
-                    final_message = stream.get_final_message()
-                    if hasattr(final_message, 'usage'):
-                        usage = final_message.usage
-                        print(f"Usage: {usage}")
-
-                response = collected_text
-
+                response = "".join(self.stream(config))
                 break
             except Exception as e:
                 logger.error(f"Error: {COLOR_CODES['RED']}{e}{RESET}")
@@ -1,11 +1,30 @@
 import os
 import sys
+import threading
 import time
+from collections import OrderedDict
 from google import genai
 from google.genai import types
-from src.agent.model.model import Model, PredictConfig
+from src.agent.model.model import Model, PredictConfig, prefix_key
 from src.utils.logger_config import logger, COLOR_CODES, RESET
 
+# Context caches this close to their expiry (seconds) are replaced rather than handed to a new request
+CACHE_EXPIRY_MARGIN = 60
+
+def flatten_messages(messages: list) -> str:
+    """Chat messages as one "Role: content" text, the form the requests are sent in"""
+    content_parts = []
+    for msg in messages:
+        role = msg.get("role", "user")
+        msg_content = msg.get("content", "")
+        if role == "system":
+            content_parts.append(f"System: {msg_content}")
+        elif role == "user":
+            content_parts.append(f"User: {msg_content}")
+        elif role == "assistant":
+            content_parts.append(f"Assistant: {msg_content}")
+    return "\n".join(content_parts)
+
 class GeminiWrapper(Model):
     def __init__(self, name):
         super().__init__(name=name)
@@ -15,17 +34,96 @@ class GeminiWrapper(Model):
         
         self.is_chat_model = True
         self.client = genai.Client(api_key=self.api_key)
-        self.cache = None
-    
-    def init_cache(self, system_prompt: str):
-        self.cache = self.client.caches.create(
+        # Context caches by prefix_key, least recently used first. Sampling threads and per-agent deciders
+        # send different prefixes concurrently, so a cache is only deleted once no request holds it
+        self.caches = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.max_caches = 8
+        self.cache_ttl = 3600
+
+    def init_cache(self, system_prompt: str, contents: str | None = None):
+        cache = self.client.caches.create(
             model=self.name,
             config=types.CreateCachedContentConfig(
                 system_instruction=system_prompt,
+                contents=contents,
+                ttl=f"{self.cache_ttl}s",
             )
         )
-        print(f'{self.cache=}')
-    
+        logger.info(f"{COLOR_CODES['PURPLE']}Created context cache {cache.name}{RESET}")
+        return cache
+
+    def cached_prefix(self, system_prompt: str | None, prefix: str) -> dict:
+        """
+        Explicit context cache holding the system prompt and the stable prefix, created once per prefix.
+        Returns the cache entry, held until release_prefix(entry); entry["cache"] is None when the prefix
+        cannot be cached (e.g. below the model's minimum cache size), Gemini's implicit caching still
+        applies to those requests.
+        """
+        key = prefix_key([system_prompt, prefix])
+        now = time.monotonic()
+        retired = []
+        with self.cache_lock:
+            entry = self.caches.get(key)
+            if entry is not None and entry["expires"] - now < CACHE_EXPIRY_MARGIN:
+                # Requests still holding it finish before it expires on the server
+                del self.caches[key]
+                entry["retired"] = True
+                if entry["users"] == 0:
+                    retired.append(entry)
+                entry = None
+            create = entry is None
+            if create:
+                entry = {"cache": None, "ready": threading.Event(), "users": 0, "retired": False,
+                         "expires": now + self.cache_ttl}
+                self.caches[key] = entry
+            entry["users"] += 1
+            self.caches.move_to_end(key)
+        self._delete_caches(retired)
+
+        if create:
+            try:
+                entry["cache"] = self.init_cache(system_prompt, prefix)
+            except Exception as e:
+                logger.warning(f"Prefix not cached, sending it in full: {e}")
+            finally:
+                entry["ready"].set()
+            self._evict_caches()
+        else:
+            entry["ready"].wait()
+        return entry
+
+    def release_prefix(self, entry: dict):
+        """Called once the request that got `entry` from cached_prefix is done"""
+        with self.cache_lock:
+            entry["users"] -= 1
+            retired = [entry] if entry["retired"] and entry["users"] == 0 else []
+        self._delete_caches(retired)
+        self._evict_caches()
+
+    def _evict_caches(self):
+        """Drop least recently used caches beyond max_caches, skipping those a request still holds"""
+        victims = []
+        with self.cache_lock:
+            excess = len(self.caches) - self.max_caches
+            for key, entry in list(self.caches.items()):
+                if excess <= 0:
+                    break
+                if entry["users"] == 0:
+                    del self.caches[key]
+                    victims.append(entry)
+                    excess -= 1
+        self._delete_caches(victims)
+
+    def _delete_caches(self, entries: list):
+        for entry in entries:
+            if entry["cache"] is None:
+                continue
+            try:
+                self.client.caches.delete(name=entry["cache"].name)
+            except Exception as e:
+                logger.warning(f"Failed to delete context cache {entry['cache'].name}: {e}")
+
     def predict(self, config: PredictConfig) -> str:
 
         prompt = config.prompt
@@ -39,27 +137,26 @@ class GeminiWrapper(Model):
         attempt = 0
         response = ""
 
-        # print(messages)
+        cache = None
+        cache_entry = None
         if messages is None:
             if system_prompt:
                 content = f"User: {prompt}"
             else:
                 content = prompt
         else:
-            content_parts = []
+            cache_prefix = config.cache_prefix
             if messages[0].get("role") == "system":
                 system_prompt = messages[0].get("content")
                 messages = messages[1:]
-            for msg in messages:
-                role = msg.get("role", "user")
-                msg_content = msg.get("content", "")
-                if role == "system":
-                    content_parts.append(f"System: {msg_content}")
-                elif role == "user":
-                    content_parts.append(f"User: {msg_content}")
-                elif role == "assistant":
-                    content_parts.append(f"Assistant: {msg_content}")
-            content = "\n".join(content_parts)
+                cache_prefix -= 1
+            if 0 < cache_prefix < len(messages):
+                cache_entry = self.cached_prefix(system_prompt, flatten_messages(messages[:cache_prefix]))
+                cache = cache_entry["cache"]
+            if cache is not None:
+                content = flatten_messages(messages[cache_prefix:])
+            else:
+                content = flatten_messages(messages)
 
         config_kwargs = {}
         if temperature is not None:
@@ -69,40 +166,43 @@ class GeminiWrapper(Model):
         if max_tokens is not None:
             config_kwargs["max_output_tokens"] = max_tokens
 
-        # if self.cache is None:
-        #     if system_prompt is None:
-        #         system_prompt = "You are a helpful assistant."
-        #     self.init_cache(system_prompt)
-        # print(system_prompt)
+        # A cached context already carries the system instruction
+        if cache is not None:
+            config_kwargs["cached_content"] = cache.name
+        else:
+            config_kwargs["system_instruction"] = system_prompt
 
-        while attempt < retries:
-            try:                
+        try:
+            while attempt < retries:
+                try:                
                 
-                response_obj = self.client.models.generate_content(
-                    model=self.name,
-                    contents=content,
-                    # config=generation_config
-                    config=types.GenerateContentConfig(
-                        # cached_content=self.cache.name,
-                        system_instruction=system_prompt,
-                        **config_kwargs
+                    response_obj = self.client.models.generate_content(
+                        model=self.name,
+                        contents=content,
+                        # config=generation_config
+                        config=types.GenerateContentConfig(**config_kwargs)
                     )
-                )
-                # print(f'{response_obj.usage_metadata=}')
-                logger.info(f"{COLOR_CODES['PURPLE']}Usage: {response_obj.usage_metadata}{RESET}")
+                    usage = response_obj.usage_metadata
+                    logger.info(f"{COLOR_CODES['PURPLE']}Usage: {usage}{RESET}")
+                    if usage is not None:
+                        # Explicit and implicit cache hits are both reported here
+                        self.record_usage(usage.prompt_token_count or 0, usage.cached_content_token_count or 0)
 
-                response = response_obj.text
-                break
+                    response = response_obj.text
+                    break
                 
-            except Exception as e:
-                logger.error(f"Error: {COLOR_CODES['RED']}{e}{RESET}")
-                attempt += 1
-                if attempt < retries:
-                    logger.info(f"Retrying in {delay} seconds.")
-                    time.sleep(delay)
-                else:
-                    logger.error(f"All {retries} attempts failed.")
-                    raise e
+                except Exception as e:
+                    logger.error(f"Error: {COLOR_CODES['RED']}{e}{RESET}")
+                    attempt += 1
+                    if attempt < retries:
+                        logger.info(f"Retrying in {delay} seconds.")
+                        time.sleep(delay)
+                    else:
+                        logger.error(f"All {retries} attempts failed.")
+                        raise e
+        finally:
+            if cache_entry is not None:
+                self.release_prefix(cache_entry)
         if not response:
             raise ValueError("No response received from Gemini API")
         return response
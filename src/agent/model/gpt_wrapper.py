@@ -1,35 +1,68 @@
-from itertools import tee
-from pyexpat import model
 import os, time
 from openai import OpenAI, OpenAIError
-from src.agent.model.model import Model, PredictConfig
+from src.agent.model.model import Model, PredictConfig, prefix_key
 from src.utils.logger_config import logger, COLOR_CODES, RESET
 
+# Output token limits of DeepSeek models: reasoners (deepseek-reasoner, R1) allow long outputs, chat models far less
+DEEPSEEK_REASONER_MAX_TOKENS = 64000
+DEEPSEEK_CHAT_MAX_TOKENS = 8192
+
 class GPTWrapper(Model):
     def __init__(self, name):
         super().__init__(name=name)
+        # Client override, e.g. a fake provider for offline runs; None creates an OpenAI client per attempt
+        self.client = None
         if "deepseek" in name.lower():
+            self.provider = "deepseek"
             self.openai_api_key = os.environ.get("DEEPSEEK_API_KEY")
             self.openai_base_url = os.environ.get("DEEPSEEK_BASE_URL")
             self.is_chat_model = True
         elif "claude" in name.lower():
+            self.provider = "claude"
             self.openai_api_key = os.environ.get("CLAUDE_API_KEY")
             self.openai_base_url = os.environ.get("CLAUDE_BASE_URL")
             self.is_chat_model = True
         elif "gemini" in name.lower():
+            self.provider = "gemini"
             self.openai_api_key = os.environ.get("GEMINI_API_KEY")
             self.openai_base_url = os.environ.get("GEMINI_BASE_URL")
             self.is_chat_model = True
         elif "qwen" in name.lower():
+            self.provider = "qwen"
             self.openai_api_key = os.environ.get("DASHSCOPE_API_KEY")
             self.openai_base_url = os.environ.get("DASHSCOPE_BASE_URL")
             self.is_chat_model = True
         else:
+            self.provider = "openai"
             self.openai_api_key = os.environ.get("OPENAI_API_KEY")
             self.openai_base_url = os.environ.get("OPENAI_BASE_URL")
             self.is_chat_model = True
-        
-    def chat_create(self, client, config: PredictConfig) -> str:
+
+    def mark_cache_prefix(self, messages: list, cache_prefix: int, kwargs: dict):
+        """
+        Map the stable prefix to the provider's caching. OpenAI, DeepSeek and Gemini cache prefixes
+        automatically, OpenAI additionally routes requests with the same prompt_cache_key together;
+        DashScope only caches explicitly marked blocks.
+        """
+        if cache_prefix <= 0:
+            return
+        prefix = messages[:cache_prefix]
+        if self.provider == "openai":
+            kwargs["prompt_cache_key"] = prefix_key(prefix)[:32]
+        elif self.provider == "qwen" and isinstance(prefix[-1].get("content"), str):
+            last = dict(prefix[-1], content=[{"type": "text", "text": prefix[-1]["content"], "cache_control": {"type": "ephemeral"}}])
+            kwargs["messages"] = messages[:cache_prefix - 1] + [last] + messages[cache_prefix:]
+
+    def record_response_usage(self, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        # DeepSeek reports its disk cache hits separately
+        cached = max(cached, getattr(usage, "prompt_cache_hit_tokens", None) or 0)
+        self.record_usage(usage.prompt_tokens, cached)
+
+    def chat_kwargs(self, config: PredictConfig) -> dict:
         prompt = config.prompt
         stop = config.stop
         system_prompt = config.system_prompt
@@ -46,36 +79,42 @@ class GPTWrapper(Model):
             "stop": stop
         }
         if config.top_p is not None:
-            kwargs["top_p"] = config.top_p,
+            kwargs["top_p"] = config.top_p
         if config.max_tokens is not None:
-            kwargs["max_completion_tokens"] = config.max_tokens,
+            kwargs["max_completion_tokens"] = config.max_tokens
         if config.response_format is not None:
             kwargs["response_format"] = config.response_format
-        response = client.chat.completions.create(**kwargs)
+        self.mark_cache_prefix(messages, config.cache_prefix, kwargs)
+        return kwargs
+
+    def chat_create(self, client, config: PredictConfig) -> str:
+        response = client.chat.completions.create(**self.chat_kwargs(config))
         logger.info(f"{COLOR_CODES['PURPLE']}Usage: {response.usage}{RESET}")
+        self.record_response_usage(response.usage)
         return response.choices[0].message.content
     
     def create(self, client, config: PredictConfig) -> str:
         raise NotImplementedError("Not implemented.")
-    
-    def predict(self, config: PredictConfig) -> str:
-        retries = config.retries
-        delay = config.delay
-        attempt = 0
 
+    def adjust_config(self, config: PredictConfig):
         if self.name == "gpt-5":
             config.temperature = 1
-        if "deepseek" in self.name.lower():
-            config.max_tokens = 64000
-        while attempt < retries:
+        name = self.name.lower()
+        if "deepseek" in name:
+            if "reasoner" in name or "r1" in name:
+                config.max_tokens = min(config.max_tokens or DEEPSEEK_REASONER_MAX_TOKENS, DEEPSEEK_REASONER_MAX_TOKENS)
+            elif config.max_tokens is not None:
+                config.max_tokens = min(config.max_tokens, DEEPSEEK_CHAT_MAX_TOKENS)
+
+    def with_retries(self, config: PredictConfig, request):
+        """Call request(client), retrying API errors config.retries times"""
+        retries = config.retries
+        delay = config.delay
+        attempt = 0
+        while True:
             try:
-                client = OpenAI(base_url=self.openai_base_url, api_key=self.openai_api_key)
-                if self.is_chat_model:
-                    response = self.chat_create(client, config)
-                    break
-                else :
-                    response = self.create(client, config)
-                    break
+                client = self.client or OpenAI(base_url=self.openai_base_url, api_key=self.openai_api_key)
+                return request(client)
             except OpenAIError as e:
                 logger.error(f"Error: {COLOR_CODES['RED']}{e}{RESET}")
                 attempt += 1
@@ -88,7 +127,30 @@ class GPTWrapper(Model):
             except Exception as e:
                 logger.error(f"Unexpected error: {COLOR_CODES['RED']}{e}{RESET}")
                 raise e
-        return response
+
+    def predict(self, config: PredictConfig) -> str:
+        self.adjust_config(config)
+        if self.is_chat_model:
+            return self.with_retries(config, lambda client: self.chat_create(client, config))
+        return self.with_retries(config, lambda client: self.create(client, config))
+
+    def stream(self, config: PredictConfig):
+        self.adjust_config(config)
+        kwargs = self.chat_kwargs(config)
+        kwargs["stream"] = True
+        kwargs["stream_options"] = {"include_usage": True}
+        # Only opening the stream is retried, a broken stream surfaces to the caller
+        response = self.with_retries(config, lambda client: client.chat.completions.create(**kwargs))
+        try:
+            for chunk in response:
+                if getattr(chunk, "usage", None) is not None:
+                    logger.info(f"{COLOR_CODES['PURPLE']}Usage: {chunk.usage}{RESET}")
+                    self.record_response_usage(chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            if hasattr(response, "close"):
+                response.close()
     
 def main():
     
@@ -1,11 +1,15 @@
 from transformers import pipeline
-from src.agent.model.model import Model, PredictConfig
+from src.agent.model.model import Model, PredictConfig, LocalPrefixCache
+from src.utils.utils import count_tokens
 from src.utils.logger_config import logger, COLOR_CODES, RESET
 
 class LLaMaWrapper(Model):
     def __init__(self, name):
         super().__init__(name=name)
         self.pipe = pipeline("text-generation", model=name)
+        # The pipeline reports no usage, prefix reuse is estimated locally
+        self.cache_source = "estimate"
+        self.prefix_cache = LocalPrefixCache()
 
     def predict(self, config: PredictConfig) -> str:
         retries = config.retries
@@ -37,13 +41,16 @@ class LLaMaWrapper(Model):
                     "stop": stop
                 }
                 if config.top_p is not None:
-                    kwargs["top_p"] = config.top_p,
+                    kwargs["top_p"] = config.top_p
                 if config.max_tokens is not None:
-                    kwargs["max_new_tokens"] = config.max_tokens,
+                    kwargs["max_new_tokens"] = config.max_tokens
                 else:
                     kwargs["max_new_tokens"] = 12800  # default max tokens for LLaMa
                     
                 response = self.pipe(**kwargs)
+                prefix_tokens, cached_tokens = self.prefix_cache.lookup(messages[:config.cache_prefix])
+                rest_tokens = sum(count_tokens(str(msg.get("content", ""))) for msg in messages[config.cache_prefix:])
+                self.record_usage(prefix_tokens + rest_tokens, cached_tokens)
                 return response[0]['generated_text'][-1]['content']
                 
                 # logger.info(f"{COLOR_CODES['PURPLE']}Usage: {response.usage}{RESET}")
@@ -2,8 +2,12 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import os
 import datetime
-from typing import Any
+import hashlib
+import json
+import threading
+from typing import Any, Iterator
 from src.utils.logger_config import logger
+from src.utils.utils import count_tokens
 
 @dataclass
 class PredictConfig:
@@ -17,10 +21,65 @@ class PredictConfig:
     temperature: float = 0.2
     top_p: float | None = None
     response_format: dict | None = None
+    # Number of leading messages that stay identical across requests (system prompt, examples, task
+    # with the map JSON); wrappers map it to the provider's prompt caching
+    cache_prefix: int = 0
+
+def prefix_key(messages: list) -> str:
+    """Content hash of a message prefix, identifies a cache entry across requests"""
+    return hashlib.sha256(json.dumps(messages, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class LocalPrefixCache:
+    """
+    Stand-in for providers without prompt caching reports: remembers the prefixes already sent and
+    counts their tokens as cached when they come back, i.e. what a KV prefix cache would reuse.
+    """
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def lookup(self, prefix: list) -> tuple[int, int]:
+        """(prompt tokens of the prefix, tokens served from cache) for this request"""
+        key = prefix_key(prefix)
+        tokens = self.entries.get(key)
+        if tokens is not None:
+            self.entries[key] = self.entries.pop(key)  # most recently used last
+            return tokens, tokens
+        tokens = sum(count_tokens(str(message.get("content", ""))) for message in prefix)
+        self.entries[key] = tokens
+        if len(self.entries) > self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+        return tokens, 0
 
 class Model(ABC):
     def __init__(self, name: str):
         self.name = name
-        
+        # "provider" when the counts come from the API usage fields, "estimate" for LocalPrefixCache
+        self.cache_source = "provider"
+        self.cache_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+        self.usage_lock = threading.Lock()  # predict() may run on several threads (sampling agents)
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int, cache_write_tokens: int = 0):
+        """Accumulate the prompt caching counters of one response"""
+        with self.usage_lock:
+            self.cache_usage["requests"] += 1
+            self.cache_usage["prompt_tokens"] += prompt_tokens or 0
+            self.cache_usage["cached_tokens"] += cached_tokens or 0
+            self.cache_usage["cache_write_tokens"] += cache_write_tokens or 0
+        if prompt_tokens:
+            logger.info(f"Prompt cache: {cached_tokens or 0}/{prompt_tokens} prompt tokens cached")
+
+    def cache_report(self) -> dict:
+        prompt_tokens = self.cache_usage["prompt_tokens"]
+        return dict(
+            self.cache_usage,
+            source=self.cache_source,
+            hit_rate=self.cache_usage["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+        )
+
     @abstractmethod
-    def predict(self, config: PredictConfig) -> str: ...
\ No newline at end of file
+    def predict(self, config: PredictConfig) -> str: ...
+
+    def stream(self, config: PredictConfig) -> Iterator[str]:
+        """Response text in chunks as it is generated; wrappers without streaming yield it in one piece"""
+        yield self.predict(config)
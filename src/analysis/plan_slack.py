@@ -0,0 +1,100 @@
+# Measure the slack of stored plans: re-time every plan in results/ and compare the makespans.
+# Re-timing stops at a local optimum of PlanRetimer's moves, so the slack reported is a lower bound.
+
+import argparse
+import json
+import os
+import re
+
+from src.agent.method.plan_optimizer import retime_plan
+from src.game.simulator import Simulator
+from src.game.world_state import World
+from src.utils.logger_config import suppress_logging
+from src.utils.utils import load_data
+
+# results/{method}/{model}/{recipe}/seed_{seed}/agent_num_{agent_num}/orders_num_{orders_num}.json
+RESULT_PATTERN = re.compile(
+    r"^(?P<method>[^/]+)/(?P<model>.+)/(?P<recipe>[^/]+)/seed_(?P<seed>\d+)/agent_num_(?P<agent_num>\d+)/orders_num_(?P<orders_num>\d+)\.json$"
+)
+
+def find_results(results_root: str, methods: list | None = None, models: list | None = None) -> list:
+    found = []
+    for root, _, files in os.walk(results_root):
+        for file in files:
+            path = os.path.join(root, file)
+            match = RESULT_PATTERN.match(os.path.relpath(path, results_root).replace(os.sep, "/"))
+            if not match:
+                continue
+            info = match.groupdict()
+            if (methods and info["method"] not in methods) or (models and info["model"] not in models):
+                continue
+            found.append(dict(info, path=path))
+    return sorted(found, key=lambda info: info["path"])
+
+def build_simulator(info: dict, orders_data: dict, object_data: list, maps_root: str) -> Simulator:
+    orders = orders_data[f"{info['recipe']}/seed_{info['seed']}/orders_num_{info['orders_num']}"]
+    map_data = load_data(f"{maps_root}/{info['recipe']}/seed_{info['seed']}/agent_num_{info['agent_num']}.json")
+    recipe_data = []
+    for order in dict.fromkeys(orders):
+        order_cate, order_name = order.split('/')
+        recipe_data += [recipe for recipe in load_data(f"config/recipe/{order_cate}.json") if recipe["name"] == order_name]
+    return Simulator(World(map_data, object_data, recipe_data, orders=[order.split('/')[1] for order in orders]), record_history=False)
+
+def measure_slack(results: list, orders_data: dict, maps_root: str, max_passes: int = 5) -> list:
+    object_data = load_data("config/item/station.json")
+    rows = []
+    for info in results:
+        data = load_data(info["path"])
+        if not data.get("done") or not data.get("plan"):
+            continue
+        with suppress_logging():
+            simulator = build_simulator(info, orders_data, object_data, maps_root)
+            try:
+                result = retime_plan(simulator, data["plan"], max_passes)
+            except ValueError as e:
+                print(f"Skipping {info['path']}: {e}")
+                continue
+        rows.append(dict(info, **result.report()))
+    return rows
+
+def summarize(rows: list) -> dict:
+    """Mean makespan before/after re-timing and mean slack per method and model"""
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["method"], row["model"]), []).append(row)
+    summary = {}
+    for (method, model), group in sorted(groups.items()):
+        count = len(group)
+        summary[f"{method}/{model}"] = {
+            "plans": count,
+            "avg_time": sum(row["original_time"] for row in group) / count,
+            "avg_retimed_time": sum(row["time"] for row in group) / count,
+            "avg_slack": sum(row["slack"] for row in group) / count,
+            "avg_slack_ratio": sum(row["slack_ratio"] for row in group) / count,
+            "plans_with_slack": sum(1 for row in group if row["slack"] > 0),
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the slack that stored plans leave on the table (a lower bound)")
+    parser.add_argument("--results_root", type=str, default="results")
+    parser.add_argument("--maps_root", type=str, default="data/cook/maps")
+    parser.add_argument("--orders_path", type=str, default="data/cook/orders/all_orders.json")
+    parser.add_argument("--methods", nargs="*", help="Only these methods (default: all)")
+    parser.add_argument("--models", nargs="*", help="Only these models (default: all)")
+    parser.add_argument("--max_passes", type=int, default=5)
+    parser.add_argument("--output", type=str, help="Write per-plan details and the summary to this JSON file")
+    args = parser.parse_args()
+
+    orders_data = load_data(args.orders_path)
+    rows = measure_slack(find_results(args.results_root, args.methods, args.models), orders_data, args.maps_root, args.max_passes)
+    summary = summarize(rows)
+    for name, stats in summary.items():
+        print(f"{name}: plans: {stats['plans']}, time: {stats['avg_time']:.2f} -> {stats['avg_retimed_time']:.2f}, "
+              f"slack: {stats['avg_slack']:.2f} ({stats['avg_slack_ratio']:.2%}), plans with slack: {stats['plans_with_slack']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "plans": rows}, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# src/data/calibrate.py
+
+import argparse
+import json
+import os
+import random
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.agent.method.Search.planner import POT_INGREDIENTS, PlanningFailed, SearchPlanner
+from src.data.pipeline import atomic_write
+from src.game.const import *
+from src.game.object import ChoppingBoard, Dispenser, Pan, PlateReturn, Pot, ServingWindow, Sink, Stove, Table
+from src.game.simulator import Simulator
+from src.game.world_state import World
+from src.utils.random_map import generate_random_map, load_json
+
+# Estimated instance profile, one column per feature in the batched score matrix
+FEATURES = ["critical_path", "total_work", "parallelism", "travel_share", "contention", "lower_bound"]
+UNREACHABLE = 10 ** 6
+# Target measured with the greedy scheduler rather than estimated by the cost model
+MAKESPAN = "makespan"
+# Verification rounds used to fit the scale between the cost model and the greedy makespan
+FIT_ROUNDS = 3
+
+@dataclass
+class Instance:
+    map_data: Dict
+    orders: List[str]
+    features: Dict[str, float]
+    score: float
+    makespan: Optional[int] = None
+
+def ingredient_kind(ingredient: Dict) -> Tuple[str, str, Optional[str]]:
+    cookware = None
+    if ingredient["state"] == "cooked":
+        cookware = ingredient.get("cookware") or ("pot" if ingredient["item"] in POT_INGREDIENTS else "pan")
+    return (ingredient["item"], ingredient["state"], cookware)
+
+def ingredient_kinds(recipes: Dict[str, Dict]) -> List[Tuple[str, str, Optional[str]]]:
+    """Distinct (item, state, cookware) triples of a recipe category, the columns of the order encoding"""
+    kinds = []
+    for recipe in recipes.values():
+        for ingredient in recipe["ingredients"]:
+            if ingredient_kind(ingredient) not in kinds:
+                kinds.append(ingredient_kind(ingredient))
+    return kinds
+
+def encode_orders(order_lists: List[List[str]], recipes: Dict[str, Dict], kinds: List[Tuple]) -> np.ndarray:
+    """Count tensor (candidates, dishes, kinds) of the ingredients each dish needs"""
+    index = {kind: i for i, kind in enumerate(kinds)}
+    rows = {}
+    for name, recipe in recipes.items():
+        row = np.zeros(len(kinds))
+        for ingredient in recipe["ingredients"]:
+            row[index[ingredient_kind(ingredient)]] += 1
+        rows[name] = row
+    return np.array([[rows[order.split('/')[-1]] for order in orders] for orders in order_lists])
+
+def station_groups(world: World) -> Dict[str, List[Tuple[int, int]]]:
+    groups: Dict[str, List[Tuple[int, int]]] = {}
+    for obj in world.objects.values():
+        if isinstance(obj, Dispenser):
+            key = f"dispenser:{obj.provides}"
+        elif isinstance(obj, ChoppingBoard):
+            key = "chopping_board"
+        elif isinstance(obj, Stove) and isinstance(obj.item, Pan):
+            key = "stove:pan"
+        elif isinstance(obj, Stove) and isinstance(obj.item, Pot):
+            key = "stove:pot"
+        elif isinstance(obj, Table):
+            key = "table"
+        elif isinstance(obj, Sink):
+            key = "sink"
+        elif isinstance(obj, PlateReturn):
+            key = "plate_return"
+        elif isinstance(obj, ServingWindow):
+            key = "serving_window"
+        else:
+            continue
+        groups.setdefault(key, []).append(obj.get_pos())
+    return groups
+
+def group_distances(world: World, groups: Dict[str, List[Tuple[int, int]]]) -> Dict[Tuple[str, str], int]:
+    """Walking distance between the closest members of every pair of station groups (one multi-source BFS per group)"""
+    path_index = world.path_index
+    access = {key: {cell for pos in positions for cell in path_index.adjacent_cells(pos)} for key, positions in groups.items()}
+    distances = {}
+    for source, cells in access.items():
+        dist = {cell: 0 for cell in cells}
+        queue = deque(cells)
+        while queue:
+            cell = queue.popleft()
+            for nxt in path_index.adjacent_cells(cell):
+                if nxt not in dist:
+                    dist[nxt] = dist[cell] + 1
+                    queue.append(nxt)
+        for target, target_cells in access.items():
+            distances[(source, target)] = min((dist[c] for c in target_cells if c in dist), default=UNREACHABLE)
+    return distances
+
+class MapProfile:
+    """Per-map constants of the cost model, shared by every order list scored on that map"""
+    def __init__(self, world: World, kinds: List[Tuple]):
+        groups = station_groups(world)
+        d = group_distances(world, groups)
+        dist = lambda a, b: d.get((a, b), UNREACHABLE)
+        self.num_agents = len(world.agents)
+        self.num_plates = sum(1 for obj in world.objects.values() if isinstance(obj, Table) and obj.item is not None)
+        self.capacity = {key: len(groups.get(key, [])) for key in ["chopping_board", "stove:pan", "stove:pot", "sink"]}
+
+        # Per ingredient kind: agent travel, chopping, unattended cooking and the time until it is ready
+        self.travel = np.zeros(len(kinds))
+        self.chop = np.zeros(len(kinds))
+        self.cook = np.zeros(len(kinds))
+        self.pickup = np.zeros(len(kinds))  # detour from the plate to collect cooked food during assembly
+        self.cook_station = np.zeros((len(kinds), 2))  # pan / pot occupancy
+        for i, (item, state, cookware) in enumerate(kinds):
+            last = f"dispenser:{item}"
+            # Each trip starts back at the plates, where the previous one usually ended
+            self.travel[i] = dist("table", last)
+            if state == "chopped" or (state == "cooked" and cookware == "pan"):
+                self.travel[i] += dist(last, "chopping_board")
+                self.chop[i] = PROCESS_CUT_TIME
+                last = "chopping_board"
+            if state == "cooked":
+                stove = f"stove:{cookware}"
+                self.travel[i] += dist(last, stove)
+                self.cook[i] = PROCESS_POT_COOK_TIME if cookware == "pot" else PROCESS_PAN_COOK_TIME
+                self.cook_station[i, 0 if cookware == "pan" else 1] = self.cook[i]
+                self.pickup[i] = 2 * dist("table", stove)
+            else:
+                self.travel[i] += dist(last, "table")
+        self.chain = self.travel + self.chop + self.cook
+        self.serve_leg = dist("table", "serving_window")
+        # Dirty plate: window -> plate return -> sink -> table, plus the return delay
+        self.wash_travel = dist("serving_window", "plate_return") + dist("plate_return", "sink") + dist("sink", "table")
+        self.wash_cycle = RETURN_DIRTY_PLATE_TIME + self.wash_travel + PROCESS_WASH_PLATE_TIME
+
+    def score_batch(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Estimated features for a batch of order lists on this map, shape (candidates, len(FEATURES)).
+        Dishes are served in order; dish d beyond the initial plates also waits for the plate of dish d - num_plates.
+        """
+        n, num_dishes, _ = counts.shape
+        present = counts > 0
+        ready = np.where(present, self.chain[None, None, :], 0).max(axis=2)
+        assembly = counts @ self.pickup + self.serve_leg
+
+        served = np.zeros((n, num_dishes))
+        previous = np.zeros(n)
+        for dish in range(num_dishes):
+            start = ready[:, dish]
+            if dish >= self.num_plates:
+                start = np.maximum(start, served[:, dish - self.num_plates] + self.wash_cycle)
+            previous = np.maximum(previous, start + assembly[:, dish])
+            served[:, dish] = previous
+        critical_path = served[:, -1]
+
+        totals = counts.sum(axis=1)
+        washes = max(num_dishes - self.num_plates, 0)
+        travel = totals @ self.travel + assembly.sum(axis=1) + washes * self.wash_travel
+        work = travel + totals @ self.chop + washes * PROCESS_WASH_PLATE_TIME
+
+        station_load = np.stack([
+            totals @ self.chop / max(self.capacity["chopping_board"], 1),
+            totals @ self.cook_station[:, 0] / max(self.capacity["stove:pan"], 1),
+            totals @ self.cook_station[:, 1] / max(self.capacity["stove:pot"], 1),
+            np.full(n, washes * PROCESS_WASH_PLATE_TIME / max(self.capacity["sink"], 1)),
+        ], axis=1).max(axis=1)
+        lower_bound = np.maximum.reduce([critical_path, work / self.num_agents, station_load])
+        return np.stack([
+            critical_path,
+            work,
+            work / np.maximum(critical_path, 1),
+            travel / np.maximum(work, 1),
+            station_load / np.maximum(lower_bound, 1),
+            lower_bound,
+        ], axis=1)
+
+def target_scores(features: np.ndarray, target: Dict[str, float], weights: Dict[str, float] = {},
+                  makespan: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Weighted squared relative distance of every candidate to the target profile (lower is better).
+    A "makespan" target is compared with `makespan`: greedy makespans, or estimates of them.
+    """
+    scores = np.zeros(len(features))
+    for name, value in target.items():
+        column = makespan if name == MAKESPAN else features[:, FEATURES.index(name)]
+        scores += weights.get(name, 1.0) * ((column - value) / max(abs(value), 1e-9)) ** 2
+    # Candidates whose stations cannot be reached never match
+    scores[features[:, FEATURES.index("critical_path")] >= UNREACHABLE] = np.inf
+    return scores
+
+def build_world(map_data: Dict, orders: List[str], object_data: List[Dict], recipes: Dict[str, Dict]) -> World:
+    names = [order.split('/')[-1] for order in orders]
+    recipe_data = [recipes[name] for name in dict.fromkeys(names)]
+    return World(map_data, object_data, recipe_data, orders=names)
+
+def greedy_makespan(world: World) -> Optional[int]:
+    """Makespan of the deterministic greedy schedule, checked with the headless evaluator"""
+    simulator = Simulator(world, record_history=False)
+    try:
+        plan, _ = SearchPlanner(simulator).candidate(0)
+    except PlanningFailed:
+        return None
+    result = simulator.evaluate(plan)
+    return result.time if result.valid and result.done else None
+
+def calibrate(recipe: str, num_agents: int, num_orders: int, target: Dict[str, float], weights: Dict[str, float] = {},
+              num_maps: int = 100, orders_per_map: int = 50, keep: int = 5, verify: int = 50, seed: int = 0,
+              width: int = 10, height: int = 8) -> Tuple[List[Instance], Dict]:
+    """
+    Generate num_maps x orders_per_map candidates, score them all with the batched cost model and
+    return the `keep` closest to the target among those checked with the greedy scheduler.
+
+    The cost model estimates lower bounds, which can be several times below what a schedule achieves.
+    Each round re-checks the best `verify` unchecked candidates with the greedy scheduler, fits the scale
+    from the model's lower bound to the greedy makespan, and re-ranks every candidate with the scaled
+    estimate until the scale settles. Checked candidates are then ranked with their measured makespan,
+    and the fitted scale and the model's mismatch are reported in the stats.
+    """
+    object_data = load_json("config/item/station.json")
+    recipes = {r["name"]: r for r in load_json(f"config/recipe/{recipe}.json")}
+    kinds = ingredient_kinds(recipes)
+    all_orders = [f"{recipe}/{name}" for name in recipes]
+
+    candidates, feature_blocks = [], []
+    for map_index in range(num_maps):
+        map_data = generate_random_map(width=width, height=height, num_agents=num_agents, orders=all_orders,
+                                       recipe_dir="config/recipe", num_tables=4, num_plates=2, num_chopping_board=2,
+                                       num_each_cookware=2, num_walls=2, rng=random.Random(seed * 1000003 + map_index),
+                                       constructive=True)
+        profile = MapProfile(build_world(map_data, [], object_data, recipes), kinds)
+        # Int seeds only use their absolute value, a string seed gives a stream independent of every map
+        rng = random.Random(f"{seed}:{map_index}:orders")
+        order_lists = [rng.choices(all_orders, k=num_orders) for _ in range(orders_per_map)]
+        feature_blocks.append(profile.score_batch(encode_orders(order_lists, recipes, kinds)))
+        candidates.extend((map_data, orders) for orders in order_lists)
+
+    features = np.concatenate(feature_blocks)
+    lower_bound = features[:, FEATURES.index("lower_bound")]
+    # Order lists are sampled with replacement, so the same instance can appear twice
+    first = {}
+    for index, (map_data, orders) in enumerate(candidates):
+        first.setdefault((id(map_data), tuple(orders)), index)
+    unique = np.zeros(len(candidates), dtype=bool)
+    unique[list(first.values())] = True
+
+    measured = {}  # candidate index -> greedy makespan, None if the scheduler cannot solve it
+    scale = 1.0
+    # Without a makespan target the ranking does not depend on the scale, one round is enough
+    for _ in range(FIT_ROUNDS if MAKESPAN in target else 1):
+        scores = target_scores(features, target, weights, lower_bound * scale)
+        checked = 0
+        for index in np.argsort(scores, kind="stable"):
+            if checked >= verify or not np.isfinite(scores[index]):
+                break
+            if not unique[index] or index in measured:
+                continue
+            checked += 1
+            map_data, orders = candidates[index]
+            measured[index] = greedy_makespan(build_world(map_data, orders, object_data, recipes))
+        solved = [index for index, makespan in measured.items() if makespan is not None]
+        if not solved:
+            break
+        fitted = float(np.median([measured[index] / max(lower_bound[index], 1) for index in solved]))
+        settled = abs(fitted - scale) <= 0.05 * scale
+        scale = fitted
+        if settled or checked == 0:
+            break
+
+    solved = np.array(sorted(index for index, makespan in measured.items() if makespan is not None), dtype=int)
+    makespans = np.array([measured[index] for index in solved], dtype=float)
+    final = target_scores(features[solved], target, weights, makespans)
+    ranking = [i for i in np.argsort(final, kind="stable") if np.isfinite(final[i])][:keep]
+    selected = [
+        Instance(candidates[solved[i]][0], candidates[solved[i]][1], dict(zip(FEATURES, features[solved[i]].tolist())),
+                 float(final[i]), int(makespans[i]))
+        for i in ranking
+    ]
+
+    estimates = lower_bound[solved]
+    stats = {"candidates": len(candidates), "verified": len(measured), "solved": len(solved), "selected": len(selected),
+             "best_score": float(final.min()) if len(final) else None,
+             # Greedy makespan per unit of the model's lower bound, and the model's error after scaling
+             "makespan_scale": scale if len(solved) else None,
+             "model_error": float(np.mean(np.abs(makespans - estimates) / makespans)) if len(solved) else None,
+             "scaled_model_error": float(np.mean(np.abs(makespans - scale * estimates) / makespans)) if len(solved) else None}
+    return selected, stats
+
+def save_instances(instances: List[Instance], output_dir: str, recipe: str, target: Dict[str, float]):
+    index = []
+    for i, instance in enumerate(instances):
+        map_path = os.path.join(output_dir, "maps", f"{recipe}_{i}")
+        atomic_write(f"{map_path}.json", json.dumps(instance.map_data, indent=4).encode("utf-8"))
+        index.append({"map": map_path, "orders": instance.orders, "features": instance.features,
+                      "score": instance.score, "greedy_makespan": instance.makespan})
+    atomic_write(os.path.join(output_dir, f"{recipe}_instances.json"),
+                 json.dumps({"target": target, "instances": index}, indent=4).encode("utf-8"))
+
+def parse_pairs(pairs: List[str]) -> Dict[str, float]:
+    result = {}
+    for pair in pairs:
+        name, value = pair.split("=")
+        if name not in FEATURES + [MAKESPAN]:
+            raise ValueError(f"Unknown feature {name}, expected one of {FEATURES + [MAKESPAN]}")
+        result[name] = float(value)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate instances that match a target parallelism profile")
+    parser.add_argument("--recipe", type=str, required=True)
+    parser.add_argument("--agents", type=int, default=2)
+    parser.add_argument("--orders", type=int, default=3)
+    parser.add_argument("--target", type=str, nargs="+", required=True, help=f"feature=value pairs, features: {FEATURES + [MAKESPAN]} ({MAKESPAN} is the greedy makespan)")
+    parser.add_argument("--weight", type=str, nargs="*", default=[], help="feature=weight pairs")
+    parser.add_argument("--maps", type=int, default=100)
+    parser.add_argument("--orders_per_map", type=int, default=50)
+    parser.add_argument("--keep", type=int, default=5)
+    parser.add_argument("--verify", type=int, default=50, help="Number of top candidates re-checked with the greedy scheduler per fitting round")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--output_dir", type=str, default="data/calibrated")
+    args = parser.parse_args()
+
+    target = parse_pairs(args.target)
+    instances, stats = calibrate(args.recipe, args.agents, args.orders, target, parse_pairs(args.weight),
+                                 args.maps, args.orders_per_map, args.keep, args.verify, args.seed, args.width, args.height)
+    print(f"Scored {stats['candidates']} candidates, verified {stats['verified']} ({stats['solved']} solved), kept {stats['selected']}")
+    if stats["makespan_scale"] is not None:
+        print(f"Greedy makespan = {stats['makespan_scale']:.2f} x model lower bound "
+              f"(model error {stats['model_error']:.0%}, {stats['scaled_model_error']:.0%} after scaling)")
+    for instance in instances:
+        profile = ", ".join(f"{k}={v:.2f}" for k, v in instance.features.items())
+        print(f"score={instance.score:.4f} greedy_makespan={instance.makespan} {profile} orders={instance.orders}")
+    save_instances(instances, args.output_dir, args.recipe, target)
+
+if __name__ == "__main__":
+    main()
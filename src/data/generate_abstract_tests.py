@@ -1,4 +1,5 @@
 from calendar import c
+import argparse
 import json
 import random
 import os
@@ -7,17 +8,20 @@ from typing import final
 from matplotlib import category
 
 from src.game.const import *
+from src.data.pipeline import GenerationTask, MANIFEST_NAME, atomic_write, run_pipeline
 
 
-def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_dir: str):
-    random.seed(seed)
+def abstract_test_path(orders: list, seed: int, output_dir: str) -> str:
+    category = orders[-1].split('/')[0] if orders else ""
+    return os.path.join(output_dir, category, f"seed_{seed}", f"orders_num_{len(orders)}.json")
+
+def build_abstract_test(orders: list, seed: int, recipe_dict: dict) -> list:
+    rng = random.Random(seed)
     subtasks = []
     count = 1
     final_dishes = []
-    category = ""
     for order in orders:
         cate, name = order.split('/')
-        category = cate
         recipe_data = recipe_dict[name]
         final_ingredients = []
         for ingredient in recipe_data['ingredients']:
@@ -25,7 +29,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                 # pick up raw ingredient
                 subtasks.append({
                     "name": f"subtask{count}",
-                    "time": random.randint(1, 18),
+                    "time": rng.randint(1, 18),
                     "dependencies": {}
                 })
                 final_ingredients.append((count, 0))
@@ -34,7 +38,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                 # pick up raw ingredient
                 subtasks.append({
                     "name": f"subtask{count}",
-                    "time": random.randint(1, 18),
+                    "time": rng.randint(1, 18),
                     "dependencies": {}
                 })
                 raw_id = count
@@ -42,7 +46,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                 # move to chopping board
                 subtasks.append({
                     "name": f"subtask{count}",
-                    "time": random.randint(1, 18),
+                    "time": rng.randint(1, 18),
                     "dependencies": {f"subtask{raw_id}": 0}
                 })
                 chop_id = count
@@ -59,7 +63,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                 # pick up raw ingredient
                 subtasks.append({
                     "name": f"subtask{count}",
-                    "time": random.randint(1, 18),
+                    "time": rng.randint(1, 18),
                     "dependencies": {}
                 })
                 raw_id = count
@@ -69,7 +73,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                     # move to chopping board
                     subtasks.append({
                         "name": f"subtask{count}",
-                        "time": random.randint(1, 18),
+                        "time": rng.randint(1, 18),
                         "dependencies": {f"subtask{raw_id}": 0}
                     })
                     chop_id = count
@@ -91,7 +95,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
                 # move to cooking station and put in pan/pot
                 subtasks.append({
                     "name": f"subtask{count}",
-                    "time": random.randint(1, 18),
+                    "time": rng.randint(1, 18),
                     "dependencies": {f"subtask{chopped_id}": 0}
                 })
                 cook_id = count
@@ -100,7 +104,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
         # plate and serve
         subtasks.append({
             "name": f"subtask{count}",
-            "time": random.randint(1, 18) * len(final_ingredients),
+            "time": rng.randint(1, 18) * len(final_ingredients),
             "dependencies": {f"subtask{id[0]}": id[1] for id in final_ingredients}
         })
         final_dishes.append(count)
@@ -110,7 +114,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
         # pick dirty plate
         subtasks.append({
             "name": f"subtask{count}",
-            "time": random.randint(1, 18),
+            "time": rng.randint(1, 18),
             "dependencies": {f"subtask{final_dishes[i]}": RETURN_DIRTY_PLATE_TIME}
         })
         dirty_id = count
@@ -118,7 +122,7 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
         # move to sink
         subtasks.append({
             "name": f"subtask{count}",
-            "time": random.randint(1, 18),
+            "time": rng.randint(1, 18),
             "dependencies": {f"subtask{dirty_id}": 0}
         })
         sink_id = count
@@ -136,15 +140,20 @@ def generate_abstract_test(orders: dict, seed: int, recipe_dict: dict, output_di
         for subtask in subtasks:
             if subtask['name'] == f"subtask{final_dishes[i]}":
                 subtask['dependencies'][f"subtask{clean_plates[i-2]}"] = 0
-    
-    output_path = os.path.join(output_dir, category, f"seed_{seed}", f"orders_num_{len(orders)}.json")
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    return subtasks
 
-    with open(output_path, 'w') as f:
-        json.dump(subtasks, f, indent=4)
+def generate_abstract_test(orders: list, seed: int, recipe_dict: dict, output_dir: str):
+    subtasks = build_abstract_test(orders, seed, recipe_dict)
+    atomic_write(abstract_test_path(orders, seed, output_dir), json.dumps(subtasks, indent=4).encode("utf-8"))
 
 def main():
-    
+    parser = argparse.ArgumentParser(description="Generate abstract scheduling tests from the order sets")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[42, 84, 126, 128, 256])
+    parser.add_argument("--orders_path", type=str, default="data/cook/orders/all_orders.json")
+    parser.add_argument("--output_dir", type=str, default="data/abstract")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Regenerate everything, ignoring the manifest")
+    args = parser.parse_args()
 
     # recipes = ["sashimi", "salad", "sushi", "burger", "pasta", "burrito"]
     recipe_dir = "config/recipe"
@@ -156,16 +165,19 @@ def main():
                 for dish in recipe_data:
                     recipe_dict[dish['name']] = dish
 
-    seeds = [42, 84, 126, 128, 256]
-
-    orders_path = "data/cook/orders/all_orders.json"
-    with open(orders_path, 'r') as f:
+    with open(args.orders_path, 'r') as f:
         orders_data = json.load(f)
 
-    output_dir = "data/abstract"
+    tasks = []
     for name, orders in orders_data.items():
-        for seed in seeds:
-            generate_abstract_test(orders, seed, recipe_dict, output_dir)
+        # Only the recipes a test uses go into the task, so editing one recipe regenerates just its tests
+        used_recipes = {order.split('/')[1]: recipe_dict[order.split('/')[1]] for order in orders}
+        for seed in args.seeds:
+            tasks.append(GenerationTask(abstract_test_path(orders, seed, args.output_dir), build_abstract_test,
+                                        {"orders": orders, "seed": seed, "recipe_dict": used_recipes}))
+    stats = run_pipeline(tasks, os.path.join(args.output_dir, MANIFEST_NAME), workers=args.workers, force=args.force)
+    if stats["failed"]:
+        raise ValueError(f"Failed to generate {len(stats['failed'])} files: {stats['failed']}")
         
 
 if __name__ == "__main__":
@@ -1,49 +1,42 @@
 from src.utils.random_map import generate_random_map, load_json, check_reachability
 from src.utils.utils import print_map_ascii
+from src.data.pipeline import GenerationTask, MANIFEST_NAME, atomic_write, run_pipeline
 
+import argparse
 import os
 import random
 import json
 
-def generate_random_orders(recipe, num_orders, output_dir=None, seed=None) -> bool:
+def build_orders(recipe, num_orders, seed=None) -> list:
     recipe_dir = "config/recipe/" + recipe + ".json"
     all_recipes = load_json(recipe_dir)
+    rng = random.Random(seed)
+    selected_orders = rng.choices(all_recipes, k=num_orders)
+    return [f"{recipe}/{r['name']}" for r in selected_orders]
 
-    if seed is not None:
-        random.seed(seed)
-    
-    selected_orders = random.choices(all_recipes, k=num_orders)
-    order_names = [f"{recipe}/{r['name']}" for r in selected_orders]
-    print("Selected Orders:", order_names)
-    if output_dir is not None:
-        for agent_num in range(1, 4):
-            orders_path = output_dir + f"orders/agent_num_{agent_num}/orders_num_{num_orders}.yaml"
-            os.makedirs(os.path.dirname(orders_path), exist_ok=True)
-            with open(orders_path, 'w') as f:
-                yaml_content = f"map: data/cook/{recipe}/seed_{seed}/maps/agent_num_{agent_num}\n"
-                yaml_content += f"result_path: {recipe}/seed_{seed}/agent_num_{agent_num}/orders_num_{num_orders}\n"
-                yaml_content += "orders:\n"
-                for order in order_names:
-                    yaml_content += f"  - {order}\n"
-                f.write(yaml_content)
-    return True
-
+def build_orders_yaml(recipe, num_orders, seed, agent_num) -> str:
+    order_names = build_orders(recipe, num_orders, seed)
+    yaml_content = f"map: data/cook/{recipe}/seed_{seed}/maps/agent_num_{agent_num}\n"
+    yaml_content += f"result_path: {recipe}/seed_{seed}/agent_num_{agent_num}/orders_num_{num_orders}\n"
+    yaml_content += "orders:\n"
+    for order in order_names:
+        yaml_content += f"  - {order}\n"
+    return yaml_content
 
-def generate_maps(recipe, num_agents, output_dir, seed=None) -> bool:
+def build_map(recipe, num_agents, seed=None, width=10, height=8, constructive=False) -> dict|None:
     recipe_dir = "config/recipe/" + recipe + ".json"
     all_recipes = load_json(recipe_dir)
-
-    if seed is not None:
-        random.seed(seed)
-    
     order_names = [f"{recipe}/{r['name']}" for r in all_recipes]
-    print("Selected Orders:", order_names)
+    if constructive:
+        # Reachability is guaranteed by construction, no check or retries needed
+        return generate_random_map(width=width, height=height, num_agents=num_agents, orders=order_names,
+                                   recipe_dir="config/recipe", num_tables=4, num_plates=2, num_chopping_board=2,
+                                   num_each_cookware=2, num_walls=2, seed=seed, constructive=True)
     retry_count = 0
-    map_data = None
     while retry_count < 5:
         map_data = generate_random_map(
-            width=10,
-            height=8,
+            width=width,
+            height=height,
             num_agents=num_agents,
             orders=order_names,
             recipe_dir="config/recipe",
@@ -54,39 +47,71 @@ def generate_maps(recipe, num_agents, output_dir, seed=None) -> bool:
             num_walls=2,
             seed=seed + retry_count if seed is not None else None
         )
-        print_map_ascii(map_data)
         if check_reachability(map_data):
-            break
-        else:
-            print("Map not fully reachable, regenerating...")
-        map_data = None
+            return map_data
+        print("Map not fully reachable, regenerating...")
         retry_count += 1
+    return None
+
+def generate_random_orders(recipe, num_orders, output_dir=None, seed=None) -> bool:
+    order_names = build_orders(recipe, num_orders, seed)
+    print("Selected Orders:", order_names)
+    if output_dir is not None:
+        for agent_num in range(1, 4):
+            orders_path = output_dir + f"orders/agent_num_{agent_num}/orders_num_{num_orders}.yaml"
+            atomic_write(orders_path, build_orders_yaml(recipe, num_orders, seed, agent_num).encode("utf-8"))
+    return True
+
+
+def generate_maps(recipe, num_agents, output_dir, seed=None) -> bool:
+    map_data = build_map(recipe, num_agents, seed)
     if not map_data:
         print("Failed to generate a valid map after retries.")
         return False
+    print_map_ascii(map_data)
     map_path = output_dir + f"maps/agent_num_{num_agents}.json"
-    os.makedirs(os.path.dirname(map_path), exist_ok=True)
-    with open(map_path, 'w') as f:
-        json.dump(map_data, f, indent=4)
+    atomic_write(map_path, json.dumps(map_data, indent=4).encode("utf-8"))
     return True
 
 
-def main():
-    seeds = [42, 84, 126, 128, 256]
-    recipe_cates = ["sashimi", "salad", "sushi", "burger", "pasta", "burrito"]
-    # recipe_cates = ["burger"]
+def build_tasks(recipe_cates, seeds, output_root="data/cook", map_options=None) -> list:
+    # map_options (width, height, constructive) only enter the task key when given, keeping default keys stable
+    map_options = map_options or {}
+    tasks = []
     for recipe in recipe_cates:
         for seed in seeds:
+            output_dir = f"{output_root}/{recipe}/seed_{seed}/"
             for num_agents in range(1, 4):
-                print(f"Generating map for {num_agents} agents with seed {seed}")
-                done = generate_maps(recipe=recipe, num_agents=num_agents, output_dir=f"data/cook/{recipe}/seed_{seed}/", seed=seed)
-                if not done:
-                    raise ValueError("Failed to generate a valid map after retries.")
+                tasks.append(GenerationTask(output_dir + f"maps/agent_num_{num_agents}.json", build_map,
+                                            {"recipe": recipe, "num_agents": num_agents, "seed": seed, **map_options}))
             for num_orders in range(1, 5):
-                print(f"Generating orders for {num_orders} orders with seed {seed}")
-                done = generate_random_orders(recipe=recipe, num_orders=num_orders, output_dir=f"data/cook/{recipe}/seed_{seed}/", seed=seed)
-                if not done:
-                    raise ValueError("Failed to generate orders.")
+                for agent_num in range(1, 4):
+                    tasks.append(GenerationTask(output_dir + f"orders/agent_num_{agent_num}/orders_num_{num_orders}.yaml", build_orders_yaml,
+                                                {"recipe": recipe, "num_orders": num_orders, "seed": seed, "agent_num": agent_num}))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate maps and orders for the cooking benchmark")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[42, 84, 126, 128, 256])
+    parser.add_argument("--recipes", type=str, nargs="+", default=["sashimi", "salad", "sushi", "burger", "pasta", "burrito"])
+    parser.add_argument("--output_root", type=str, default="data/cook")
+    parser.add_argument("--width", type=int, default=10)
+    parser.add_argument("--height", type=int, default=8)
+    parser.add_argument("--constructive", action="store_true", help="Build maps that are reachable by construction instead of generate-and-retry")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Regenerate everything, ignoring the manifest")
+    args = parser.parse_args()
+
+    map_options = {}
+    if (args.width, args.height) != (10, 8):
+        map_options.update(width=args.width, height=args.height)
+    if args.constructive:
+        map_options["constructive"] = True
+    tasks = build_tasks(args.recipes, args.seeds, args.output_root, map_options)
+    stats = run_pipeline(tasks, os.path.join(args.output_root, MANIFEST_NAME), workers=args.workers, force=args.force)
+    if stats["failed"]:
+        raise ValueError(f"Failed to generate {len(stats['failed'])} files: {stats['failed']}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,112 @@
+# src/data/pipeline.py
+
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+@dataclass
+class GenerationTask:
+    """
+    One output file of a dataset. `func(**kwargs)` must be a picklable top-level function that
+    builds the content deterministically (it owns its random.Random), returning a str or a JSON
+    serializable object. Returning None marks the task as failed.
+    """
+    output_path: str
+    func: Callable
+    kwargs: Dict = field(default_factory=dict)
+
+    def key(self) -> str:
+        """Hash of what the output depends on, used to detect unchanged work on rerun"""
+        spec = {"func": f"{self.func.__module__}.{self.func.__qualname__}", "kwargs": self.kwargs}
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+def serialize(content) -> bytes:
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return json.dumps(content, indent=4).encode("utf-8")
+
+def file_hash(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def atomic_write(path: str, data: bytes):
+    """Write to a temporary file next to `path` and rename it, readers never see partial files"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_manifest(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _run_task(task: GenerationTask):
+    content = task.func(**task.kwargs)
+    if content is None:
+        return None
+    data = serialize(content)
+    atomic_write(task.output_path, data)
+    return hashlib.sha256(data).hexdigest()
+
+def run_pipeline(tasks: List[GenerationTask], manifest_path: str, workers: Optional[int] = None, force: bool = False) -> Dict:
+    """
+    Run generation tasks over a process pool and record {output_path: {task, sha256}} in the manifest.
+    A task is skipped when its key is unchanged and the file on disk still matches the recorded hash.
+    When several tasks target the same file the last one wins, as in sequential generation.
+    The manifest is saved even if some tasks fail, so an interrupted run resumes where it stopped.
+    """
+    unique: Dict[str, GenerationTask] = {}
+    for task in tasks:
+        unique.pop(task.output_path, None)
+        unique[task.output_path] = task
+
+    manifest = {} if force else load_manifest(manifest_path)
+    pending = []
+    skipped = 0
+    for path, task in unique.items():
+        entry = manifest.get(path)
+        if entry and entry.get("task") == task.key() and file_hash(path) == entry.get("sha256"):
+            skipped += 1
+        else:
+            pending.append(task)
+
+    failed = []
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_task, task): task for task in pending}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    digest = future.result()
+                except Exception as e:
+                    digest = None
+                    print(f"Task for {task.output_path} raised: {e}")
+                if digest is None:
+                    failed.append(task.output_path)
+                    manifest.pop(task.output_path, None)
+                else:
+                    manifest[task.output_path] = {"task": task.key(), "sha256": digest}
+
+    atomic_write(manifest_path, json.dumps(manifest, indent=4, sort_keys=True).encode("utf-8"))
+    stats = {"tasks": len(unique), "generated": len(pending) - len(failed), "skipped": skipped, "failed": sorted(failed)}
+    print(f"Generated {stats['generated']}, skipped {skipped} unchanged, failed {len(failed)} of {len(unique)} tasks")
+    return stats
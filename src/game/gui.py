@@ -1,40 +1,34 @@
-import re
 import streamlit as st
 import json
 import sys, os
 import argparse
 from src.utils.utils import get_map_legend, draw_map_image
+from src.utils.logger_config import ansi_to_html
+from src.utils.log_index import open_log_index
 
 st.set_page_config(layout="wide")
 
-def ansi_to_html(text):
-    ansi_map = {
-        '\x1b[30m': '<span style="color:black">',
-        '\x1b[31m': '<span style="color:red">',
-        '\x1b[32m': '<span style="color:green">',
-        '\x1b[33m': '<span style="color:orange">',
-        '\x1b[34m': '<span style="color:blue">',
-        '\x1b[35m': '<span style="color:purple">',
-        '\x1b[36m': '<span style="color:cyan">',
-        '\x1b[37m': '<span style="color:gray">',
-        '\x1b[1m': '<span style="font-weight:bold">',
-        '\x1b[4m': '<span style="text-decoration:underline">',
-        '\x1b[7m': '<span style="background:gray">',
-        '\x1b[40m': '<span style="background:black">',
-        '\x1b[41m': '<span style="background:red">',
-        '\x1b[42m': '<span style="background:green">',
-        '\x1b[43m': '<span style="background:orange">',
-        '\x1b[44m': '<span style="background:blue">',
-        '\x1b[45m': '<span style="background:purple">',
-        '\x1b[46m': '<span style="background:cyan">',
-        '\x1b[47m': '<span style="background:gray">',
-        '\x1b[0m': '</span>',
-    }
-    for code, html in ansi_map.items():
-        text = text.replace(code, html)
-    text = re.sub(r'\x1b\[[0-9;]*m', '', text)
-    text = text.replace('\n', '<br>')
-    return text
+# Time steps (env.log) or conversation turns (model.log) rendered at once
+LOG_WINDOW = 20
+
+def show_log(log_path, key):
+    """Render one window of a log, located through its byte-offset index instead of reading the whole file"""
+    index = open_log_index(log_path)
+    kind = "steps" if index.steps or not index.turns else "turns"
+    segments = index.segments(kind)
+    if index.size == 0:
+        st.info("No execution result log yet.")
+        return
+    pages = (len(segments) + LOG_WINDOW - 1) // LOG_WINDOW
+    page = pages
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages}, {LOG_WINDOW} {'time steps' if kind == 'steps' else 'turns'} each)",
+                               min_value=1, max_value=pages, value=pages, key=f"{key}_page")
+    first = (page - 1) * LOG_WINDOW
+    labels = [label for label, _ in segments[first:first + LOG_WINDOW] if label is not None]
+    if labels:
+        st.caption(f"{'Time' if kind == 'steps' else 'Turns'}: {labels[0]} – {labels[-1]}")
+    st.markdown(ansi_to_html(index.window(kind, first, LOG_WINDOW)), unsafe_allow_html=True)
 
 def show_map(map_data):
     st.subheader("Map Visualization")
@@ -160,17 +154,16 @@ def main():
                 json.dump(st.session_state["actions"], f, ensure_ascii=False, indent=2)
             st.success("Successfully saved actions to actions.json (Human.py will automatically detect and execute)")
         
-        if os.path.exists(log_path):
-            with open(log_path, "r", encoding="utf-8") as log_f:
-                log_content = log_f.read()
-            st.subheader("Execution Result Log (tmp/log.txt)")
-            if log_content.strip():
-                log_html = ansi_to_html(log_content)
-                st.markdown(log_html, unsafe_allow_html=True)
-            else:
-                st.info("No execution result log yet.")
+        st.subheader("Execution Result Log (tmp/log.txt)")
+        show_log(log_path, "result_log")
+
+    run_log = st.sidebar.text_input("Run log file (env.log or model.log)")
+    if run_log:
+        if os.path.isfile(run_log):
+            with st.expander(f"Run log: {run_log}", expanded=True):
+                show_log(run_log, "run_log")
         else:
-            st.info("No execution result log yet.")
+            st.sidebar.warning(f"No such file: {run_log}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+# history.py
+"""
+Delta encoding of Simulator.state_history ({"time", "world"} entries) for streaming and replay.
+
+A frame is either a keyframe {"index", "time", "world"} or a delta {"index", "time", "delta"}
+against the world of the previous frame. A delta holds
+  "set":   top-level world fields that changed, replaced whole;
+  "lists": for every changed top-level list, {"length": n, "items": {position: element}} with the
+           elements that differ from the previous world (positions are strings, as in JSON objects).
+Between two steps usually only a few agents and the tiles they interacted with change, so a delta is
+a small fraction of the world. gui/web/src/utils/historyDelta.js decodes the same format.
+"""
+
+from copy import deepcopy
+from typing import Dict, List, Optional
+
+def diff_world(previous: Dict, world: Dict) -> Dict:
+    delta = {"set": {}, "lists": {}}
+    for key, value in world.items():
+        old = previous.get(key)
+        if value == old:
+            continue
+        if isinstance(value, list) and isinstance(old, list):
+            items = {str(i): item for i, item in enumerate(value) if i >= len(old) or item != old[i]}
+            delta["lists"][key] = {"length": len(value), "items": items}
+        else:
+            delta["set"][key] = value
+    return delta
+
+def apply_delta(previous: Dict, delta: Dict) -> Dict:
+    """World after `delta`; unchanged fields and list elements are shared with `previous`"""
+    world = dict(previous)
+    world.update(delta["set"])
+    for key, change in delta["lists"].items():
+        items = list(previous.get(key, [])[:change["length"]])
+        items.extend([None] * (change["length"] - len(items)))
+        for position, item in change["items"].items():
+            items[int(position)] = item
+        world[key] = items
+    return world
+
+class HistoryEncoder:
+    """Turns recorded states into frames one at a time, as they are recorded"""
+    def __init__(self):
+        self.previous: Optional[Dict] = None
+        self.index = 0
+
+    def encode(self, state: Dict) -> Dict:
+        world = state["world"]
+        if self.previous is None:
+            frame = {"index": self.index, "time": state["time"], "world": world}
+        else:
+            frame = {"index": self.index, "time": state["time"], "delta": diff_world(self.previous, world)}
+        self.previous = deepcopy(world)
+        self.index += 1
+        return frame
+
+def encode_history(history: List[Dict]) -> List[Dict]:
+    encoder = HistoryEncoder()
+    return [encoder.encode(state) for state in history]
+
+def decode_frames(frames: List[Dict], world: Optional[Dict] = None) -> List[Dict]:
+    """States of `frames`; `world` is the world before the first frame when that one is a delta"""
+    states = []
+    for frame in frames:
+        world = frame["world"] if "world" in frame else apply_delta(world, frame["delta"])
+        states.append({"time": frame["time"], "world": world})
+    return states
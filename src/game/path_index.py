@@ -0,0 +1,82 @@
+# path_index.py
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+class PathIndex:
+    """
+    Cached shortest-path queries over the static layout of a World.
+    Walls and stations never move during a simulation, so BFS trees computed from a
+    start cell stay valid for the whole episode (and for every clone of the world).
+    """
+    def __init__(self, world):
+        self.width = world.width
+        self.height = world.height
+        self.walkable = {
+            (x, y) for y in range(world.height) for x in range(world.width) if world._is_walkable(x, y)
+        }
+        self._trees: Dict[Tuple[int, int], Tuple[Dict, Dict]] = {}
+
+    def __deepcopy__(self, memo):
+        # The layout is immutable, share the index (and its cache) between copies
+        return self
+
+    def is_walkable(self, pos: Tuple[int, int]) -> bool:
+        return pos in self.walkable
+
+    def bfs_tree(self, start_pos: Tuple[int, int]) -> Tuple[Dict, Dict]:
+        """Return (distance map, parent map) of a BFS rooted at start_pos, cached per start"""
+        tree = self._trees.get(start_pos)
+        if tree is not None:
+            return tree
+        dist = {start_pos: 0}
+        parent = {start_pos: None}
+        queue = deque([start_pos])
+        walkable = self.walkable
+        while queue:
+            x, y = queue.popleft()
+            d = dist[(x, y)] + 1
+            for dx, dy in DIRECTIONS:
+                nxt = (x + dx, y + dy)
+                if nxt not in dist and nxt in walkable:
+                    dist[nxt] = d
+                    parent[nxt] = (x, y)
+                    queue.append(nxt)
+        tree = (dist, parent)
+        self._trees[start_pos] = tree
+        return tree
+
+    def distance(self, start_pos: Tuple[int, int], end_pos: Tuple[int, int]) -> int:
+        """Shortest walking distance, -1 if unreachable"""
+        if start_pos == end_pos:
+            return 0
+        return self.bfs_tree(start_pos)[0].get(end_pos, -1)
+
+    def path(self, start_pos: Tuple[int, int], end_pos: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Shortest path including both end points, [] if unreachable"""
+        if start_pos == end_pos:
+            return [start_pos]
+        dist, parent = self.bfs_tree(start_pos)
+        if end_pos not in dist:
+            return []
+        path = [end_pos]
+        while path[-1] != start_pos:
+            path.append(parent[path[-1]])
+        path.reverse()
+        return path
+
+    def adjacent_cells(self, pos: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Walkable cells next to pos (four directions)"""
+        return [(pos[0] + dx, pos[1] + dy) for dx, dy in DIRECTIONS if (pos[0] + dx, pos[1] + dy) in self.walkable]
+
+    def nearest_adjacent(self, start_pos: Tuple[int, int], station_pos: Tuple[int, int]) -> Optional[Tuple[Tuple[int, int], int]]:
+        """Closest reachable cell next to a station as (cell, distance), None if the station cannot be reached"""
+        dist = self.bfs_tree(start_pos)[0]
+        best = None
+        for cell in self.adjacent_cells(station_pos):
+            d = dist.get(cell)
+            if d is not None and (best is None or d < best[1]):
+                best = (cell, d)
+        return best
@@ -0,0 +1,66 @@
+# preview.py
+"""
+Plan preview for the GUI server: the headless Simulator.evaluate of a draft plan from the initial
+state of a test, summarized as makespan, error and a compact timeline of the actions each agent ran.
+"""
+
+from typing import Dict, List, Optional
+
+from src.game.simulator import Simulator
+from src.game.world_state import World
+
+def scenario_of(world: World) -> Dict:
+    """JSON description of an initial world, from which build_simulator rebuilds it"""
+    return {
+        "map": world.map_data,
+        "objects": list(world.objects_info.values()),
+        "recipes": world.recipes,
+        "orders": list(world.orders),
+    }
+
+def build_simulator(scenario: Dict) -> Simulator:
+    """Headless simulator of the initial world described by `scenario`"""
+    world = World(scenario["map"], scenario["objects"], scenario["recipes"], orders=list(scenario["orders"]))
+    return Simulator(world, record_history=False)
+
+def preview_plan(simulator: Simulator, plan: Dict[str, List[Dict]], until: Optional[int] = None) -> Dict:
+    """
+    Evaluate `plan` from the state of `simulator` (left untouched), to completion or up to time `until`.
+    The timeline maps every agent to [action index, action type, start, end] entries of the actions
+    it started (instant ones included); `failed` names the action that raised the error, if any.
+    """
+    timeline: Dict[str, List[list]] = {name: [] for name in simulator.world.agents}
+    started = {name: 0 for name in simulator.world.agents}
+
+    def record(clone: Simulator):
+        # A step handles a single time point: every action started since the last step started now
+        for name, agent in clone.world.agents.items():
+            count = len(agent.all_actions) - len(agent.action_queue)
+            for index in range(started[name], count):
+                running = index == count - 1 and agent.current_action is not None and not agent.is_idle
+                end = agent.finish_time if running else clone.current_time
+                timeline[name].append([index, agent.all_actions[index].get("action"), clone.current_time, end])
+            started[name] = count
+
+    result = simulator.evaluate(plan, until, on_step=record)
+    clone = result.simulator
+    failed = None
+    if not result.valid and clone.acting_agent in clone.world.agents:
+        agent = clone.world.agents[clone.acting_agent]
+        # An error in complete_current_action leaves the action current, one in assign_next_action at the queue head
+        current = 1 if agent.current_action is not None and not agent.is_idle else 0
+        failed = {"agent": clone.acting_agent, "index": len(agent.all_actions) - len(agent.action_queue) - current}
+    return {
+        "valid": result.valid,
+        "done": result.done,
+        "makespan": result.time if result.done else None,
+        "time": result.time,
+        "error": result.error,
+        "failed": failed,
+        "orders": {"finished": len(clone.world.finished_orders), "remaining": len(clone.world.orders)},
+        "agents": {
+            name: {"position": [agent.x, agent.y], "holding": agent.holding.name if agent.holding is not None else None}
+            for name, agent in clone.world.agents.items()
+        },
+        "timeline": timeline,
+    }
@@ -1,14 +1,16 @@
 # simulator.py - Action Scheduling System
 
+import logging
 from copy import deepcopy
-from typing import Dict, List
+from dataclasses import dataclass
+from typing import Dict, List, Optional
 from heapq import heappop, heappush
 
 
 from src.game.world_state import World
 from src.game.object import *
 from src.game.const import *
-from src.utils.logger_config import logger, COLOR_CODES, RESET
+from src.utils.logger_config import logger, suppress_logging, COLOR_CODES, RESET
 
 class ActionExecutionError(Exception):
     """Custom exception for action execution errors"""
@@ -23,10 +25,20 @@ class TimePoint:
     def __lt__(self, other):
         return self.time < other.time
 
+@dataclass
+class EvaluationResult:
+    """Outcome of a headless plan evaluation"""
+    valid: bool  # No action raised an error
+    done: bool  # All orders were served
+    time: int  # Simulation time when the run stopped
+    error: Optional[str] = None
+    simulator: Optional["Simulator"] = None  # The evaluated clone, for inspection
+
 class Simulator:
-    def __init__(self, world: World):
+    def __init__(self, world: World, record_history: bool = True):
         self.world: World = world
         self.current_time = 0
+        self.record_history = record_history  # Headless runs skip the per-step world snapshots
 
         self.event_queue: List[TimePoint] = []
         time0 = TimePoint(0)
@@ -34,7 +46,9 @@ class Simulator:
             time0.agents.append(agent_name)
         self.event_queue.append(time0)
         self.state_history: List[dict] = []  # To record the state at each time point
+        self.history_listener = None  # Called with every recorded state, e.g. to stream the history to the GUI
         self.finished_agents = set()
+        self.acting_agent: str | None = None  # Agent whose actions are being resolved, names the culprit of an error
 
     def rollback_plan(self):
         """Rollback the plan of all agents to last loaded state"""
@@ -190,7 +204,7 @@ class Simulator:
 
     def update_stations(self, current_time: int):
         """Check the status of all workstations"""
-        for obj in self.world.objects.values():
+        for obj in self.world.timed_stations:
             if isinstance(obj, Stove) and obj.item:
                 if isinstance(obj.item, Pan) or isinstance(obj.item, Pot):
                     obj.item.update_cooking(current_time)
@@ -240,6 +254,7 @@ class Simulator:
     def resolve_instant_actions(self):
         """Resolve all instant actions (actions with zero duration)"""
         for agent_name, agent in self.world.agents.items():
+            self.acting_agent = agent_name
             self.assign_next_action(agent_name)
             while agent.finish_time == self.current_time and not agent.is_idle:
                 self.complete_current_action(agent_name)
@@ -259,9 +274,11 @@ class Simulator:
         current_time_point = heappop(self.event_queue)
         self.current_time = current_time_point.time
         logger.info(f"\n--- Time Advanced to {self.current_time} ---")
+        self.acting_agent = None
         self.update_stations(self.current_time)
         have_agent_finished = False
         for agent_name in current_time_point.agents:
+            self.acting_agent = agent_name
             agent = self.world.agents[agent_name]
             if current_time_point.time:
                 # have_agent_finished = True
@@ -277,17 +294,56 @@ class Simulator:
 
         self.update_event_queue()
         
-        self.state_history.append({
-            "time": self.current_time,
-            "world": deepcopy(self.world.to_json())
-        })
+        if self.record_history:
+            state = {
+                "time": self.current_time,
+                "world": deepcopy(self.world.to_json())
+            }
+            self.state_history.append(state)
+            if self.history_listener is not None:
+                self.history_listener(state)
 
-        logger.info(f"{COLOR_CODES['PURPLE']}Observation:{RESET}")
-        logger.info(self.status())
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"{COLOR_CODES['PURPLE']}Observation:{RESET}")
+            logger.info(self.status())
         # logger.info(self.world.to_json())
 
         return have_agent_finished
     
+    def clone(self, record_history: bool | None = None) -> "Simulator":
+        """Deep copy of the simulator without its recorded history and history listener"""
+        history, listener = self.state_history, self.history_listener
+        self.state_history, self.history_listener = [], None
+        try:
+            simulator = deepcopy(self)
+        finally:
+            self.state_history, self.history_listener = history, listener
+        if record_history is not None:
+            simulator.record_history = record_history
+        return simulator
+
+    def evaluate(self, plan: Dict[str, List[Dict]], until: int | None = None, on_step=None) -> EvaluationResult:
+        """
+        Fast evaluation path: submit the plan to a headless clone (no logging, no state history)
+        and run it to completion, or up to time `until`. The simulator itself is left untouched.
+        `on_step`, if given, is called with the clone after the plan is submitted and after every step.
+        """
+        simulator = self.clone(record_history=False)
+        with suppress_logging():
+            try:
+                simulator.submit_plan(plan)
+                if on_step is not None:
+                    on_step(simulator)
+                while simulator.event_queue:
+                    if until is not None and simulator.event_queue[0].time > until:
+                        break
+                    simulator.step()
+                    if on_step is not None:
+                        on_step(simulator)
+            except Exception as e:
+                return EvaluationResult(False, False, simulator.current_time, str(e), simulator)
+        return EvaluationResult(True, simulator.is_done(), simulator.current_time, None, simulator)
+
     def next_decision_step(self):
         """Advance simulation to the next decision point where at least one agent needs to make a decision"""
         need_decision_agents = self.get_decision_agents()
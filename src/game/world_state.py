@@ -1,8 +1,10 @@
 # world_state.py
 
 from collections import deque
+from copy import deepcopy
 from typing import List, Dict, Optional, Tuple
 from src.game.object import *
+from src.game.path_index import PathIndex
 
 class World:
     """Manage all game objects and map state"""
@@ -22,6 +24,17 @@ class World:
         self.agents: Dict[str, Agent] = {}
         self.map_data = map_data
         self._load_map(map_data)
+        self.path_index = PathIndex(self)
+        # Stations whose state advances with time, checked by the simulator at every step
+        self.timed_stations = [obj for obj in self.objects.values() if isinstance(obj, (Stove, PlateReturn))]
+
+    def __deepcopy__(self, memo):
+        # The map data is the static input of the world: copies share it (and its compiled prompt blocks)
+        memo[id(self.map_data)] = self.map_data
+        world = type(self).__new__(type(self))
+        memo[id(self)] = world
+        world.__dict__.update(deepcopy(self.__dict__, memo))
+        return world
 
     def get_object_by_name(self, obj_name: str) -> Optional[GameObject]:
         """Return object with specified name"""
@@ -74,6 +87,11 @@ class World:
         
         if not self._is_walkable(*end_pos) and not adjacent_to_station:
             return (-1, [])
+
+        if not adjacent_to_station:
+            # The layout is static, so plain point-to-point queries go through the cached BFS trees
+            path = self.path_index.path(start_pos, end_pos)
+            return (len(path) - 1, path) if path else (-1, [])
         
         queue = deque([(start_pos, 0, [start_pos])])  # (position, distance, path)
         visited = {start_pos}
@@ -14,7 +14,10 @@ from src.agent.method.PLaG.PLaG import PLaGAgent
 from src.agent.method.ReAct.ReAct import ReActAgent
 from src.agent.method.MultiStepReAct.MultiStepReAct import MultiStepReActAgent
 from src.agent.method.Fixed.Fixed import FixedAgent
+from src.agent.method.Search.Search import SearchAgent
 from src.agent.method.Human.Human import HumanAgent
+from src.agent.method.agent import HistoryManager, HISTORY_POLICIES
+from src.agent.method.prompt_blocks import load_map
 from src.utils.logger_config import logger, set_log_dir, COLOR_CODES, RESET
 
 name_to_agent = {
@@ -24,6 +27,7 @@ name_to_agent = {
     "ReAct": ReActAgent,
     "MultiStepReAct": MultiStepReActAgent,
     "Fixed": FixedAgent,
+    "Search": SearchAgent,
     "Human": HumanAgent,
 }
 
@@ -58,7 +62,7 @@ def run_test(args):
                     return
 
     # --- 1. Load configuration data ---
-    map_data = load_data(f'{args.map}.json')
+    map_data = load_map(f'{args.map}.json')
     ingredient_data = load_data(f'config/item/{args.ingredient}.json')
     object_data = load_data(f'config/item/{args.object}.json')
     orders = args.orders if args.orders else [] # Order list for testing (format: category/name)
@@ -83,7 +87,19 @@ def run_test(args):
     # --- 3. Initialize Agent and run test ---
     model_wrapper = get_model_wrapper(args.model)
     model = model_wrapper(args.model)
-    agent = name_to_agent[args.agent](model, log_dir=run_log_dir)
+    agent_cls = name_to_agent[args.agent]
+    agent_kwargs = {}
+    if issubclass(agent_cls, ReActAgent):
+        agent_kwargs = {"observation": args.observation, "keyframe_interval": args.keyframe_interval, "decision": args.decision}
+    elif issubclass(agent_cls, IOAgent):
+        agent_kwargs = {"samples": args.samples, "sample_temperature": args.sample_temperature}
+    elif issubclass(agent_cls, HumanAgent):
+        agent_kwargs = {"session_id": args.gui_session}
+    agent = agent_cls(model, log_dir=run_log_dir, **agent_kwargs)
+    agent.history = HistoryManager(HISTORY_POLICIES[args.history](args.history_turns))
+    agent.retime = args.retime
+    agent.repair = args.repair
+    agent.stream = args.stream
     result = agent.run_test(simulator, recipes, args.examples if args.examples else [])
     
     result["log_dir"] = run_log_dir
@@ -131,6 +147,40 @@ def parse_arguments():
     
     parser.add_argument('--batch-log-id', type=str, default='',
                        help='Batch log identifier for logging purposes')
+
+    # Observation encoding of ReAct agents
+    parser.add_argument('--observation', choices=['full', 'delta'], default='full',
+                       help='ReAct observations: full world state every turn, or only changes since the last turn (default: full)')
+    parser.add_argument('--keyframe-interval', type=int, default=5,
+                       help='With --observation delta, send the full world state every N turns (0: only the first turn, default: 5)')
+    parser.add_argument('--decision', choices=['joint', 'per_agent'], default='joint',
+                       help='ReAct decisions: one prompt for all agents, or concurrent requests for each idle agent with its own context (default: joint)')
+
+    # Best-of-N sampling of IO, CoT and PLaG
+    parser.add_argument('--samples', type=int, default=1,
+                       help='IO/CoT/PLaG: request N plans concurrently per attempt and keep the shortest valid one (default: 1)')
+    parser.add_argument('--sample-temperature', type=float, default=0.7,
+                       help='Sampling temperature used when --samples > 1 (default: 0.7)')
+
+    # Plan post-processing
+    parser.add_argument('--retime', action='store_true',
+                       help='IO/CoT/PLaG/Search: remove slack (oversized waits, redundant moves) from the final plan before executing it')
+    parser.add_argument('--repair', action='store_true',
+                       help='IO/CoT/PLaG: fix small plan errors (MoveTo onto stations, stations out of reach, missing waits) locally before asking the model to refine')
+
+    # Model responses
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream model responses and abort a request as soon as an action list in it is invalid')
+
+    # Human tests
+    parser.add_argument('--gui-session', type=str, default=None,
+                       help='Human: GUI server session of this test (default: a new session when a GUI server is already running, else the default session of a server started for this test)')
+
+    # Chat history sent to the model
+    parser.add_argument('--history', choices=list(HISTORY_POLICIES), default='full',
+                       help='Chat history policy: full, last_k (last K turns), digest (last K turns plus a digest of older plans), drop_superseded (default: full)')
+    parser.add_argument('--history-turns', type=int, default=4,
+                       help='Number of recent turns kept by last_k and digest (default: 4)')
     
     return parser.parse_args()
 
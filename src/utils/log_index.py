@@ -0,0 +1,222 @@
+# log_index.py
+"""
+Byte-offset index of run logs, so that viewers fetch and render only the window they show.
+
+env.log is split into time steps at the `--- Time Advanced to N ---` lines written by Simulator.step,
+model.log into conversation turns at the `-----ROLE:-----` headers written by Agent.log_conversation.
+The index is saved next to the log (`<log>.index`) and extended incrementally: logs are only ever
+appended to, so reopening a log scans just the bytes written since it was last indexed. Windows are read
+through a memory map of the file.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+# One pass over the file finds every kind of boundary
+BOUNDARY_RE = re.compile(
+    rb"^(?:--- Time Advanced to (?P<time>\d+) ---|-----(?P<role>[A-Z_]+):-----|===== (?P<header>.*?) =====)\r?$",
+    re.MULTILINE,
+)
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index"
+# Bytes hashed to recognize a log that was truncated or rewritten since it was indexed
+HEAD_BYTES = 4096
+# Indexes kept in memory; an evicted one is reloaded from its saved <log>.index on the next open
+OPEN_INDEX_CACHE_SIZE = 64
+
+def _head_digest(path: str, size: int) -> str:
+    """Hash of the first bytes (at most HEAD_BYTES) of the first `size` bytes of the file"""
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(size, HEAD_BYTES))).hexdigest()
+
+class LogIndex:
+    """
+    Offsets of the time steps ([time, offset]), conversation turns ([role, offset]) and conversation
+    headers ([header, offset]) of one log file. `size` is the end of the last complete line indexed.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.head = ""
+        self.steps: List[list] = []
+        self.turns: List[list] = []
+        self.headers: List[list] = []
+        self.mtime = None
+        # Size covered by the saved index, 0 when it has to be rewritten
+        self.saved = 0
+
+    @property
+    def index_path(self) -> str:
+        return self.path + INDEX_SUFFIX
+
+    @classmethod
+    def open(cls, path: str, persist: bool = True) -> "LogIndex":
+        """Index of `path`, loaded from its saved index when still valid and brought up to date"""
+        index = cls(path)
+        index.load()
+        index.update(persist=persist)
+        return index
+
+    def reset(self):
+        self.size = 0
+        self.head = ""
+        self.steps, self.turns, self.headers = [], [], []
+
+    def load(self):
+        """
+        Load the saved index. It is a text file appended to on every update: boundary lines
+        `s <offset> <time>`, `t <offset> <role>`, `h <offset> <header>`, each batch closed by a
+        checkpoint `c <size> <head>`; lines after the last checkpoint are an interrupted write.
+        """
+        self.reset()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                if f.readline().strip() != f"v {INDEX_VERSION}":
+                    return
+                pending = ([], [], [])
+                for line in f:
+                    kind, _, rest = line.rstrip("\n").partition(" ")
+                    offset, _, value = rest.partition(" ")
+                    if kind == "c":
+                        self.steps += pending[0]
+                        self.turns += pending[1]
+                        self.headers += pending[2]
+                        pending = ([], [], [])
+                        self.size, self.head = int(offset), value
+                    elif kind == "s":
+                        pending[0].append([int(value), int(offset)])
+                    elif kind == "t":
+                        pending[1].append([value, int(offset)])
+                    elif kind == "h":
+                        pending[2].append([value, int(offset)])
+        except (OSError, ValueError):
+            self.reset()
+        self.saved = self.size
+
+    def save(self, steps: int = 0, turns: int = 0, headers: int = 0):
+        """Append the boundaries from the given positions on and a checkpoint (rewrite after a reset)"""
+        lines = [] if self.saved else [f"v {INDEX_VERSION}\n"]
+        lines += [f"s {offset} {label}\n" for label, offset in self.steps[steps:]]
+        lines += [f"t {offset} {label}\n" for label, offset in self.turns[turns:]]
+        lines += [f"h {offset} {label}\n" for label, offset in self.headers[headers:]]
+        lines.append(f"c {self.size} {self.head}\n")
+        try:
+            with open(self.index_path, "a" if self.saved else "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            self.saved = self.size
+        except OSError:
+            # A read-only log directory only costs a rescan next time
+            pass
+
+    def update(self, persist: bool = True) -> bool:
+        """Index the bytes appended since the last update; returns whether the index changed"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            changed = self.size > 0
+            self.reset()
+            self.saved = 0
+            self.mtime = None
+            return changed
+        if self.mtime == (stat.st_size, stat.st_mtime_ns):
+            return False
+        self.mtime = (stat.st_size, stat.st_mtime_ns)
+        changed = False
+        if stat.st_size < self.size or (self.size and _head_digest(self.path, self.size) != self.head):
+            # Truncated or rewritten: index from scratch
+            self.reset()
+            self.saved = 0
+            changed = True
+        if stat.st_size == self.size:
+            return changed
+        start = self.size
+        counts = len(self.steps), len(self.turns), len(self.headers)
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Only complete lines are indexed, a partially written line is scanned again next time
+            end = mm.rfind(b"\n", start) + 1
+            if end <= start:
+                return changed
+            for match in BOUNDARY_RE.finditer(mm, start, end):
+                if match.group("time") is not None:
+                    self.steps.append([int(match.group("time")), match.start()])
+                elif match.group("role") is not None:
+                    self.turns.append([match.group("role").decode("ascii"), match.start()])
+                else:
+                    self.headers.append([match.group("header").decode("utf-8", errors="replace"), match.start()])
+        if start < HEAD_BYTES:
+            self.head = _head_digest(self.path, end)
+        self.size = end
+        if persist:
+            self.save(*counts)
+        return True
+
+    def _boundaries(self, kind: str) -> Tuple[List[list], int]:
+        """Boundaries of `kind` ("steps" or "turns") and 1 if there is text before the first of them"""
+        boundaries = self.steps if kind == "steps" else self.turns
+        return boundaries, 1 if not boundaries or boundaries[0][1] > 0 else 0
+
+    def segments(self, kind: str) -> List[Tuple[object, int]]:
+        """
+        (label, offset) of every segment of `kind`; text before the first boundary is a leading
+        segment labelled None
+        """
+        boundaries, lead = self._boundaries(kind)
+        return [(None, 0)] * lead + [(label, offset) for label, offset in boundaries]
+
+    def span(self, kind: str, first: int, count: int = 1) -> Tuple[int, int]:
+        """Byte range [start, end) of `count` segments of `kind` from segment `first`"""
+        boundaries, lead = self._boundaries(kind)
+        total = len(boundaries) + lead
+        first = max(0, min(first, total - 1))
+        last = first + max(count, 1)
+        start = 0 if first < lead else boundaries[first - lead][1]
+        end = boundaries[last - lead][1] if last < total else self.size
+        return start, end
+
+    def read(self, start: int, end: int) -> str:
+        """Text of the byte range [start, end) of the log"""
+        if end <= start:
+            return ""
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return mm[start:min(end, len(mm))].decode("utf-8", errors="replace")
+
+    def window(self, kind: str, first: int, count: int = 1) -> str:
+        """Text of `count` segments of `kind` from segment `first`"""
+        return self.read(*self.span(kind, first, count))
+
+    def summary(self) -> Dict:
+        return {
+            "path": self.path,
+            "size": self.size,
+            "steps": [label for label, _ in self.segments("steps")],
+            "turns": [label for label, _ in self.segments("turns")],
+            "headers": len(self.headers),
+        }
+
+_open_indexes: "OrderedDict[str, LogIndex]" = OrderedDict()
+_open_lock = threading.Lock()
+
+def open_log_index(path: str, persist: bool = True) -> LogIndex:
+    """
+    Index of `path`, shared within the process (for the OPEN_INDEX_CACHE_SIZE most recently opened logs)
+    and brought up to date on every call
+    """
+    key = os.path.realpath(path)
+    with _open_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = _open_indexes[key] = LogIndex(path)
+            index.load()
+            while len(_open_indexes) > OPEN_INDEX_CACHE_SIZE:
+                _open_indexes.popitem(last=False)
+        _open_indexes.move_to_end(key)
+        index.update(persist=persist)
+        return index
@@ -1,4 +1,5 @@
-import logging, os, re
+import html, logging, os, re
+from contextlib import contextmanager
 
 RESET = "\x1b[0m"
 COLOR_CODES = {
@@ -23,6 +24,62 @@ COLOR_CODES = {
     'BG_WHITE': "\x1b[47m",
 }
 
+ANSI_SGR_RE = re.compile(r'\x1b\[([0-9;]*)m')
+ANSI_HTML_COLORS = {
+    30: 'black', 31: 'red', 32: 'green', 33: 'orange',
+    34: 'blue', 35: 'purple', 36: 'cyan', 37: 'gray',
+}
+
+# (color, background, bold, underline, reverse) after applying an SGR code sequence, and its CSS
+_SGR_TRANSITIONS = {}
+
+def _sgr_apply(state: tuple, codes: str) -> tuple:
+    key = (state, codes)
+    if key not in _SGR_TRANSITIONS:
+        color, background, bold, underline, reverse = state
+        for code in (codes or '0').split(';'):
+            code = int(code) if code else 0
+            if code == 0:
+                color, background, bold, underline, reverse = None, None, False, False, False
+            elif code == 1:
+                bold = True
+            elif code == 4:
+                underline = True
+            elif code == 7:
+                reverse = True
+            elif code in ANSI_HTML_COLORS:
+                color = ANSI_HTML_COLORS[code]
+            elif code - 10 in ANSI_HTML_COLORS:
+                background = ANSI_HTML_COLORS[code - 10]
+        styles = []
+        if color:
+            styles.append(f"color:{color}")
+        if background or reverse:
+            styles.append(f"background:{background or 'gray'}")
+        if bold:
+            styles.append("font-weight:bold")
+        if underline:
+            styles.append("text-decoration:underline")
+        new_state = (color, background, bold, underline, reverse)
+        _SGR_TRANSITIONS[key] = (new_state, f'<span style="{";".join(styles)}">' if styles else '')
+    return _SGR_TRANSITIONS[key]
+
+def ansi_to_html(text: str) -> str:
+    """
+    HTML of colored log text in one pass over its SGR escape codes: every run of text is wrapped in a
+    single span carrying the current style, so the output is always balanced.
+    """
+    # Escaping cannot touch the escape codes, so it is done once for the whole text
+    tokens = ANSI_SGR_RE.split(html.escape(text, quote=False).replace('\n', '<br>'))
+    parts = [tokens[0]]
+    state, opening = (None, None, False, False, False), ''
+    for i in range(1, len(tokens), 2):
+        state, opening = _sgr_apply(state, tokens[i])
+        chunk = tokens[i + 1]
+        if chunk:
+            parts.append(f'{opening}{chunk}</span>' if opening else chunk)
+    return ''.join(parts)
+
 class ColoredFormatter(logging.Formatter):
     def format(self, record):
         return super().format(record)
@@ -57,4 +114,14 @@ def set_log_dir(log_dir: str, file_name: str = "env.log", keep_colors: bool = Fa
 
 def log_model_conversation(message: str):
     """Log the model conversation to the logger."""
-    logger.info(message, extra={"model_log": True})
\ No newline at end of file
+    logger.info(message, extra={"model_log": True})
+
+@contextmanager
+def suppress_logging():
+    """Temporarily disable the shared logger, e.g. for headless simulator runs."""
+    previous = logger.disabled
+    logger.disabled = True
+    try:
+        yield
+    finally:
+        logger.disabled = previous
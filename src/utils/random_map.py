@@ -10,9 +10,10 @@ def load_json(filepath):
 
 def get_stations_from_orders(orders, recipe_dir, num_chopping_board=1, num_each_cookware=1):
     # Collect required ingredients and workstations based on orders
-    needed_ingredients = set()
-    needed_workstations = set()
-    needed_cookware = set()
+    # Dicts keep first-seen order, unlike sets whose string order changes with the hash seed per process
+    needed_ingredients = {}
+    needed_workstations = {}
+    needed_cookware = {}
     for order in orders:
         cate, name = order.split('/')
         recipe_path = os.path.join(recipe_dir, f"{cate}.json")
@@ -21,15 +22,15 @@ def get_stations_from_orders(orders, recipe_dir, num_chopping_board=1, num_each_
         if not recipe:
             raise ValueError(f"Recipe {name} not found in {recipe_path}")
         for ing in recipe["ingredients"]:
-            needed_ingredients.add(ing["item"])
+            needed_ingredients[ing["item"]] = None
             # Infer required workstations based on ingredient states
             if ing["state"] == "chopped":
-                needed_workstations.add("chopping_board")
+                needed_workstations["chopping_board"] = None
             elif ing["state"] == "cooked":
-                needed_workstations.add("chopping_board")
-                needed_workstations.add("stove")
+                needed_workstations["chopping_board"] = None
+                needed_workstations["stove"] = None
                 if "cookware" in ing:
-                    needed_cookware.add(ing["cookware"])
+                    needed_cookware[ing["cookware"]] = None
             
     # Dispenser for each ingredient
     stations = []
@@ -56,7 +57,7 @@ def get_stations_from_orders(orders, recipe_dir, num_chopping_board=1, num_each_
     return stations
 
 def check_reachability(map_data):
-    # Check if all agents can reach all workstations
+    # Check if all agents can reach all workstations, agents sharing a connected region share one BFS
     width = map_data["width"]
     height = map_data["height"]
     grid = [[0]*width for _ in range(height)]
@@ -79,9 +80,13 @@ def check_reachability(map_data):
                     queue.append((nx, ny))
         return visited
     
+    checked_regions = []
     for agent in map_data["agents"]:
         start = (agent["x"], agent["y"])
+        if any(start in region for region in checked_regions):
+            continue
         reachable = bfs(start)
+        checked_regions.append(reachable)
         for tile in map_data["tiles"]:
             if tile["type"] == "station":
                 pos = (tile["x"], tile["y"])
@@ -98,17 +103,143 @@ def check_reachability(map_data):
     
     return True
 
-def generate_random_map(width=8, height=6, num_agents=2, orders=None, recipe_dir=None, num_tables=None, num_plates=None, num_walls=0, num_chopping_board=1, num_each_cookware=1, seed=None):
-    if seed is not None:
-        random.seed(seed)
+def find(parent, cell):
+    # Union-find lookup with path halving
+    while parent[cell] != cell:
+        parent[cell] = parent[parent[cell]]
+        cell = parent[cell]
+    return cell
+
+def random_spanning_tree(cells, rng):
+    # Randomized Kruskal over the grid graph induced by cells, returns the tree as an adjacency dict
+    cells = sorted(cells)
+    cell_set = set(cells)
+    edges = [((x, y), (x+1, y)) for x, y in cells if (x+1, y) in cell_set] + [((x, y), (x, y+1)) for x, y in cells if (x, y+1) in cell_set]
+    rng.shuffle(edges)
+    parent = {cell: cell for cell in cells}
+    tree = {cell: set() for cell in cells}
+    for a, b in edges:
+        root_a, root_b = find(parent, a), find(parent, b)
+        if root_a != root_b:
+            parent[root_a] = root_b
+            tree[a].add(b)
+            tree[b].add(a)
+    return tree
+
+def generate_connected_map(width=8, height=6, num_agents=2, orders=None, recipe_dir=None, num_tables=None, num_plates=None, num_walls=0, num_chopping_board=1, num_each_cookware=1, seed=None, rng=None):
+    """
+    Constructive variant of generate_random_map that never needs check_reachability or retries.
+    Free cells are kept as a random spanning tree and only leaves of the tree are blocked, so the
+    free cells stay connected. Each station pins a free cell next to it, which is never blocked
+    afterwards, so every station keeps a reachable neighbor.
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    tree = random_spanning_tree([(x, y) for y in range(height) for x in range(width)], rng)
+    pinned = set()
+    # Unpinned leaves split by region, as list + index so picking and removing are O(1) on large maps
+    pools = {True: ([], {}), False: ([], {})}
+
+    def is_edge(pos):
+        return pos[0] == 0 or pos[0] == width-1 or pos[1] == 0 or pos[1] == height-1
+
+    def add_leaf(cell):
+        cells, index = pools[is_edge(cell)]
+        if cell not in index and cell not in pinned:
+            index[cell] = len(cells)
+            cells.append(cell)
+
+    def remove_leaf(cell):
+        cells, index = pools[is_edge(cell)]
+        i = index.pop(cell, None)
+        if i is not None:
+            last = cells.pop()
+            if i < len(cells):
+                cells[i] = last
+                index[last] = i
+
+    def collect_leaves():
+        for cells, index in pools.values():
+            cells.clear()
+            index.clear()
+        for cell in sorted(tree):
+            if len(tree[cell]) == 1:
+                add_leaf(cell)
+
+    def block(prefer_edge, needs_access):
+        nonlocal tree
+        if len(tree) - 1 < num_agents:
+            raise ValueError(f"Map {width}x{height} is too small for the requested stations, walls and agents")
+        if not pools[True][0] and not pools[False][0]:
+            # Every leaf is pinned, a fresh spanning tree of the free cells usually has other leaves
+            tree = random_spanning_tree(tree.keys(), rng)
+            collect_leaves()
+        candidates = pools[prefer_edge][0] or pools[not prefer_edge][0]
+        if not candidates:
+            raise ValueError(f"No free cell left to place a tile on the {width}x{height} map")
+        pos = rng.choice(candidates)
+        remove_leaf(pos)
+        (neighbor,) = tree.pop(pos)
+        tree[neighbor].discard(pos)
+        if len(tree[neighbor]) == 1:
+            add_leaf(neighbor)
+        # Share an access cell already pinned by another station when possible
+        if needs_access and not any((pos[0]+dx, pos[1]+dy) in pinned for dx, dy in [(-1,0),(1,0),(0,-1),(0,1)]):
+            pinned.add(neighbor)
+            remove_leaf(neighbor)
+        return pos
+
+    collect_leaves()
+
+    tiles = []
+    # Stations prefer the edges, tables and walls prefer the center
+    for station in get_stations_from_orders(orders, recipe_dir, num_chopping_board, num_each_cookware):
+        pos = block(prefer_edge=True, needs_access=True)
+        tiles.append({"x": pos[0], "y": pos[1], "type": "station", **station})
+
+    if num_tables is None:
+        num_tables = rng.randint(2, 6)
+    if num_plates is None:
+        num_plates = rng.randint(1, num_tables)
+    for i in range(num_tables):
+        pos = block(prefer_edge=False, needs_access=True)
+        table = {"x": pos[0], "y": pos[1], "type": "station", "name": f"table{i+1}"}
+        if i < num_plates:
+            table["item"] = "plate"
+        tiles.append(table)
+
+    for i in range(num_walls):
+        pos = block(prefer_edge=False, needs_access=False)
+        tiles.append({"x": pos[0], "y": pos[1], "type": "obstacle", "name": "wall"})
+
+    # Every remaining cell belongs to the same tree, so agents can start anywhere
+    agent_positions = rng.sample(sorted(tree), num_agents)
+    agents = [{"name": f"agent{i+1}", "x": pos[0], "y": pos[1]} for i, pos in enumerate(agent_positions)]
+
+    map_data = {
+        "name": "kitchen",
+        "width": width,
+        "height": height,
+        "agents": agents,
+        "tiles": tiles
+    }
+    return map_data
+
+def generate_random_map(width=8, height=6, num_agents=2, orders=None, recipe_dir=None, num_tables=None, num_plates=None, num_walls=0, num_chopping_board=1, num_each_cookware=1, seed=None, rng=None, constructive=False):
+    # Use a private generator so that maps can be built concurrently and reproducibly
+    if rng is None:
+        rng = random.Random(seed)
+    if constructive:
+        return generate_connected_map(width, height, num_agents, orders, recipe_dir, num_tables, num_plates, num_walls,
+                                      num_chopping_board, num_each_cookware, rng=rng)
     tiles = []
 
     edge_positions = [(x, y) for x in range(width) for y in range(height)
                       if x == 0 or x == width-1 or y == 0 or y == height-1]
     center_positions = [(x, y) for x in range(1, width-1) for y in range(1, height-1)]
 
-    random.shuffle(edge_positions)
-    random.shuffle(center_positions)
+    rng.shuffle(edge_positions)
+    rng.shuffle(center_positions)
 
     stations = get_stations_from_orders(orders, recipe_dir, num_chopping_board, num_each_cookware)
     pos_idx = 0
@@ -124,9 +255,9 @@ def generate_random_map(width=8, height=6, num_agents=2, orders=None, recipe_dir
 
     # Tables and plates prioritized in the center
     if num_tables is None:
-        num_tables = random.randint(2, 6)
+        num_tables = rng.randint(2, 6)
     if num_plates is None:
-        num_plates = random.randint(1, num_tables)
+        num_plates = rng.randint(1, num_tables)
     for i in range(num_tables):
         if i < len(center_positions):
             pos = center_positions[i]
@@ -150,7 +281,7 @@ def generate_random_map(width=8, height=6, num_agents=2, orders=None, recipe_dir
     # agent placed randomly in remaining positions
     used_positions = {(tile["x"], tile["y"]) for tile in tiles}
     available_positions = [p for p in center_positions + edge_positions if p not in used_positions]
-    agent_positions = random.sample(available_positions, num_agents)
+    agent_positions = rng.sample(available_positions, num_agents)
     agents = [{"name": f"agent{i+1}", "x": pos[0], "y": pos[1]} for i, pos in enumerate(agent_positions)]
 
     map_data = {
@@ -1,8 +1,12 @@
 import re
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 import numpy as np
 from io import BytesIO
+from PIL import Image, ImageDraw, ImageFont
 
 def load_data(filename):
     with open(filename, 'r', encoding='utf-8') as f:
@@ -27,41 +31,209 @@ def get_model_wrapper(model_name):
         from src.agent.model.gpt_wrapper import GPTWrapper
         return GPTWrapper
 
+_TOKEN_ENCODING = None
+_TOKEN_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+def count_tokens(text: str) -> int:
+    """Prompt size in tokens: exact with tiktoken (cl100k_base) when installed, otherwise a BPE-like estimate"""
+    global _TOKEN_ENCODING
+    if _TOKEN_ENCODING is None:
+        try:
+            import tiktoken
+            _TOKEN_ENCODING = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _TOKEN_ENCODING = False
+    if _TOKEN_ENCODING:
+        return len(_TOKEN_ENCODING.encode(text))
+    # Words cost about one token per 4 letters, numbers one per 3 digits, punctuation one each
+    count = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isalpha():
+            count += (len(piece) + 3) // 4
+        elif piece[0].isdigit():
+            count += (len(piece) + 2) // 3
+        else:
+            count += 1
+    return count
+
 def clean_text(text: str) -> str:
     # Remove characters that cause errors when extracting JSON
     text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Tokens the span scanner has to look at: whole double-quoted strings, brackets, single quotes, tags
+SPAN_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]"\'<]', re.DOTALL)
+JSON_OPENER = re.compile(r"[{\[]|<think>")
+SINGLE_QUOTED_BODY = re.compile(r"(?:[^'\\]|\\.)*'", re.DOTALL)
+REPAIR_TOKEN = re.compile(
+    r'"(?:[^"\\]|\\.)*"'                        # double-quoted string, copied as is
+    r"|'(?:[^'\\]|\\.)*'"                       # single-quoted string
+    r"|//[^\n]*|/\*.*?\*/"                        # comments
+    r"|,(?=(?:\s|//[^\n]*|/\*.*?\*/)*[\]}])"      # trailing comma
+    r"|\b(?:True|False|None)\b",
+    re.DOTALL,
+)
+
+def _value_start(text: str, i: int) -> bool:
+    """Whether a JSON value can start at `i`, judging by the previous non-blank character"""
+    i -= 1
+    while i >= 0 and text[i].isspace():
+        i -= 1
+    return i < 0 or text[i] in "{[,:"
+
+def json_spans(text: str) -> list:
+    """
+    (start, end) of every balanced {...} or [...] in the text, at any depth, in one pass. Brackets in
+    strings and <think> sections are ignored. Single quotes only open a string where a JSON value can
+    start, so apostrophes in prose do not; a closing bracket drops unmatched openers above its partner.
+    """
+    spans = []
+    stack = []
+    i = 0
+    while True:
+        match = SPAN_TOKEN.search(text, i)
+        if not match:
+            return spans
+        i, token = match.start(), match.group(0)
+        if len(token) > 1:
+            # Strings only matter inside a candidate; in prose a quote may well be unbalanced
+            i = match.end() if stack else i + 1
+            continue
+        if token == "<":
+            if text.startswith(THINK_OPEN, i):
+                end = text.find(THINK_CLOSE, i)
+                i = end + len(THINK_CLOSE) if end >= 0 else i + len(THINK_OPEN)
+                continue
+        elif token == '"':
+            if stack:
+                return spans  # Unterminated string, nothing after it can close
+        elif token == "'":
+            if stack and _value_start(text, i):
+                body = SINGLE_QUOTED_BODY.match(text, i + 1)
+                if not body:
+                    return spans
+                i = body.end() - 1
+        elif token in "{[":
+            stack.append((token, i))
+        else:
+            opener = "{" if token == "}" else "["
+            for k in range(len(stack) - 1, -1, -1):
+                if stack[k][0] == opener:
+                    spans.append((stack[k][1], i + 1))
+                    del stack[k:]
+                    break
+        i += 1
+
+def _repair_token(match) -> str:
+    token = match.group(0)
+    first = token[0]
+    if first == '"':
+        return token
+    if first == "'":
+        if not _value_start(match.string, match.start()):
+            return token
+        content = token[1:-1].replace("\\'", "'").replace('"', '\\"')
+        return f'"{content}"'
+    if first == "/" or first == ",":
+        return ""
+    return PYTHON_LITERALS[token]
+
+def repair_json(text: str) -> str:
+    """
+    Single pass over near-JSON written by models: drops // and /* */ comments and trailing commas,
+    turns single-quoted strings into double-quoted ones and True/False/None into JSON literals.
+    Text inside double-quoted strings is copied unchanged, so URLs and apostrophes survive.
+    """
+    return REPAIR_TOKEN.sub(_repair_token, text)
+
+def loads_tolerant(text: str):
+    """json.loads allowing raw newlines in strings, retried once on the repaired text"""
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return json.loads(repair_json(text), strict=False)
+
+def plan_rank(value) -> int:
+    """2 for {"plan": ...}, 1 for a bare {agent: [actions]} mapping, 0 otherwise"""
+    if not isinstance(value, dict):
+        return 0
+    if "plan" in value:
+        return 2
+    if value and all(isinstance(v, list) for v in value.values()) and any(
+        isinstance(a, dict) and "action" in a for v in value.values() for a in v
+    ):
+        return 1
+    return 0
+
+def strict_candidates(text: str) -> list:
+    """
+    Values that parse as written from an opening bracket outside <think> sections, decoded by the C
+    scanner of the json module; an opener inside a value already decoded is not tried again.
+    Returns (plan_rank, is_dict, length, value) tuples.
+    """
+    decoder = json.JSONDecoder(strict=False)
+    parsed = []
+    i = 0
+    while True:
+        match = JSON_OPENER.search(text, i)
+        if not match:
+            return parsed
+        i = match.start()
+        if match.group(0) == THINK_OPEN:
+            end = text.find(THINK_CLOSE, i)
+            i = end + len(THINK_CLOSE) if end >= 0 else match.end()
+            continue
+        try:
+            value, end = decoder.raw_decode(text, i)
+        except json.JSONDecodeError:
+            i += 1
+            continue
+        parsed.append((plan_rank(value), isinstance(value, dict), end - i, value))
+        i = end
+
 def extract_json(text: str) -> dict|list:
-    # json_regex = f'```json\s*([\s\S]*?)\s*```'
-    # Remove <think> and </think> tags and their content
-    text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
-    # Remove // comments from each line
-    text = re.sub(r'//.*', '', text)
-
-    json_regex = r'```json\s*([\s\S]*?)\s*```'
-    matches = re.findall(json_regex, text)
-    if matches and len(matches) > 0:
-        json_data = matches[0].replace('```json', '').replace('```', '').strip()
-        json_data = clean_text(json_data)
-        json_data.replace("'", '"')
+    """
+    The JSON object or array in a model response. Fenced blocks, surrounding prose, <think> sections,
+    comments, trailing commas and single quotes are tolerated. When several candidates parse, the most
+    plan-like one wins, then objects over arrays, then the largest.
+    """
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        # Fast path: responses in JSON mode are usually the bare object
         try:
-            parsed_json = json.loads(json_data)
-            return parsed_json
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error parsing JSON data: {e}") from e
-    else:
-        text = clean_text(text)
-        text = text.replace("'", '"')
+            value = json.loads(stripped, strict=False)
+            if isinstance(value, (dict, list)):
+                return value
+        except json.JSONDecodeError:
+            pass
+
+    parsed = strict_candidates(text)
+    if any(candidate[0] for candidate in parsed):
+        return max(parsed, key=lambda candidate: candidate[:3])[3]
+    # Nothing plan-like is valid as written: repair the whole response once and decode again
+    repaired = strict_candidates(repair_json(text))
+    if any(candidate[0] for candidate in repaired):
+        return max(repaired, key=lambda candidate: candidate[:3])[3]
+
+    # Repairs can misfire on the prose around the JSON; scan every balanced span and repair it alone
+    parsed = []
+    covered = []
+    # Longest first: once an outer span parses, the spans nested in it need no attempt
+    for start, end in sorted(json_spans(text), key=lambda span: span[0] - span[1]):
+        if any(s <= start and end <= e for s, e in covered):
+            continue
         try:
-            parsed_json = json.loads(text)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error parsing JSON data: {e}") from e
-        if isinstance(parsed_json, list) or isinstance(parsed_json, dict):
-            return parsed_json
-        else:
-            raise ValueError(f"No JSON data found in the string: \033[38;5;214m{text}\033[0m")
+            value = loads_tolerant(text[start:end])
+        except json.JSONDecodeError:
+            continue
+        covered.append((start, end))
+        parsed.append((plan_rank(value), isinstance(value, dict), end - start, value))
+    if not parsed:
+        raise ValueError(f"No JSON data found in the string: \033[38;5;214m{text}\033[0m")
+    return max(parsed, key=lambda candidate: candidate[:3])[3]
 
 def print_map_ascii(map_data):
     width = map_data["width"]
@@ -139,7 +311,7 @@ def print_map_ascii(map_data):
             lines.append(' ' * 6 + corner_bl + (horizontal + cross_bottom) * (width - 1) + horizontal + corner_br)
     return '\n'.join(lines)
 
-def get_map_legend(map_data):
+def _build_map_legend(map_data):
     def dict_to_str(d, prefix=''):
         if isinstance(d, dict):
             parts = []
@@ -212,7 +384,42 @@ def get_map_legend(map_data):
     return '\n'.join(legend_lines)
 
 
-def draw_map_image(map_data):
+STATION_COLORS = {
+    'dispenser': '#A3E635',      # Green
+    'chopping_board': '#FBBF24', # Yellow
+    'stove': '#F87171',          # Red
+    'sink': '#60A5FA',           # Blue
+    'serving_window': '#A78BFA', # Purple
+    'table': "#979797",          # Gray
+    'plate_return': '#34D399',   # Teal
+}
+
+def _station_style(tile):
+    """Fill color and short label of a station tile on the map image"""
+    name = tile.get("name", "?")
+    color = '#93C5FD' # Default light blue
+    label = name[:2]
+    if "item" in tile:
+        item = tile["item"]
+        if isinstance(item, dict):
+            item_name = item.get("name", "?")
+        elif isinstance(item, str):
+            item_name = item
+        else:
+            item_name = str(item)
+        item_name = item_name.lower()
+        label = {
+            "pan": "Pn", "pot": "Pt", "plate": "Pl"
+        }.get(item_name, item_name[:2].upper())
+    if 'dispenser' in name:
+        return STATION_COLORS['dispenser'], 'D'
+    for prefix, short in (('chopping_board', 'Cb'), ('stove', 'St'), ('sink', 'Sk'),
+                          ('serving_window', 'SW'), ('table', 'Tb'), ('plate_return', 'PR')):
+        if name.startswith(prefix):
+            return STATION_COLORS[prefix], short
+    return color, label
+
+def _draw_map_matplotlib(map_data) -> bytes:
     width = map_data["width"]
     height = map_data["height"]
     fig, ax = plt.subplots(figsize=(width/3, height/3))
@@ -240,57 +447,13 @@ def draw_map_image(map_data):
     ax.xaxis.set_label_position('top')
 
     from matplotlib.patches import Rectangle
-    station_colors = {
-        'dispenser': '#A3E635',      # Green
-        'chopping_board': '#FBBF24', # Yellow
-        'stove': '#F87171',          # Red
-        'sink': '#60A5FA',           # Blue
-        'serving_window': '#A78BFA', # Purple
-        'table': "#979797",          # Gray
-        'plate_return': '#34D399',   # Teal
-    }
     for tile in map_data["tiles"]:
         x, y = tile["x"], tile["y"]
         ttype = tile["type"]
         if ttype == "obstacle":
             ax.add_patch(Rectangle((x, y), 1, 1, color='black'))
         elif ttype == "station":
-            name = tile.get("name", "?")
-            color = '#93C5FD' # Default light blue
-            label = name[:2]
-            if "item" in tile:
-                item = tile["item"]
-                if isinstance(item, dict):
-                    item_name = item.get("name", "?")
-                elif isinstance(item, str):
-                    item_name = item
-                else:
-                    item_name = str(item)
-                item_name = item_name.lower()
-                label = {
-                    "pan": "Pn", "pot": "Pt", "plate": "Pl"
-                }.get(item_name, item_name[:2].upper())
-            if 'dispenser' in name:
-                color = station_colors['dispenser']
-                label = 'D'
-            elif name.startswith('chopping_board'):
-                color = station_colors['chopping_board']
-                label = 'Cb'
-            elif name.startswith('stove'):
-                color = station_colors['stove']
-                label = 'St'
-            elif name.startswith('sink'):
-                color = station_colors['sink']
-                label = 'Sk'
-            elif name.startswith('serving_window'):
-                color = station_colors['serving_window']
-                label = 'SW'
-            elif name.startswith('table'):
-                color = station_colors['table']
-                label = 'Tb'
-            elif name.startswith('plate_return'):
-                color = station_colors['plate_return']
-                label = 'PR'
+            color, label = _station_style(tile)
             ax.add_patch(Rectangle((x, y), 1, 1, color=color, alpha=0.7))
             ax.text(x+0.5, y+0.5, label, ha='center', va='center', fontsize=8, color='black')
     
@@ -303,8 +466,135 @@ def draw_map_image(map_data):
     buf = BytesIO()
     plt.savefig(buf, format='png', dpi=150)
     plt.close(fig)
-    buf.seek(0)
-    return buf
+    return buf.getvalue()
+
+
+# Raster renderer: tiles are pre-rendered sprites blitted into a NumPy canvas, about 50 px per tile
+# like the 150 dpi matplotlib figure
+RASTER_CELL = 50
+RASTER_MARGIN = 24
+_sprite_cache = {}
+_font_cache = {}
+
+def _font(size):
+    if size not in _font_cache:
+        try:
+            _font_cache[size] = ImageFont.load_default(size=size)
+        except (TypeError, OSError):
+            # Pillow without FreeType only has the fixed-size bitmap font
+            _font_cache[size] = ImageFont.load_default()
+    return _font_cache[size]
+
+def _hex_rgb(color):
+    color = color.lstrip('#')
+    return np.array([int(color[i:i+2], 16) for i in (0, 2, 4)], dtype=np.float32)
+
+def _tile_sprite(color, label, alpha=1.0):
+    """RGB array of one tile filled with `color` (blended on white with `alpha`) and a centered label"""
+    key = ("tile", color, label, alpha)
+    if key not in _sprite_cache:
+        rgb = _hex_rgb(color) * alpha + 255 * (1 - alpha)
+        image = Image.new("RGB", (RASTER_CELL, RASTER_CELL), tuple(int(round(c)) for c in rgb))
+        if label:
+            ImageDraw.Draw(image).text((RASTER_CELL / 2, RASTER_CELL / 2), label, fill="black", font=_font(14), anchor="mm")
+        _sprite_cache[key] = np.asarray(image)
+    return _sprite_cache[key]
+
+def _agent_sprite(label):
+    """RGB array and boolean mask of an agent marker: a red disc with a white label"""
+    key = ("agent", label)
+    if key not in _sprite_cache:
+        image = Image.new("RGB", (RASTER_CELL, RASTER_CELL), "white")
+        mask = Image.new("L", (RASTER_CELL, RASTER_CELL), 0)
+        inset = RASTER_CELL // 6
+        box = (inset, inset, RASTER_CELL - inset - 1, RASTER_CELL - inset - 1)
+        ImageDraw.Draw(image).ellipse(box, fill="red")
+        ImageDraw.Draw(mask).ellipse(box, fill=255)
+        ImageDraw.Draw(image).text((RASTER_CELL / 2, RASTER_CELL / 2), label, fill="white", font=_font(16), anchor="mm")
+        _sprite_cache[key] = (np.asarray(image), np.asarray(mask)[:, :, None] > 0)
+    return _sprite_cache[key]
+
+def _draw_map_raster(map_data) -> bytes:
+    width = map_data["width"]
+    height = map_data["height"]
+    cell, margin = RASTER_CELL, RASTER_MARGIN
+    canvas = np.full((margin + height * cell + 1, margin + width * cell + 1, 3), 255, dtype=np.uint8)
+
+    def region(x, y):
+        return canvas[margin + y * cell:margin + (y + 1) * cell, margin + x * cell:margin + (x + 1) * cell]
+
+    for tile in map_data["tiles"]:
+        if tile["type"] == "obstacle":
+            region(tile["x"], tile["y"])[:] = 0
+        elif tile["type"] == "station":
+            color, label = _station_style(tile)
+            region(tile["x"], tile["y"])[:] = _tile_sprite(color, label, alpha=0.7)
+
+    # Grid lines
+    canvas[margin::cell, margin:] = 128
+    canvas[margin:, margin::cell] = 128
+
+    for idx, agent in enumerate(map_data["agents"], 1):
+        sprite, mask = _agent_sprite(f"A{idx}")
+        target = region(agent["x"], agent["y"])
+        target[:] = np.where(mask, sprite, target)
+
+    image = Image.fromarray(canvas)
+    draw = ImageDraw.Draw(image)
+    font = _font(12)
+    for x in range(width):
+        draw.text((margin + (x + 0.5) * cell, margin / 2), str(x), fill="black", font=font, anchor="mm")
+    for y in range(height):
+        draw.text((margin / 2, margin + (y + 0.5) * cell), str(y), fill="black", font=font, anchor="mm")
+    buf = BytesIO()
+    image.save(buf, format='png')
+    return buf.getvalue()
+
+# Rendered maps (PNG bytes and legend text) keyed by a hash of the map JSON, so the Streamlit viewer
+# does not redraw an unchanged map on every rerun
+MAP_RENDER_CACHE_SIZE = 128
+_map_render_cache = OrderedDict()
+_map_render_lock = threading.Lock()
+
+def map_digest(map_data) -> str:
+    """Content hash of a map JSON, independent of key order"""
+    text = json.dumps(map_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def _cached_render(kind, map_data, render):
+    key = (kind, map_digest(map_data))
+    with _map_render_lock:
+        if key in _map_render_cache:
+            _map_render_cache.move_to_end(key)
+            return _map_render_cache[key]
+    value = render(map_data)
+    with _map_render_lock:
+        _map_render_cache[key] = value
+        _map_render_cache.move_to_end(key)
+        while len(_map_render_cache) > MAP_RENDER_CACHE_SIZE:
+            _map_render_cache.popitem(last=False)
+    return value
+
+def clear_map_render_cache():
+    with _map_render_lock:
+        _map_render_cache.clear()
+
+def get_map_legend(map_data):
+    return _cached_render("legend", map_data, _build_map_legend)
+
+_MAP_RENDERERS = {
+    "raster": _draw_map_raster,
+    "matplotlib": _draw_map_matplotlib,
+}
+
+def draw_map_image(map_data, backend="raster"):
+    """
+    PNG image of the map as a BytesIO. `backend` is "raster" (sprites composed with NumPy, fast)
+    or "matplotlib" (the original figure with tick labels); both are cached by map content.
+    """
+    if backend not in _MAP_RENDERERS:
+        raise ValueError(f"Unknown map image backend: {backend}")
+    return BytesIO(_cached_render(backend, map_data, _MAP_RENDERERS[backend]))
 
 if __name__ == "__main__":
     sample_map = {